@@ -0,0 +1,70 @@
+"""
+Movement POST latency with the audit log written in the request ('sync'),
+by the background writer ('async') or through the outbox ('outbox').
+
+    python -m benchmarks.audit_writer --count 5000
+"""
+
+import argparse
+import sys
+
+from benchmarks.runner import Timer, api_client, seed_catalog, setup
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run_mode(client, product, mode, count):
+    from django.test import override_settings
+    from inventory import audit
+    from inventory.models import StockAuditLog, StockMovement
+
+    audit.writer.stop()
+    before = StockMovement.objects.count(), StockAuditLog.objects.count()
+    latencies = []
+    with override_settings(INVENTORY_AUDIT_MODE=mode):
+        with Timer() as total:
+            for i in range(count):
+                with Timer() as request:
+                    client.post('/api/stock-movements/', {
+                        'product': product.pk, 'movement_type': 'IN', 'quantity': 1,
+                    }, format='json')
+                latencies.append(request.elapsed)
+        with Timer() as drain:
+            audit.writer.flush()
+    movements = StockMovement.objects.count() - before[0]
+    audits = StockAuditLog.objects.count() - before[1]
+    return {
+        'mode': mode,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'per_sec': count / total.elapsed,
+        'drain': drain.elapsed,
+        'ok': movements == audits == count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=5000, help='POSTs per mode')
+    parser.add_argument('--modes', nargs='+', default=['sync', 'async', 'outbox'])
+    args = parser.parse_args()
+
+    setup()
+    client = api_client()
+    product = seed_catalog()
+
+    print(f"{'mode':<8} {'p50 ms':>8} {'p99 ms':>8} {'POST/s':>8} {'drain s':>8}  audit rows")
+    failed = False
+    for mode in args.modes:
+        r = run_mode(client, product, mode, args.count)
+        failed |= not r['ok']
+        print(f"{r['mode']:<8} {r['p50'] * 1000:>8.2f} {r['p99'] * 1000:>8.2f} {r['per_sec']:>8.0f} "
+              f"{r['drain']:>8.3f}  {'OK' if r['ok'] else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
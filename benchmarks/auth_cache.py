@@ -0,0 +1,68 @@
+"""
+Queries and time spent authenticating JWT requests: simplejwt's
+JWTAuthentication vs the cached user lookup vs stateless mode.
+
+    python -m benchmarks.auth_cache --requests 10000 --users 50
+"""
+
+import argparse
+
+from benchmarks.runner import Timer, setup
+
+
+def run_mode(authenticator, requests, stateless=False):
+    from django.db import connection
+    from django.test import override_settings
+    from rest_framework.request import Request
+    from inventory.authentication import users
+
+    auth_queries = [0]
+
+    def count(execute, sql, params, many, context):
+        auth_queries[0] += 'auth_user' in sql
+        return execute(sql, params, many, context)
+
+    users.clear()
+    with override_settings(INVENTORY_AUTH_STATELESS=stateless), connection.execute_wrapper(count), Timer() as timer:
+        for request in requests:
+            authenticator.authenticate(Request(request))
+    return auth_queries[0], timer.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=50, help='distinct users the requests rotate through')
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIRequestFactory
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+    from inventory.authentication import CachedJWTAuthentication
+
+    tokens = [
+        str(AccessToken.for_user(User.objects.get_or_create(username=f'bench-auth-{i}')[0]))
+        for i in range(args.users)
+    ]
+    factory = APIRequestFactory()
+    requests = [
+        factory.get('/api/products/', HTTP_AUTHORIZATION=f'Bearer {tokens[i % len(tokens)]}')
+        for i in range(args.requests)
+    ]
+
+    print(f"{args.requests} requests from {args.users} users")
+    print(f"{'mode':<10} {'auth queries':>12} {'per 1k':>8} {'us/request':>11}")
+    for name, authenticator, stateless in (
+        ('simplejwt', JWTAuthentication(), False),
+        ('cached', CachedJWTAuthentication(), False),
+        ('stateless', CachedJWTAuthentication(), True),
+    ):
+        auth_queries, elapsed = run_mode(authenticator, requests, stateless)
+        print(f"{name:<10} {auth_queries:>12} {auth_queries * 1000 / args.requests:>8.1f} "
+              f"{elapsed / args.requests * 1e6:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
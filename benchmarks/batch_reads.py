@@ -0,0 +1,77 @@
+"""
+Fetch an order's products: one product_detail call per line vs one batch call.
+
+Each mode reads the same N product ids (a fresh set per mode, so the
+response cache doesn't flatter the later ones): ``detail`` GETs
+``/api/products/<id>/`` per id, ``batch`` POSTs them all to
+``/api/products/batch/`` and ``quantities`` to ``/api/products/quantities/``.
+Reports ids/s and queries, and checks every mode answers for the ids it
+asked for, in order.
+
+    python -m benchmarks.batch_reads --products 20000 --ids 100 1000 5000
+"""
+
+import argparse
+import random
+import sys
+
+from benchmarks.runner import Timer, api_client, seed_products, setup
+
+
+def run_mode(client, mode, ids):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as queries, Timer() as timer:
+        if mode == 'detail':
+            results = [client.get(f'/api/products/{pk}/').json() for pk in ids]
+        elif mode == 'batch':
+            results = client.post('/api/products/batch/', {'ids': ids}, format='json').json()['results']
+        else:
+            body = client.post('/api/products/quantities/', {'ids': ids}, format='json').json()
+            results = [body['quantities'][str(pk)] for pk in ids]
+    return results, timer.elapsed, len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--ids', type=int, nargs='+', default=[100, 1000, 5000], help='ids per order')
+    args = parser.parse_args()
+
+    setup()
+    from django.db.models import Max
+    from inventory.models import Product
+
+    start = (Product.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+    seed_products(args.products)
+    all_ids = list(Product.objects.filter(id__gte=start).values_list('id', flat=True))
+    client = api_client()
+    rng = random.Random(0)
+
+    print(f"{'mode':<11} {'ids':>6} {'seconds':>8} {'ids/s':>9} {'queries':>8}  result")
+    failed = False
+    for count in args.ids:
+        picked = rng.sample(all_ids, min(count * 3, len(all_ids)))
+        ids = picked[:count]
+        detail, elapsed, queries = run_mode(client, 'detail', ids)
+        rows = [('detail', elapsed, queries, [item['id'] for item in detail] == ids)]
+
+        ids = picked[count:2 * count]
+        batch, elapsed, queries = run_mode(client, 'batch', ids)
+        rows.append(('batch', elapsed, queries, [item['id'] for item in batch] == ids))
+
+        ids = picked[2 * count:3 * count]
+        quantities, elapsed, queries = run_mode(client, 'quantities', ids)
+        expected = [Product.objects.get(pk=pk).quantity for pk in ids]
+        rows.append(('quantities', elapsed, queries, quantities == expected))
+
+        for mode, elapsed, queries, ok in rows:
+            failed |= not ok
+            print(f"{mode:<11} {count:>6} {elapsed:>8.2f} {count / elapsed:>9.0f} {queries:>8}  "
+                  f"{'OK' if ok else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
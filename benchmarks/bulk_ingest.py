@@ -0,0 +1,66 @@
+"""
+Compare N single POSTs to /api/stock-movements/ against one bulk call.
+
+    python -m benchmarks.bulk_ingest --count 10000
+"""
+
+import argparse
+import json
+import random
+
+from benchmarks.runner import Timer, api_client, seed_catalog, setup
+
+
+def make_movements(product_ids, count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            'product': rng.choice(product_ids),
+            'movement_type': rng.choice(('IN', 'IN', 'OUT')),
+            'quantity': rng.randint(1, 5),
+        }
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=50)
+    parser.add_argument('--ndjson', action='store_true', help='send the bulk call as NDJSON')
+    args = parser.parse_args()
+
+    setup()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    client = api_client()
+    first = seed_catalog(quantity=1000)
+    product_ids = [first.pk] + [
+        seed_catalog(quantity=1000).pk for _ in range(args.products - 1)
+    ]
+    movements = make_movements(product_ids, args.count)
+
+    with CaptureQueriesContext(connection) as single_queries, Timer() as single:
+        for movement in movements:
+            client.post('/api/stock-movements/', movement, format='json')
+
+    if args.ndjson:
+        body = '\n'.join(json.dumps(m) for m in movements)
+        kwargs = {'data': body, 'content_type': 'application/x-ndjson'}
+    else:
+        kwargs = {'data': movements, 'format': 'json'}
+    with CaptureQueriesContext(connection) as bulk_queries, Timer() as bulk:
+        response = client.post('/api/stock-movements/bulk/', **kwargs)
+
+    print(f"{'mode':<8} {'requests':>8} {'seconds':>9} {'movements/s':>12} {'queries':>8}")
+    print(f"{'single':<8} {args.count:>8} {single.elapsed:>9.2f} "
+          f"{args.count / single.elapsed:>12.0f} {len(single_queries):>8}")
+    print(f"{'bulk':<8} {1:>8} {bulk.elapsed:>9.2f} "
+          f"{args.count / bulk.elapsed:>12.0f} {len(bulk_queries):>8}")
+    print(f"speedup: {single.elapsed / bulk.elapsed:.1f}x  "
+          f"(bulk created {response.data['created']}, failed {response.data['failed']})")
+
+
+if __name__ == '__main__':
+    main()
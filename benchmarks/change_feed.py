@@ -0,0 +1,121 @@
+"""
+Change delivery to many clients: one stream hub per worker vs per-client polling.
+
+A writer thread records stock movements at a steady rate while N clients
+follow the change feed, either as event streams fed by the worker's hub
+or each polling the feed every poll interval. Reports feed queries per
+second, delivery latency (change timestamp to receipt) and whether every
+client saw every change in order.
+
+    python -m benchmarks.change_feed --clients 10 100 1000 --seconds 5
+"""
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+
+from benchmarks.runner import seed_catalog, setup
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0
+
+
+def _writer(product, rate, stop):
+    from django.db import connection
+    from inventory.stock import record_movement
+
+    try:
+        while not stop.is_set():
+            record_movement(product, 'IN', 1)
+            time.sleep(1 / rate)
+    finally:
+        connection.close()
+
+
+async def _stream_client(since, seconds, received):
+    from inventory import changes
+
+    async for chunk in changes.stream(since, timeout=seconds):
+        if chunk.startswith(b'id: '):
+            received.append((int(chunk[4:chunk.index(b'\n')]), time.time()))
+
+
+async def _polling_client(since, seconds, received, queries):
+    from inventory import changes
+
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        rows = await changes.asettled(since)
+        queries[0] += 1
+        for row in rows:
+            received.append((row.id, time.time()))
+        if rows:
+            since = rows[-1].id
+        await asyncio.sleep(changes.get_poll_interval())
+
+
+async def run_round(mode, clients, seconds):
+    from inventory import changes
+    from inventory.models import Change
+
+    since = await changes.atail()
+    polls_before, queries = changes.stats['polls'], [0]
+    received = [[] for _ in range(clients)]
+    if mode == 'stream':
+        tasks = [_stream_client(since, seconds, received[i]) for i in range(clients)]
+    else:
+        tasks = [_polling_client(since, seconds, received[i], queries) for i in range(clients)]
+    await asyncio.gather(*tasks)
+    feed_queries = changes.stats['polls'] - polls_before if mode == 'stream' else queries[0]
+
+    timestamps = {
+        row.id: row.timestamp.timestamp()
+        async for row in Change.objects.filter(id__gt=since).order_by('id')
+    }
+    latencies = [at - timestamps[seq] for client in received for seq, at in client if seq in timestamps]
+    ok = all(client and [seq for seq, _ in client] == sorted(timestamps)[:len(client)] for client in received)
+    return {
+        'mode': mode,
+        'clients': clients,
+        'queries_per_sec': feed_queries / seconds,
+        'p50': percentile(latencies, 0.5),
+        'p99': percentile(latencies, 0.99),
+        'ok': ok,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--seconds', type=int, default=5, help='how long each round follows the feed')
+    parser.add_argument('--rate', type=float, default=50, help='movements per second')
+    parser.add_argument('--modes', nargs='+', default=['poll', 'stream'])
+    args = parser.parse_args()
+
+    setup()
+    product = seed_catalog()
+
+    print(f"{'mode':<7} {'clients':>7} {'queries/s':>9} {'p50 ms':>8} {'p99 ms':>8}  in order")
+    failed = False
+    for clients in args.clients:
+        for mode in args.modes:
+            stop = threading.Event()
+            writer = threading.Thread(target=_writer, args=(product, args.rate, stop))
+            writer.start()
+            try:
+                r = asyncio.run(run_round(mode, clients, args.seconds))
+            finally:
+                stop.set()
+                writer.join()
+            failed |= not r['ok']
+            print(f"{r['mode']:<7} {r['clients']:>7} {r['queries_per_sec']:>9.1f} {r['p50'] * 1000:>8.0f} "
+                  f"{r['p99'] * 1000:>8.0f}  {'OK' if r['ok'] else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare the old per-request GROUP BY for /api/inventory/stats/ with the
+maintained summary-table read path.
+
+    python -m benchmarks.inventory_stats --products 1000000 --categories 50
+"""
+
+import argparse
+
+from benchmarks.runner import Timer, seed_products, setup
+
+
+def old_query():
+    from django.db.models import Count, Sum
+    from inventory.models import Product
+
+    stats = Product.objects.values('category__name').annotate(
+        total_products=Count('id'), total_quantity=Sum('quantity')
+    )
+    return {
+        entry['category__name']: {
+            'total_products': entry['total_products'],
+            'total_quantity': entry['total_quantity'],
+        }
+        for entry in stats
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--suppliers', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    from inventory.summary import summary_totals
+
+    with Timer() as seeding:
+        seed_products(args.products, args.categories, args.suppliers)
+    print(f"seeded {args.products} products in {seeding.elapsed:.1f}s")
+
+    assert old_query() == summary_totals(), "summary table disagrees with GROUP BY"
+
+    results = {}
+    for name, fn in (('group_by', old_query), ('summary', summary_totals)):
+        with Timer() as timer:
+            for _ in range(args.repeat):
+                fn()
+        results[name] = timer.elapsed / args.repeat * 1000
+        print(f"{name:<9} {results[name]:>10.3f} ms/call")
+    print(f"speedup: {results['group_by'] / results['summary']:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
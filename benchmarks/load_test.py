@@ -0,0 +1,218 @@
+"""
+Latency and throughput of the sync vs async view stacks under concurrent
+clients, served by uvicorn (pip install uvicorn).
+
+    python -m benchmarks.load_test --clients 500 --duration 20
+
+Seeds the benchmark database, then starts uvicorn once per stack with
+INVENTORY_ASYNC_VIEWS=0/1 and drives it with keep-alive clients that each
+issue one request at a time. ``--url`` targets an already running server
+instead (``--stacks`` is then only a label).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.runner import seed_products, setup
+
+PATHS = (
+    '/api/products/',
+    '/api/products/?search=drill',
+    '/api/products/{pk}/',
+    '/api/low-stock/',
+    '/api/inventory/stats/',
+    '/api/stock-audit/',
+)
+
+PASSWORD = 'bench-password'
+
+
+async def _read_response(reader):
+    """Read one HTTP/1.1 response; returns ``(status, body)``."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('connection closed')
+    status = int(status_line.split()[1])
+    length, chunked = 0, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name = name.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding' and 'chunked' in value.lower():
+            chunked = True
+    if not chunked:
+        return status, await reader.readexactly(length)
+    body = b''
+    while True:
+        size = int((await reader.readline()).split(b';')[0], 16)
+        chunk = await reader.readexactly(size + 2)
+        if not size:
+            return status, body
+        body += chunk[:-2]
+
+
+async def _request(reader, writer, host, method, path, token=None, body=None):
+    lines = [f'{method} {path} HTTP/1.1', f'Host: {host}', 'Connection: keep-alive']
+    if token:
+        lines.append(f'Authorization: Bearer {token}')
+    payload = b''
+    if body is not None:
+        payload = json.dumps(body).encode()
+        lines += ['Content-Type: application/json', f'Content-Length: {len(payload)}']
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload)
+    await writer.drain()
+    return await _read_response(reader)
+
+
+async def get_token(url, username):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        status, body = await _request(
+            reader, writer, parts.netloc, 'POST', '/api/token/',
+            body={'username': username, 'password': PASSWORD},
+        )
+    finally:
+        writer.close()
+    if status != 200:
+        raise RuntimeError(f'token request failed ({status}): {body[:200]!r}')
+    return json.loads(body)['access']
+
+
+async def _client(url, token, paths, pks, deadline, latencies, errors, rng):
+    parts = urlsplit(url)
+    connection = None
+    while time.perf_counter() < deadline:
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(parts.hostname, parts.port or 80)
+            start = time.perf_counter()
+            path = rng.choice(paths).format(pk=rng.choice(pks))
+            status, _ = await _request(*connection, parts.netloc, 'GET', path, token)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                errors[status] = errors.get(status, 0) + 1
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as exc:
+            errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def load(url, token, pks, clients, duration, seed=0, paths=PATHS):
+    """Run ``clients`` concurrent clients for ``duration`` seconds, each
+    GETting random ``paths`` (``{pk}`` is filled from random ``pks``).
+
+    Returns ``(latencies, errors, elapsed)``.
+    """
+    latencies, errors = [], {}
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[
+        _client(url, token, paths, pks, deadline, latencies, errors, random.Random(rng.random()))
+        for _ in range(clients)
+    ])
+    return latencies, errors, time.perf_counter() - start
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def _probe(host, port):
+    _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), 1)
+    writer.close()
+
+
+def _wait_for_server(url, process, timeout=30):
+    parts = urlsplit(url)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('server exited during startup')
+        try:
+            asyncio.run(_probe(parts.hostname, parts.port))
+            return
+        except (OSError, asyncio.TimeoutError):
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def start_server(stack, port, workers):
+    env = dict(os.environ, INVENTORY_ASYNC_VIEWS='1' if stack == 'async' else '0')
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'inventory_api.asgi:application',
+         '--port', str(port), '--workers', str(workers), '--log-level', 'warning',
+         '--backlog', '4096'],
+        env=env,
+    )
+    url = f'http://127.0.0.1:{port}'
+    try:
+        _wait_for_server(url, process)
+    except RuntimeError:
+        process.kill()
+        raise
+    return process, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=20, help='seconds per stack')
+    parser.add_argument('--stacks', nargs='+', default=['sync', 'async'], choices=['sync', 'async'])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--url', help='benchmark a running server instead of starting uvicorn')
+    args = parser.parse_args()
+
+    setup()
+    from django.contrib.auth.models import User
+    from inventory.models import Product
+
+    if Product.objects.count() < args.products:
+        seed_products(args.products)
+    user, _ = User.objects.get_or_create(username='bench')
+    user.set_password(PASSWORD)
+    user.save()
+    pks = list(Product.objects.values_list('id', flat=True)[:1000])
+
+    print(f"{args.clients} clients, {args.duration:g}s per stack")
+    print(f"{'stack':<6} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}  errors")
+    for stack in args.stacks:
+        process = None
+        url = args.url
+        if url is None:
+            process, url = start_server(stack, args.port, args.workers)
+        try:
+            token = asyncio.run(get_token(url, user.username))
+            latencies, errors, elapsed = asyncio.run(load(url, token, pks, args.clients, args.duration))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        latencies.sort()
+        print(
+            f"{stack:<6} {len(latencies):>9} {len(latencies) / elapsed:>9.0f} "
+            f"{percentile(latencies, 0.50) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f}  "
+            f"{errors or '-'}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+"""
+Compare the old ``name__icontains`` product search with the search index
+(MySQL FULLTEXT, or the in-process index on other databases).
+
+    python -m benchmarks.product_search --products 200000
+"""
+
+import argparse
+
+from benchmarks.runner import Timer, seed_products, setup
+
+QUERIES = ('hammer', 'cordless drill', 'gar', 'steel claw', 'pump valve filter')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=10)
+    args = parser.parse_args()
+
+    setup()
+    from inventory.models import Product
+    from inventory.search import get_backend, python_index, search_products
+
+    with Timer() as seeding:
+        seed_products(args.products)
+    print(f"seeded {args.products} products in {seeding.elapsed:.1f}s")
+
+    if get_backend() == 'python':
+        python_index.invalidate()
+        with Timer() as build:
+            python_index.search('warmup')
+        print(f"built in-process index in {build.elapsed:.1f}s")
+
+    def icontains(query):
+        qs = Product.objects.all()
+        for term in query.split():
+            qs = qs.filter(name__icontains=term)
+        return list(qs.order_by('id')[:args.page_size]), qs.count()
+
+    def indexed(query):
+        qs = search_products(Product.objects.all(), query)
+        return list(qs.order_by('-search_rank', 'id')[:args.page_size]), qs.count()
+
+    print(f"backend: {get_backend()}")
+    print(f"{'query':<20} {'icontains ms':>13} {'hits':>7} {'search ms':>10} {'hits':>7}")
+    for query in QUERIES:
+        row = [query]
+        for fn in (icontains, indexed):
+            with Timer() as timer:
+                for _ in range(args.repeat):
+                    _, hits = fn(query)
+            row += [timer.elapsed / args.repeat * 1000, hits]
+        print(f"{row[0]:<20} {row[1]:>13.2f} {row[2]:>7} {row[3]:>10.2f} {row[4]:>7}")
+
+
+if __name__ == '__main__':
+    main()
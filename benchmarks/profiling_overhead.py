@@ -0,0 +1,78 @@
+"""
+Cost of the profiling middleware: disabled, sampling a share of requests, and every request.
+
+Each mode sends the same product list and movement requests through a
+fresh client (so the middleware chain is rebuilt with its settings) and
+reports the mean time per request (the best of ``--rounds`` runs, with
+the modes interleaved) and its overhead over ``off``. ``other view``
+profiles every request, but only to a view that isn't called.
+
+    python -m benchmarks.profiling_overhead --products 2000 --requests 500
+"""
+
+import argparse
+import shutil
+import tempfile
+
+from benchmarks.runner import Timer, api_client, seed_products, setup
+
+MODES = (
+    ('off', {'INVENTORY_PROFILE_RATE': 0}),
+    ('other view', {'INVENTORY_PROFILE_RATE': 1.0, 'INVENTORY_PROFILE_VIEWS': ['metrics']}),
+    ('rate 0.01', {'INVENTORY_PROFILE_RATE': 0.01}),
+    ('rate 1', {'INVENTORY_PROFILE_RATE': 1.0}),
+)
+
+
+def run_mode(overrides, requests, product_id, directory):
+    from django.test import override_settings
+
+    with override_settings(**{'INVENTORY_PROFILE_DIR': directory, 'INVENTORY_PROFILE_VIEWS': None, **overrides}):
+        client = api_client()
+        timings = {}
+        for name, call in (
+            ('list', lambda: client.get('/api/products/?page_size=50')),
+            ('movement', lambda: client.post(
+                '/api/stock-movements/', {'product': product_id, 'movement_type': 'IN', 'quantity': 1}, format='json'
+            )),
+        ):
+            call()
+            with Timer() as timer:
+                for _ in range(requests):
+                    call()
+            timings[name] = timer.elapsed / requests
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=500, help='requests per endpoint and mode')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    setup()
+    from inventory.models import Product
+
+    seed_products(args.products)
+    product_id = Product.objects.order_by('id').values_list('id', flat=True).first()
+    directory = tempfile.mkdtemp(prefix='inventory-profiles-')
+
+    try:
+        best = {}
+        for _ in range(args.rounds):
+            for mode, overrides in MODES:
+                timings = run_mode(overrides, args.requests, product_id, directory)
+                best[mode] = {name: min(t, best.get(mode, timings)[name]) for name, t in timings.items()}
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"{'mode':<11} {'list ms':>8} {'overhead':>9} {'movement ms':>12} {'overhead':>9}")
+    baseline = best['off']
+    for mode, timings in best.items():
+        print(f"{mode:<11} {timings['list'] * 1000:>8.2f} {timings['list'] / baseline['list'] - 1:>+9.1%} "
+              f"{timings['movement'] * 1000:>12.2f} {timings['movement'] / baseline['movement'] - 1:>+9.1%}")
+
+
+if __name__ == '__main__':
+    main()
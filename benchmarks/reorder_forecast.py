@@ -0,0 +1,132 @@
+"""
+Demand forecast cost: NumPy over every product at once vs a per-product
+Python loop, on synthetic daily consumption.
+
+    python -m benchmarks.reorder_forecast --products 500000 --days 365 --density 0.1
+    python -m benchmarks.reorder_forecast --endpoint --products 10000 --movements 500000 --days 365
+
+With ``--endpoint``, seeds the benchmark database up to ``--products`` and
+``--movements`` instead (rows already there are reused) and times
+``/api/reorder-suggestions/``: with the demand model rebuilt from the
+rollups, with it current but the response not cached, and cached. The
+rebuild's history read is also timed against one query per day.
+"""
+
+import argparse
+
+from benchmarks.runner import Timer, api_client, seed_movements, seed_products, setup
+
+
+def loop_rates(days_units, days, window, alpha):
+    """The per-product loop the vectorized code replaces: ``days_units`` maps
+    age (days before the last day) to units out."""
+    moving = sum(days_units.get(age, 0) for age in range(window)) / window
+    smoothed = 0.0
+    for age in range(days - 1, -1, -1):
+        smoothed = alpha * days_units.get(age, 0) + (1 - alpha) * smoothed
+    return moving, smoothed
+
+
+def endpoint(args):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    from django.utils import timezone
+    from inventory import forecast
+    from inventory.cache import invalidate
+    from inventory.models import Product, StockMovement
+    from inventory.rollups import bucket_start
+
+    products = Product.objects.count()
+    if products < args.products:
+        seed_products(args.products - products)
+    movements = StockMovement.objects.count()
+    if movements < args.movements:
+        seed_movements(args.movements - movements, days=args.days)
+    print(f"{Product.objects.count()} products, {StockMovement.objects.count()} movements over {args.days} days")
+
+    through = bucket_start(timezone.now(), 'day') - forecast.DAY
+
+    def per_day():
+        return [forecast._day_rows(through - age * forecast.DAY) for age in range(forecast.HISTORY_DAYS)]
+
+    for name, fn in (('history, per day', per_day), ('history, one query', lambda: forecast._history(through))):
+        with CaptureQueriesContext(connection) as queries, Timer() as timer:
+            for _ in range(args.repeat):
+                fn()
+        print(f"{name:<20} {timer.elapsed / args.repeat * 1000:>10.1f} ms {len(queries) // args.repeat:>5} queries")
+
+    client = api_client()
+    for name, stale in (('GET, model rebuilt', 'rollups'), ('GET, model current', 'stats'), ('GET, cached', None)):
+        with CaptureQueriesContext(connection) as queries, Timer() as timer:
+            for _ in range(args.repeat):
+                if stale:
+                    invalidate(stale)
+                assert client.get('/api/reorder-suggestions/').status_code == 200
+        print(f"{name:<20} {timer.elapsed / args.repeat * 1000:>10.1f} ms {len(queries) // args.repeat:>5} queries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=500000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--density', type=float, default=0.1, help='share of product-days with consumption')
+    parser.add_argument('--loop-sample', type=int, default=2000, help='products timed with the Python loop')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--endpoint', action='store_true', help='time the endpoint against seeded data')
+    parser.add_argument('--movements', type=int, default=500000, help='movements seeded with --endpoint')
+    args = parser.parse_args()
+
+    setup()
+    if args.endpoint:
+        return endpoint(args)
+    import numpy as np
+    from inventory.forecast import advance, consumption_rates, get_setting, suggest
+
+    window = get_setting('INVENTORY_FORECAST_WINDOW')
+    alpha = get_setting('INVENTORY_FORECAST_ALPHA')
+    rng = np.random.default_rng(0)
+    observations = int(args.products * args.days * args.density)
+    index = rng.integers(0, args.products, observations)
+    age = rng.integers(0, args.days, observations)
+    units = rng.integers(1, 20, observations).astype(np.float64)
+    print(f"{args.products} products x {args.days} days, {observations} daily observations")
+
+    def full():
+        return consumption_rates(index, age, units, args.products, window, alpha)
+
+    moving, smoothed = full()
+    day = int(args.products * args.density)
+    new = (rng.integers(0, args.products, day), rng.integers(1, 20, day).astype(np.float64))
+    old = (index[age == window - 1], units[age == window - 1])
+    quantity = rng.integers(0, 500, args.products)
+    reorder_level = np.full(args.products, 5)
+    rate = np.maximum(moving, smoothed)
+
+    results = {}
+    for name, fn in (
+        ('full build', full),
+        ('advance one day', lambda: advance(moving, smoothed, new, old, window, alpha)),
+        ('suggest', lambda: suggest(quantity, reorder_level, rate, 7, 30)),
+    ):
+        with Timer() as timer:
+            for _ in range(args.repeat):
+                fn()
+        results[name] = timer.elapsed / args.repeat
+        print(f"{name:<16} {results[name] * 1000:>10.1f} ms")
+
+    sample = rng.choice(args.products, min(args.loop_sample, args.products), replace=False)
+    per_product = {int(pk): {} for pk in sample}
+    for pk, a, u in zip(index.tolist(), age.tolist(), units.tolist()):
+        if pk in per_product:
+            per_product[pk][a] = per_product[pk].get(a, 0) + u
+    with Timer() as timer:
+        rates = {pk: loop_rates(days_units, args.days, window, alpha) for pk, days_units in per_product.items()}
+    for pk, (loop_moving, loop_smoothed) in rates.items():
+        assert np.isclose(loop_moving, moving[pk]) and np.isclose(loop_smoothed, smoothed[pk]), pk
+    loop = timer.elapsed / len(sample) * args.products
+    print(f"{'python loop':<16} {loop * 1000:>10.1f} ms (extrapolated from {len(sample)} products, same rates)")
+    print(f"speedup: {loop / results['full build']:.0f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+Checkout holds: reservations vs an OUT movement reversed by an IN.
+
+N writer threads run checkouts against one product; a share of them is
+abandoned. With ``movements`` a checkout holds stock with an OUT movement
+and an abandoned one reverses it with an IN. With ``reservations`` it
+reserves, then confirms or releases. Each round reports checkouts/s and
+the movement and audit rows written, and checks that stock was never
+overbooked. Then ``--expire`` held reservations are swept.
+
+    python -m benchmarks.reservations --writers 1 4 8 --ops 200 --abandon 0.5
+"""
+
+import argparse
+import datetime
+import random
+import sys
+import threading
+
+from benchmarks.runner import Timer, seed_catalog, setup
+
+
+def run_round(mode, writers, ops_per_writer, initial, abandon):
+    from django.db import connection
+    from inventory import audit, reservations
+    from inventory.models import Product, StockAuditLog, StockMovement
+    from inventory.stock import InsufficientStock, record_movement
+
+    product = seed_catalog(quantity=initial)
+    sold = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(writers)
+
+    def checkout(rng):
+        quantity = rng.randint(1, 3)
+        keep = rng.random() >= abandon
+        if mode == 'movements':
+            record_movement(product, 'OUT', quantity)
+            if not keep:
+                record_movement(product, 'IN', quantity)
+        else:
+            reservation = reservations.reserve(product, quantity)
+            if keep:
+                reservations.confirm(reservation.pk)
+            else:
+                reservations.release(reservation.pk)
+        return quantity if keep else 0
+
+    def writer(seed):
+        rng = random.Random(seed)
+        start.wait()
+        try:
+            for _ in range(ops_per_writer):
+                try:
+                    quantity = checkout(rng)
+                except InsufficientStock:
+                    continue
+                with lock:
+                    sold[0] += quantity
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    with Timer() as timer:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    audit.writer.flush()
+    product.refresh_from_db()
+    return {
+        'mode': mode,
+        'writers': writers,
+        'per_sec': writers * ops_per_writer / timer.elapsed,
+        'movements': StockMovement.objects.filter(product=product).count(),
+        'audits': StockAuditLog.objects.filter(product=product).count(),
+        'ok': product.quantity == initial - sold[0] and product.quantity >= 0 and product.reserved == 0,
+    }
+
+
+def run_expiry(count, batch_size):
+    from django.utils import timezone
+    from inventory import reservations
+    from inventory.models import StockReservation
+
+    product = seed_catalog(quantity=count)
+    for _ in range(count):
+        reservations.reserve(product, 1)
+    StockReservation.objects.filter(product=product).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+    with Timer() as timer:
+        expired = reservations.expire(batch_size=batch_size)
+    product.refresh_from_db()
+    return expired, timer.elapsed, product.reserved == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--ops', type=int, default=200, help='checkouts per writer')
+    parser.add_argument('--initial', type=int, default=500, help='starting stock')
+    parser.add_argument('--abandon', type=float, default=0.5, help='share of checkouts given up')
+    parser.add_argument('--expire', type=int, default=10000, help='reservations to sweep')
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    setup()
+    print(f"{'mode':<13} {'writers':>7} {'checkouts/s':>11} {'movements':>9} {'audits':>7}  result")
+    failed = False
+    for writers in args.writers:
+        for mode in ('movements', 'reservations'):
+            r = run_round(mode, writers, args.ops, args.initial, args.abandon)
+            failed |= not r['ok']
+            print(f"{r['mode']:<13} {r['writers']:>7} {r['per_sec']:>11.1f} {r['movements']:>9} {r['audits']:>7}  "
+                  f"{'OK' if r['ok'] else 'MISMATCH'}")
+
+    if args.expire:
+        expired, elapsed, ok = run_expiry(args.expire, args.batch_size)
+        failed |= not ok
+        print(f"\nexpired {expired} reservations in {elapsed:.2f}s ({expired / elapsed:.0f}/s, "
+              f"batches of {args.batch_size})  {'OK' if ok else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Shared helpers for the benchmark scripts."""
+
+import os
+import time
+from contextlib import contextmanager
+
+import django
+
+
+def setup():
+    """Configure Django for a benchmark run and bring the schema up to date."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    django.setup()
+
+    from django.core.management import call_command
+    call_command('migrate', verbosity=0)
+
+
+def seed_catalog(quantity=0):
+    """Create a category, a supplier and one product with the given stock."""
+    from inventory.models import Category, Supplier, Product
+
+    category = Category.objects.create(name='Bench category')
+    supplier = Supplier.objects.create(
+        name='Bench supplier', email='bench@example.com', phone='0', address='-'
+    )
+    return Product.objects.create(
+        name='Bench product', category=category, supplier=supplier,
+        price='1.00', quantity=quantity,
+    )
+
+
+WORDS = (
+    'steel', 'hammer', 'claw', 'drill', 'cordless', 'saw', 'blade', 'wrench', 'socket',
+    'garden', 'hose', 'rake', 'shovel', 'paint', 'brush', 'roller', 'ladder', 'bolt',
+    'screw', 'nail', 'glue', 'tape', 'measure', 'level', 'clamp', 'vise', 'plier', 'cable',
+    'lamp', 'bulb', 'switch', 'socket', 'pipe', 'valve', 'filter', 'pump', 'battery',
+)
+
+
+def seed_products(count, categories=50, suppliers=200, batch=10000, seed=0):
+    """Bulk-insert ``count`` products with random multi-word names.
+
+    bulk_create skips Product.save(), so the derived columns are filled here,
+    the stock ledger is opened and the stock put at the default location for
+    the new products, and the stock summaries are rebuilt once at the end.
+    """
+    import random
+
+    from inventory.models import Category, Supplier, Product, StockLedgerEntry, StockLevel, default_location_id
+    from inventory.search import build_search_text
+    from inventory.summary import rebuild
+
+    rng = random.Random(seed)
+    # Created one by one: bulk_create doesn't return primary keys on MySQL.
+    category_list = [
+        Category.objects.create(name=f'{rng.choice(WORDS).title()} category {i}')
+        for i in range(categories)
+    ]
+    supplier_list = [
+        Supplier.objects.create(name=f'Supplier {i}', email='s@example.com', phone='0', address='-')
+        for i in range(suppliers)
+    ]
+    for start in range(0, count, batch):
+        products = []
+        for _ in range(min(batch, count - start)):
+            category, supplier = rng.choice(category_list), rng.choice(supplier_list)
+            name = ' '.join(rng.sample(WORDS, 3))
+            products.append(Product(
+                name=name,
+                category=category,
+                supplier=supplier,
+                price='1.00',
+                quantity=rng.randint(0, 500),
+                search_text=build_search_text(name, category.name, supplier.name),
+            ))
+        Product.objects.bulk_create(products)
+    unopened = Product.objects.filter(ledger_entries__isnull=True).values_list('id', 'quantity')
+    StockLedgerEntry.objects.bulk_create(
+        [StockLedgerEntry(product_id=pk, kind='ADJ', delta=quantity) for pk, quantity in unopened.iterator()],
+        batch_size=batch,
+    )
+    location_id = default_location_id()
+    unstocked = Product.objects.filter(stock_levels__isnull=True).values_list('id', 'quantity')
+    StockLevel.objects.bulk_create(
+        [StockLevel(product_id=pk, location_id=location_id, quantity=quantity) for pk, quantity in unstocked.iterator()],
+        batch_size=batch,
+    )
+    rebuild()
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """Let bulk_create() keep the ``timestamp`` values it is given."""
+    fields = [model._meta.get_field('timestamp') for model in models]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def seed_movements(count, days=90, batch=10000, seed=0):
+    """Bulk-insert ``count`` stock movements, evenly spread over the last
+    ``days`` complete UTC days, with their audit rows and ledger entries.
+
+    OUT movements never take a product below zero. bulk_create skips the
+    stock write path, so product quantities, the stock summaries and the
+    movement rollups are brought up to date at the end.
+    """
+    import datetime
+    import random
+
+    from django.utils import timezone
+    from inventory.models import Product, StockAuditLog, StockLedgerEntry, StockLevel, StockMovement, default_location_id
+    from inventory.rollups import backfill, bucket_start
+    from inventory.summary import rebuild
+
+    rng = random.Random(seed)
+    location_id = default_location_id()
+    stock = dict(Product.objects.values_list('id', 'quantity').iterator())
+    product_ids = list(stock)
+    touched = set()
+    end = bucket_start(timezone.now(), 'day')
+    start = end - datetime.timedelta(days=days)
+    step = (end - start) / count
+
+    with _explicit_timestamps(StockMovement, StockLedgerEntry):
+        for offset in range(0, count, batch):
+            movements, audits, entries = [], [], []
+            for i in range(offset, min(offset + batch, count)):
+                timestamp = start + step * i
+                pk = rng.choice(product_ids)
+                quantity = rng.randint(1, 10)
+                kind = 'OUT' if stock[pk] >= quantity and rng.random() < 0.5 else 'IN'
+                delta = quantity if kind == 'IN' else -quantity
+                stock[pk] += delta
+                touched.add(pk)
+                movements.append(StockMovement(
+                    product_id=pk, location_id=location_id, movement_type=kind, quantity=quantity, timestamp=timestamp,
+                ))
+                audits.append(StockAuditLog(product_id=pk, movement_type=kind, quantity=quantity, timestamp=timestamp))
+                entries.append(StockLedgerEntry(product_id=pk, kind=kind, delta=delta, timestamp=timestamp))
+            StockMovement.objects.bulk_create(movements)
+            StockAuditLog.objects.bulk_create(audits)
+            StockLedgerEntry.objects.bulk_create(entries)
+
+    Product.objects.bulk_update(
+        [Product(pk=pk, quantity=stock[pk]) for pk in touched], ['quantity'], batch_size=1000
+    )
+    levels = StockLevel.objects.filter(location_id=location_id, slot=0).values_list('id', 'product_id')
+    StockLevel.objects.bulk_update(
+        [StockLevel(pk=pk, quantity=stock[product_id]) for pk, product_id in levels.iterator() if product_id in touched],
+        ['quantity'], batch_size=1000,
+    )
+    rebuild()
+    for _ in backfill(start, end):
+        pass
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+def api_client():
+    """An APIClient authenticated as a throwaway benchmark user."""
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+
+    user, _ = User.objects.get_or_create(username='bench')
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
@@ -0,0 +1,50 @@
+"""
+Per-row cost of rendering list pages: DRF serializers vs the values() fast
+path (orjson when installed, stdlib json otherwise).
+
+    python -m benchmarks.serialization --rows 1000 --repeat 20
+"""
+
+import argparse
+
+from benchmarks.runner import Timer, api_client, seed_products, setup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1000, help='page size')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup()
+    from django.test.utils import override_settings
+    from inventory import fastpath
+    from inventory.models import Product
+
+    if Product.objects.count() < args.rows:
+        seed_products(args.rows)
+    client = api_client()
+    print(f"json encoder: {'orjson' if fastpath.orjson else 'stdlib'}")
+
+    urls = (
+        f'/api/products/?page_size={args.rows}',
+        f'/api/products/?page_size={args.rows}&fields=id,name,quantity',
+    )
+    print(f"{'endpoint':<55} {'serializer us/row':>18} {'fast us/row':>12}")
+    for url in urls:
+        timings = []
+        bodies = []
+        for fast in (False, True):
+            with override_settings(INVENTORY_FAST_LIST_RENDERING=fast):
+                client.get(url)  # warm up
+                with Timer() as timer:
+                    for _ in range(args.repeat):
+                        response = client.get(url)
+            bodies.append(response.content)
+            timings.append(timer.elapsed / args.repeat / args.rows * 1e6)
+        same = 'same output' if bodies[0] == bodies[1] else 'OUTPUT DIFFERS'
+        print(f"{url:<55} {timings[0]:>18.2f} {timings[1]:>12.2f}  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Settings for the benchmark scripts.
+
+Uses the project settings, but swaps the database for a local SQLite file
+unless BENCH_DB=mysql is set, so benchmarks can run without a MySQL server.
+"""
+
+import os
+
+os.environ.setdefault('SECRET_KEY', 'benchmark-only')
+
+from inventory_api.settings import *  # noqa: E402,F401,F403
+from inventory_api.settings import BASE_DIR  # noqa: E402
+
+if os.getenv('BENCH_DB', 'sqlite') == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('BENCH_SQLITE_PATH', str(BASE_DIR / 'bench.sqlite3')),
+            'OPTIONS': {
+                # Writers queue up on SQLite's single write lock instead of failing.
+                'timeout': 60,
+                'init_command': 'PRAGMA journal_mode=WAL;',
+                # Take the write lock when a transaction starts: a read-then-write
+                # transaction that has to upgrade its lock fails at once if
+                # another thread (e.g. the audit writer) is writing.
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }
+    }
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
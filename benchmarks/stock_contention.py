@@ -0,0 +1,97 @@
+"""
+Contention benchmark for the stock-adjustment path.
+
+N writer threads hammer a single product with a mix of IN and OUT
+movements through ``record_movement``. After every round the final
+quantity is checked against the movements that actually committed, so a
+lost update or a double-count fails the run.
+
+    python -m benchmarks.stock_contention --writers 1 2 4 8 16 --ops 200
+"""
+
+import argparse
+import random
+import sys
+import threading
+
+from benchmarks.runner import Timer, seed_catalog, setup
+
+
+def run_round(writers, ops_per_writer, initial):
+    from django.db import connection
+    from inventory import audit
+    from inventory.models import Product, StockAuditLog, StockMovement
+    from inventory.stock import InsufficientStock, record_movement
+
+    product = seed_catalog(quantity=initial)
+    committed = {'IN': 0, 'OUT': 0}
+    rejected = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(writers)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        start.wait()
+        try:
+            for _ in range(ops_per_writer):
+                movement_type = rng.choice(('IN', 'OUT'))
+                quantity = rng.randint(1, 5)
+                try:
+                    record_movement(product, movement_type, quantity)
+                except InsufficientStock:
+                    with lock:
+                        rejected[0] += 1
+                    continue
+                with lock:
+                    committed[movement_type] += quantity
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    with Timer() as timer:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    audit.writer.flush()
+    final = Product.objects.get(pk=product.pk).quantity
+    expected = initial + committed['IN'] - committed['OUT']
+    movements = StockMovement.objects.filter(product=product).count()
+    audits = StockAuditLog.objects.filter(product=product).count()
+    ok = final == expected and final >= 0 and movements == audits
+    return {
+        'writers': writers,
+        'ops': writers * ops_per_writer,
+        'committed': movements,
+        'rejected': rejected[0],
+        'seconds': timer.elapsed,
+        'ops_per_sec': writers * ops_per_writer / timer.elapsed,
+        'final': final,
+        'expected': expected,
+        'ok': ok,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--ops', type=int, default=200, help='movements per writer')
+    parser.add_argument('--initial', type=int, default=50, help='starting stock')
+    args = parser.parse_args()
+
+    setup()
+    print(f"{'writers':>7} {'ops':>7} {'committed':>9} {'rejected':>8} "
+          f"{'ops/s':>9} {'final':>7} {'expected':>8}  result")
+    failed = False
+    for writers in args.writers:
+        r = run_round(writers, args.ops, args.initial)
+        failed |= not r['ok']
+        print(f"{r['writers']:>7} {r['ops']:>7} {r['committed']:>9} {r['rejected']:>8} "
+              f"{r['ops_per_sec']:>9.1f} {r['final']:>7} {r['expected']:>8}  "
+              f"{'OK' if r['ok'] else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
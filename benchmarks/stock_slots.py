@@ -0,0 +1,103 @@
+"""
+Movement throughput on one hot product as its stock is split over more slots.
+
+N writer threads post IN and OUT movements for a single product with
+``stock_slots`` set to each value in turn. ``--hold-ms`` keeps every
+movement's transaction open a little longer, as request work after the
+stock update would. After every round the product's total and the sum of
+its stock levels are checked against the movements that committed.
+
+SQLite lets one writer in at a time whatever the slot count, so run with
+BENCH_DB=mysql to see slots take effect.
+
+    python -m benchmarks.stock_slots --writers 8 --slots 1 2 4 8 16 --ops 200
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from benchmarks.runner import Timer, seed_catalog, setup
+
+
+def run_round(writers, slots, ops_per_writer, initial, hold):
+    from django.db import connection, transaction
+    from django.db.models import Sum
+    from inventory.models import Product, StockLevel
+    from inventory.stock import InsufficientStock, record_movement
+
+    product = seed_catalog(quantity=initial)
+    Product.objects.filter(pk=product.pk).update(stock_slots=slots)
+    product.refresh_from_db()
+    committed = {'IN': 0, 'OUT': 0}
+    rejected = [0]
+    lock = threading.Lock()
+    start = threading.Barrier(writers)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        start.wait()
+        try:
+            for _ in range(ops_per_writer):
+                movement_type = rng.choice(('IN', 'OUT'))
+                quantity = rng.randint(1, 5)
+                try:
+                    with transaction.atomic():
+                        record_movement(product, movement_type, quantity)
+                        if hold:
+                            time.sleep(hold)
+                except InsufficientStock:
+                    with lock:
+                        rejected[0] += 1
+                    continue
+                with lock:
+                    committed[movement_type] += quantity
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    with Timer() as timer:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    final = Product.objects.get(pk=product.pk).quantity
+    levels = StockLevel.objects.filter(product=product).aggregate(total=Sum('quantity'))['total']
+    expected = initial + committed['IN'] - committed['OUT']
+    return {
+        'slots': slots,
+        'ops': writers * ops_per_writer,
+        'rejected': rejected[0],
+        'ops_per_sec': writers * ops_per_writer / timer.elapsed,
+        'final': final,
+        'expected': expected,
+        'ok': final == levels == expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--slots', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--ops', type=int, default=200, help='movements per writer')
+    parser.add_argument('--initial', type=int, default=500, help='starting stock')
+    parser.add_argument('--hold-ms', type=float, default=0, help='extra time each movement transaction stays open')
+    args = parser.parse_args()
+
+    setup()
+    print(f"{args.writers} writers")
+    print(f"{'slots':>5} {'ops':>7} {'rejected':>8} {'ops/s':>9} {'final':>7} {'expected':>8}  result")
+    failed = False
+    for slots in args.slots:
+        r = run_round(args.writers, slots, args.ops, args.initial, args.hold_ms / 1000)
+        failed |= not r['ok']
+        print(f"{r['slots']:>5} {r['ops']:>7} {r['rejected']:>8} {r['ops_per_sec']:>9.1f} "
+              f"{r['final']:>7} {r['expected']:>8}  {'OK' if r['ok'] else 'MISMATCH'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""
+Benchmark every route in inventory/urls.py and save the results as JSON.
+
+    python -m benchmarks.suite --products 10000 --movements 100000 --output results.json
+    python -m benchmarks.suite --http --compare baseline.json --output results.json
+
+Seeds the benchmark database up to ``--products``/``--movements`` (rows
+already there are reused), then runs each scenario ``--requests`` times
+through Django's test client, recording latency percentiles, throughput and
+queries per request. With ``--http`` the GET scenarios are also driven by
+the concurrent load generator from ``benchmarks.load_test`` against
+uvicorn. ``--compare`` reports scenarios that got slower or started running
+more queries than in a saved run, and exits non-zero if any did.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import time
+from collections import namedtuple
+
+from benchmarks import load_test
+from benchmarks.runner import api_client, seed_movements, seed_products, setup
+
+# ``body`` is None or a function of the iteration number returning the
+# request body, so writes don't collide (e.g. unique names or SKUs).
+# ``path`` may be such a function too, for writes to one object each.
+Scenario = namedtuple('Scenario', 'name route method path body content_type', defaults=(None, None))
+
+
+def scenarios(ctx):
+    pk, run = ctx['product'], ctx['run']
+    product_body = {
+        'name': 'Bench product', 'category': ctx['category'], 'supplier': ctx['supplier'], 'quantity': 100,
+    }
+    return [
+        Scenario('categories', 'category-list', 'GET', '/api/categories/'),
+        Scenario('category create', 'category-list', 'POST', '/api/categories/',
+                 lambda i: {'name': f'Bench {run}-{i}'}),
+        Scenario('category detail', 'category-detail', 'GET', f"/api/categories/{ctx['category']}/"),
+        Scenario('suppliers', 'supplier-list', 'GET', '/api/suppliers/'),
+        Scenario('supplier detail', 'supplier-detail', 'GET', f"/api/suppliers/{ctx['supplier']}/"),
+        Scenario('products', 'product-list', 'GET', '/api/products/'),
+        Scenario('products 200 sparse', 'product-list', 'GET', '/api/products/?page_size=200&fields=id,name,quantity'),
+        Scenario('products by price', 'product-list', 'GET', '/api/products/?ordering=-price'),
+        Scenario('product search', 'product-list', 'GET', '/api/products/?search=drill'),
+        Scenario('product create', 'product-list', 'POST', '/api/products/',
+                 lambda i: dict(product_body, price='1.00')),
+        Scenario('product import 100', 'product-import', 'POST', '/api/products/import/',
+                 lambda i: 'sku,name,category,supplier,price,quantity\n' + ''.join(
+                     f"bench-{run}-{i}-{j},Bench import {j},{ctx['category_name']},{ctx['supplier_name']},1.00,10\n"
+                     for j in range(100)
+                 ), 'text/csv'),
+        Scenario('product batch 100', 'product-batch', 'GET',
+                 '/api/products/batch/?ids=' + ','.join(map(str, ctx['products'][:100]))),
+        Scenario('product batch 1000 post', 'product-batch', 'POST', '/api/products/batch/',
+                 lambda i: {'ids': ctx['products'][:1000]}),
+        Scenario('product quantities 1000', 'product-quantities', 'POST', '/api/products/quantities/',
+                 lambda i: {'ids': ctx['products'][:1000]}),
+        Scenario('product detail', 'product-detail', 'GET', f'/api/products/{pk}/'),
+        Scenario('product detail expanded', 'product-detail', 'GET', f'/api/products/{pk}/?expand=category,supplier'),
+        Scenario('product update', 'product-detail', 'PUT', f'/api/products/{pk}/',
+                 lambda i: dict(product_body, price=f'{1 + i % 100}.00')),
+        Scenario('product stock-at', 'product-stock-at', 'GET', f"/api/products/{pk}/stock-at/?ts={ctx['midpoint']}"),
+        Scenario('product stock', 'product-stock', 'GET', f'/api/products/{pk}/stock/'),
+        Scenario('locations', 'location-list', 'GET', '/api/locations/'),
+        Scenario('location create', 'location-list', 'POST', '/api/locations/',
+                 lambda i: {'code': f'B{run % 100000}-{i}', 'name': 'Bench location'}),
+        # Alternates direction, so the main location's stock is left as found.
+        Scenario('stock transfer', 'stock-transfer-list', 'POST', '/api/stock-transfers/',
+                 lambda i: {'product': pk, 'source': ctx['locations'][i % 2], 'destination': ctx['locations'][1 - i % 2],
+                            'quantity': 1}),
+        Scenario('stock transfers', 'stock-transfer-list', 'GET', '/api/stock-transfers/'),
+        Scenario('reservation create', 'reservation-list', 'POST', '/api/reservations/',
+                 lambda i: {'product': pk, 'quantity': 1, 'ttl': 60}),
+        Scenario('reservations', 'reservation-list', 'GET', '/api/reservations/'),
+        Scenario('reservation confirm', 'reservation-confirm', 'POST',
+                 lambda i: f"/api/reservations/{ctx['confirm'][i + 1]}/confirm/"),
+        Scenario('reservation release', 'reservation-release', 'POST',
+                 lambda i: f"/api/reservations/{ctx['release'][i + 1]}/release/"),
+        Scenario('movements', 'stock-movement-list', 'GET', '/api/stock-movements/'),
+        Scenario('movement create', 'stock-movement-list', 'POST', '/api/stock-movements/',
+                 lambda i: {'product': pk, 'movement_type': 'IN' if i % 2 else 'OUT', 'quantity': 1}),
+        Scenario('movement bulk 100', 'stock-movement-bulk', 'POST', '/api/stock-movements/bulk/',
+                 lambda i: [{'product': p, 'movement_type': 'IN', 'quantity': 1} for p in ctx['products'][:100]]),
+        Scenario('movement trends hourly', 'stock-movement-trends', 'GET', '/api/stock-movements/trends/?granularity=hour'),
+        Scenario('movement trends product', 'stock-movement-trends', 'GET', f'/api/stock-movements/trends/?product={pk}'),
+        Scenario('movement detail', 'stock-movement-detail', 'GET', f"/api/stock-movements/{ctx['movement']}/"),
+        Scenario('audit log', 'stock-audit', 'GET', '/api/stock-audit/'),
+        Scenario('movement export 1 day', 'stock-movement-export', 'GET',
+                 f"/api/stock-movements/export/?since={ctx['last_day']}"),
+        Scenario('audit export product csv', 'stock-audit-export', 'GET', f'/api/stock-audit/export/?fmt=csv&product={pk}'),
+        Scenario('low stock', 'low-stock', 'GET', '/api/low-stock/'),
+        Scenario('low stock feed', 'low-stock-feed', 'GET', '/api/low-stock/feed/'),
+        Scenario('changes', 'change-feed', 'GET', f"/api/changes/?since={ctx['change']}"),
+        Scenario('change stream backlog', 'change-stream', 'GET', f"/api/changes/stream/?since={ctx['change']}&timeout=0"),
+        Scenario('reorder suggestions', 'reorder-suggestions', 'GET', '/api/reorder-suggestions/'),
+        Scenario('stats', 'inventory-stats', 'GET', '/api/inventory/stats/'),
+        Scenario('cache stats', 'cache-stats', 'GET', '/api/cache/stats/'),
+        Scenario('metrics', 'metrics', 'GET', '/api/metrics/'),
+        Scenario('register', 'register', 'POST', '/api/register/',
+                 lambda i: {'username': f'bench-{run}-{i}', 'password': load_test.PASSWORD}),
+    ]
+
+
+def uncovered_routes(scenario_list):
+    """Names of routes in inventory/urls.py that no scenario exercises."""
+    from django.urls import get_resolver
+
+    covered = {scenario.route for scenario in scenario_list}
+    names = {pattern.name for pattern in get_resolver('inventory.urls').url_patterns if pattern.name}
+    return sorted(names - covered)
+
+
+def _held(product_id, count):
+    """Ids of ``count`` fresh one-unit reservations of a product."""
+    from inventory.models import Product
+    from inventory.reservations import reserve
+    from inventory.stock import record_movement
+
+    product = Product.objects.get(pk=product_id)
+    record_movement(product, 'IN', count)
+    return [reserve(product, 1).pk for _ in range(count)]
+
+
+def _context(requests):
+    from django.db.models import Max, Min
+    from inventory.models import Change, Location, Product, StockMovement, default_location_id
+
+    product = Product.objects.select_related('category', 'supplier').order_by('id').first()
+    bounds = StockMovement.objects.aggregate(first=Min('timestamp'), last=Max('timestamp'), movement=Max('id'))
+    now = datetime.datetime.now(datetime.timezone.utc)
+    first, last = bounds['first'] or now, bounds['last'] or now
+    return {
+        'run': int(time.time()),
+        'product': product.pk,
+        'products': list(Product.objects.order_by('id').values_list('id', flat=True)[:1000]),
+        'category': product.category_id,
+        'category_name': product.category.name,
+        'supplier': product.supplier_id,
+        'supplier_name': product.supplier.name,
+        'movement': bounds['movement'] or 0,
+        # A page back from the end of the change feed.
+        'change': max((Change.objects.aggregate(last=Max('id'))['last'] or 0) - 500, 0),
+        'locations': [
+            default_location_id(),
+            Location.objects.get_or_create(code='BENCH', defaults={'name': 'Benchmark location'})[0].pk,
+        ],
+        'midpoint': (first + (last - first) / 2).isoformat().replace('+00:00', 'Z'),
+        'last_day': (last - datetime.timedelta(days=1)).isoformat().replace('+00:00', 'Z'),
+        # One per request, plus the warm-up call.
+        'confirm': _held(product.pk, requests + 1),
+        'release': _held(product.pk, requests + 1),
+    }
+
+
+def _summary(latencies, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(load_test.percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(load_test.percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(load_test.percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+async def _drain(content):
+    async for _ in content:
+        pass
+
+
+def run_client(client, scenario, requests):
+    """Time ``requests`` calls of a scenario through the test client."""
+    from asgiref.sync import async_to_sync
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    def call(i):
+        kwargs = {}
+        if scenario.body is not None:
+            body = scenario.body(i)
+            if scenario.content_type:
+                kwargs = {'data': body, 'content_type': scenario.content_type}
+            else:
+                kwargs = {'data': body, 'format': 'json'}
+        path = scenario.path(i) if callable(scenario.path) else scenario.path
+        response = getattr(client, scenario.method.lower())(path, **kwargs)
+        if response.streaming and response.is_async:
+            async_to_sync(_drain)(response.streaming_content)
+        elif response.streaming:
+            b''.join(response.streaming_content)
+        return response.status_code
+
+    call(-1)  # warm up
+    latencies, queries, statuses = [], [], {}
+    start = time.perf_counter()
+    for i in range(requests):
+        with CaptureQueriesContext(connection) as captured:
+            began = time.perf_counter()
+            status = call(i)
+            latencies.append(time.perf_counter() - began)
+        queries.append(len(captured))
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    result = _summary(latencies, time.perf_counter() - start)
+    result.update({
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'statuses': statuses,
+    })
+    return result
+
+
+def run_http(url, token, scenario, clients, duration):
+    latencies, errors, elapsed = asyncio.run(
+        load_test.load(url, token, [0], clients, duration, paths=(scenario.path,))
+    )
+    result = _summary(latencies, elapsed)
+    result['clients'] = clients
+    result['errors'] = {str(key): value for key, value in errors.items()}
+    return result
+
+
+def compare(baseline, results, threshold):
+    """``[(scenario, metric, before, after)]`` for scenarios that got slower
+    by more than ``threshold`` (a fraction) or run more queries."""
+    regressions = []
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        for mode in ('client', 'http'):
+            before, after = previous.get(mode), current.get(mode)
+            if not before or not after:
+                continue
+            for metric in ('p50_ms', 'p99_ms'):
+                if after[metric] > before[metric] * (1 + threshold):
+                    regressions.append((name, f'{mode} {metric}', before[metric], after[metric]))
+            if mode == 'client' and after['queries_max'] > before['queries_max']:
+                regressions.append((name, 'queries_max', before['queries_max'], after['queries_max']))
+    return regressions
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--products', type=int, default=10000)
+    parser.add_argument('--movements', type=int, default=100000)
+    parser.add_argument('--days', type=int, default=90, help='days the seeded movements span')
+    parser.add_argument('--requests', type=int, default=50, help='test-client requests per scenario')
+    parser.add_argument('--only', nargs='+', help='run scenarios whose name contains any of these')
+    parser.add_argument('--http', action='store_true', help='also load-test GET scenarios under uvicorn')
+    parser.add_argument('--stack', choices=['sync', 'async'], default='sync', help='view stack for --http')
+    parser.add_argument('--clients', type=int, default=50, help='concurrent clients for --http')
+    parser.add_argument('--duration', type=float, default=5, help='seconds per scenario for --http')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--output', '-o', help='write the results as JSON')
+    parser.add_argument('--compare', help='a previous results file to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown, as a fraction')
+    args = parser.parse_args()
+
+    setup()
+    import django
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from inventory.models import Product, StockMovement
+
+    products = Product.objects.count()
+    if products < args.products:
+        seed_products(args.products - products)
+    movements = StockMovement.objects.count()
+    if movements < args.movements:
+        seed_movements(args.movements - movements, days=args.days)
+
+    scenario_list = scenarios(_context(args.requests))
+    missing = uncovered_routes(scenario_list)
+    if missing:
+        print(f"routes without a scenario: {', '.join(missing)}")
+    if args.only:
+        scenario_list = [s for s in scenario_list if any(term in s.name for term in args.only)]
+
+    results = {
+        'meta': {
+            'started': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'commit': _git_commit(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'products': Product.objects.count(),
+            'movements': StockMovement.objects.count(),
+            'requests': args.requests,
+        },
+        'uncovered_routes': missing,
+        'scenarios': {},
+    }
+
+    client = api_client()
+    print(f"{'scenario':<28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}  statuses")
+    for scenario in scenario_list:
+        result = run_client(client, scenario, args.requests)
+        results['scenarios'][scenario.name] = {
+            'route': scenario.route, 'method': scenario.method,
+            'path': scenario.path(0) if callable(scenario.path) else scenario.path, 'client': result,
+        }
+        print(f"{scenario.name:<28} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['queries_mean']:>8.1f}  {result['statuses']}")
+
+    if args.http:
+        user, _ = User.objects.get_or_create(username='bench')
+        user.set_password(load_test.PASSWORD)
+        user.save()
+        process, url = load_test.start_server(args.stack, args.port, workers=1)
+        try:
+            token = asyncio.run(load_test.get_token(url, user.username))
+            print(f"\n{args.clients} clients, {args.duration:g}s per scenario, {args.stack} stack")
+            print(f"{'scenario':<28} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  errors")
+            for scenario in scenario_list:
+                if scenario.method != 'GET':
+                    continue
+                result = run_http(url, token, scenario, args.clients, args.duration)
+                results['scenarios'][scenario.name]['http'] = result
+                print(f"{scenario.name:<28} {result['rps']:>8.0f} {result['p50_ms']:>8.2f} "
+                      f"{result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}  {result['errors'] or '-'}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, results, args.threshold)
+        print(f"\ncompared with {args.compare} (commit {baseline['meta'].get('commit')}): "
+              f"{len(regressions) or 'no'} regressions")
+        for name, metric, before, after in regressions:
+            print(f"  {name:<28} {metric:<14} {before} -> {after}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
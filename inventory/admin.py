@@ -1,7 +1,30 @@
 from django.contrib import admin
-from .models import Category, Supplier, Product, StockMovement
+from .models import Category, Supplier, Product, StockMovement, StockAuditLog
+
+
+# The models' __str__ methods follow foreign keys; select them up front so
+# change lists don't run one query per row.
+class ProductAdmin(admin.ModelAdmin):
+    list_select_related = ('category',)
+
+
+class StockMovementAdmin(admin.ModelAdmin):
+    list_select_related = ('product',)
+
+    # Movements are ledger entries: they can be added but never changed.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class StockAuditLogAdmin(admin.ModelAdmin):
+    list_select_related = ('product', 'user')
+
 
 admin.site.register(Category)
 admin.site.register(Supplier)
-admin.site.register(Product)
-admin.site.register(StockMovement)
+admin.site.register(Product, ProductAdmin)
+admin.site.register(StockMovement, StockMovementAdmin)
+admin.site.register(StockAuditLog, StockAuditLogAdmin)
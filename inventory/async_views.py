@@ -0,0 +1,195 @@
+"""
+Async versions of the read-heavy endpoints, for ASGI deployments.
+
+Enabled with ``INVENTORY_ASYNC_VIEWS``; ``inventory/urls.py`` then routes
+these paths here instead of to ``inventory/views.py``. GET requests query
+through Django's async ORM so a request waiting on the database doesn't
+hold a thread. Work with no async API (JWT user lookup, serializers, the
+in-process search index) runs on a bounded thread pool, and every other
+method is handed to the sync view unchanged.
+"""
+
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from . import changes, views
+from .cache import acached_get
+from .fastpath import afast_list_response, dumps, fast_path_enabled, get_fields
+from .metrics import measure_serialization
+from .models import Product, StockAuditLog
+from .pagination import LowStockPagination, ProductPagination, SearchPagination, TimelinePagination
+from .search import search_products
+from .serializers import ProductSerializer, StockAuditLogSerializer
+from .summary import asummary_totals
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'INVENTORY_ASYNC_THREADS', 16),
+    thread_name_prefix='inventory-async',
+)
+
+
+def _call(func, *args, **kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Pool threads outlive requests; release their connections the way
+        # request_finished does for request threads.
+        close_old_connections()
+
+
+async def run_sync(func, *args, **kwargs):
+    """Run blocking ``func`` on the async views' thread pool."""
+    return await sync_to_async(_call, thread_sensitive=False, executor=_executor)(func, *args, **kwargs)
+
+
+def _serialize(serializer_class, instance, **kwargs):
+    with measure_serialization():
+        return serializer_class(instance, **kwargs).data
+
+
+def _json(data, status_code=status.HTTP_200_OK):
+    with measure_serialization():
+        body = dumps(data)
+    return HttpResponse(body, status=status_code, content_type='application/json')
+
+
+def _exception_response(exc, request):
+    detail = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    response = _json(detail, exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        authenticators = request.authenticators
+        if authenticators:
+            response['WWW-Authenticate'] = authenticators[0].authenticate_header(request)
+    return response
+
+
+def read_view(sync_view, authenticated=True):
+    """Serve GET with the decorated coroutine and anything else with ``sync_view``.
+
+    The coroutine gets a DRF ``Request`` (for ``query_params`` and the
+    authenticated user) that has already passed the same authentication and
+    ``IsAuthenticated`` check the sync view would apply. DRF exceptions it
+    raises are answered as DRF would, with their status and detail.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            drf_request = Request(
+                request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            )
+            try:
+                user = await run_sync(lambda: drf_request.user)
+                if authenticated and not (user and user.is_authenticated):
+                    raise exceptions.NotAuthenticated()
+                # Bad ordering, cursor or page size parameters raise these too.
+                return await handler(drf_request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return _exception_response(exc, drf_request)
+        return csrf_exempt(view)
+    return decorator
+
+
+async def _list_response(request, queryset, serializer_class, paginator, expand):
+    """Async ``views._list_response()``."""
+    fields = get_fields(request, serializer_class)
+    if fast_path_enabled(expand):
+        return await afast_list_response(request, queryset, serializer_class, paginator, fields)
+
+    queryset = views._narrow_columns(request, queryset, serializer_class, paginator, fields)
+    result_page = await paginator.apaginate_queryset(queryset, request)
+    data = await run_sync(
+        _serialize, serializer_class, result_page, many=True, context={'expand': expand, 'fields': fields}
+    )
+    return _json(paginator.get_paginated_payload(data))
+
+
+@read_view(views.product_list)
+async def product_list(request):
+    category = request.GET.get('category')
+    supplier = request.GET.get('supplier')
+    search = request.GET.get('search')
+
+    expand = views._get_expand(request, ProductSerializer)
+    products = Product.objects.select_related(*expand)
+    if category:
+        products = products.filter(category_id=category)
+    if supplier:
+        products = products.filter(supplier_id=supplier)
+
+    paginator = ProductPagination()
+    if search:
+        products = await run_sync(search_products, products, search)
+        if not request.GET.get('ordering'):
+            paginator = SearchPagination()
+    return await _list_response(request, products, ProductSerializer, paginator, expand)
+
+
+@read_view(views.product_detail)
+async def product_detail(request, pk):
+    expand = views._get_expand(request, ProductSerializer)
+
+    async def build():
+        product = await Product.objects.select_related(*expand).aget(pk=pk)
+        return await run_sync(_serialize, ProductSerializer, product, context={'expand': expand})
+
+    return await acached_get(request, f'product:{pk}', build, depends_on=views._expand_dependencies(expand))
+
+
+@read_view(views.low_stock_products, authenticated=False)
+async def low_stock_products(request):
+    paginator = LowStockPagination()
+    products = views._low_stock_queryset(request.GET.get('threshold'), paginator)
+    if products is None:
+        return _json({'error': "threshold must be a non-negative integer"}, status.HTTP_400_BAD_REQUEST)
+
+    result_page = await paginator.apaginate_queryset(products, request)
+    return _json(paginator.get_paginated_payload([views._low_stock_row(p) for p in result_page]))
+
+
+@read_view(views.inventory_stats, authenticated=False)
+async def inventory_stats(request):
+    by = request.GET.get('by', 'category')
+    if by not in ('category', 'supplier'):
+        return _json({'error': "by must be 'category' or 'supplier'"}, status.HTTP_400_BAD_REQUEST)
+    return await acached_get(request, 'stats', lambda: asummary_totals(by))
+
+
+@read_view(views.stock_audit_logs)
+async def stock_audit_logs(request):
+    expand = views._get_expand(request, StockAuditLogSerializer)
+    logs = StockAuditLog.objects.select_related(*expand)
+    return await _list_response(request, logs, StockAuditLogSerializer, TimelinePagination(), expand)
+
+
+@read_view(views.change_feed)
+async def change_stream(request):
+    """Server-sent events for the change feed, from ``Last-Event-ID`` or
+    ``?since=`` (default: from now on), for up to ``?timeout=`` seconds.
+
+    Always async: under ASGI a connection only holds a hub subscription,
+    not a thread.
+    """
+    since = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('since')
+    timeout = request.GET.get('timeout')
+    if (since and not since.isdigit()) or (timeout and not timeout.isdigit()):
+        return _json({'error': "since and timeout must be non-negative integers"}, status.HTTP_400_BAD_REQUEST)
+    response = StreamingHttpResponse(
+        changes.stream(int(since) if since else None, int(timeout) if timeout else None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Don't let a reverse proxy hold events back.
+    response['X-Accel-Buffering'] = 'no'
+    return response
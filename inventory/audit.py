@@ -0,0 +1,295 @@
+"""
+Stock audit trail, written off the request path.
+
+``record()`` is called by the stock write paths inside the movement's
+transaction. What it does depends on ``INVENTORY_AUDIT_MODE``:
+
+``'async'`` (default)
+    After commit, entries go onto a bounded in-process queue. A background
+    thread writes them with ``bulk_create``, as soon as
+    ``INVENTORY_AUDIT_BATCH_SIZE`` are waiting or every
+    ``INVENTORY_AUDIT_FLUSH_INTERVAL`` seconds. When the queue is full, the
+    request waits up to ``INVENTORY_AUDIT_ENQUEUE_TIMEOUT`` seconds and then
+    writes its entries itself, so nothing is dropped under load. Entries
+    still queued when the process is killed are lost; the queue is drained
+    at normal exit.
+``'outbox'``
+    Entries are inserted into ``StockAuditOutbox`` in the movement's
+    transaction, so they survive a crash. The background thread moves them
+    to ``StockAuditLog`` in batches. The ``flush_audit_outbox`` command
+    does the same, e.g. for rows left by a process that died.
+``'sync'``
+    ``StockAuditLog`` rows are written in the request, as before.
+
+``writer.stats()`` (also exported on ``/metrics``) reports the queue depth
+and how often requests had to write themselves.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .models import Product, StockAuditLog, StockAuditOutbox
+
+logger = logging.getLogger('inventory.audit')
+
+MODES = ('async', 'outbox', 'sync')
+
+# Attempts, with a growing pause between them, to write a batch before its
+# entries are logged and counted as dropped.
+WRITE_ATTEMPTS = 3
+
+Entry = namedtuple('Entry', 'product_id movement_type quantity user_id timestamp')
+
+
+def get_mode():
+    mode = getattr(settings, 'INVENTORY_AUDIT_MODE', 'async')
+    if mode not in MODES:
+        raise ValueError(f"INVENTORY_AUDIT_MODE must be one of {', '.join(MODES)}, not {mode!r}")
+    return mode
+
+
+def get_queue_size():
+    return getattr(settings, 'INVENTORY_AUDIT_QUEUE_SIZE', 10000)
+
+
+def get_batch_size():
+    return getattr(settings, 'INVENTORY_AUDIT_BATCH_SIZE', 500)
+
+
+def get_flush_interval():
+    return getattr(settings, 'INVENTORY_AUDIT_FLUSH_INTERVAL', 1.0)
+
+
+def get_enqueue_timeout():
+    return getattr(settings, 'INVENTORY_AUDIT_ENQUEUE_TIMEOUT', 0.05)
+
+
+def entry(product_id, movement_type, quantity, user=None, timestamp=None):
+    return Entry(
+        product_id, movement_type, quantity, user.pk if user is not None else None, timestamp or timezone.now()
+    )
+
+
+def _logs(entries):
+    return [
+        StockAuditLog(product_id=e.product_id, movement_type=e.movement_type, quantity=e.quantity,
+                      user_id=e.user_id, timestamp=e.timestamp)
+        for e in entries
+    ]
+
+
+def _write(entries):
+    """Insert audit rows for ``entries``. Products deleted since their
+    movement take their audit rows with them, as the cascade would have."""
+    try:
+        with transaction.atomic():
+            StockAuditLog.objects.bulk_create(_logs(entries), batch_size=get_batch_size())
+    except IntegrityError:
+        products = set(Product.objects.filter(pk__in={e.product_id for e in entries}).values_list('id', flat=True))
+        users = set(User.objects.filter(pk__in={e.user_id for e in entries} - {None}).values_list('id', flat=True))
+        entries = [
+            e._replace(user_id=e.user_id if e.user_id in users else None)
+            for e in entries if e.product_id in products
+        ]
+        StockAuditLog.objects.bulk_create(_logs(entries), batch_size=get_batch_size())
+
+
+def relay_outbox(batch_size=None):
+    """Move every ``StockAuditOutbox`` row to ``StockAuditLog``, one batch
+    per transaction; returns the number moved."""
+    batch_size = batch_size or get_batch_size()
+    moved = 0
+    while True:
+        with transaction.atomic():
+            pending = StockAuditOutbox.objects.order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                # Relays in other processes take the next batch instead of waiting.
+                pending = pending.select_for_update(skip_locked=True)
+            rows = list(pending.values_list('id', 'product_id', 'movement_type', 'quantity', 'user_id', 'timestamp')[:batch_size])
+            if not rows:
+                return moved
+            StockAuditLog.objects.bulk_create(_logs(Entry(*row[1:]) for row in rows))
+            StockAuditOutbox.objects.filter(id__in=[row[0] for row in rows]).delete()
+        moved += len(rows)
+
+
+class AuditWriter:
+    """Per-process background writer for the audit trail."""
+
+    COUNTERS = ('enqueued', 'written', 'relayed', 'flushes', 'overflowed', 'dropped')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._relay_pending = False
+        self._counts = dict.fromkeys(self.COUNTERS, 0)
+        self._enqueue_wait = 0.0
+        self._high_water = 0
+        atexit.register(self.stop)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _ensure_started(self):
+        with self._lock:
+            # A forked worker gets its own queue and thread.
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=get_queue_size())
+            self._pid = os.getpid()
+            self._stopping.clear()
+            # Rows a previous process left in the outbox are picked up on start.
+            self._relay_pending = get_mode() == 'outbox'
+            self._thread = threading.Thread(target=self._run, name='inventory-audit-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, entries):
+        """Queue committed entries; any that don't fit in time are written here."""
+        self._ensure_started()
+        start = time.perf_counter()
+        overflow = []
+        for i, e in enumerate(entries):
+            try:
+                self._queue.put(e, timeout=get_enqueue_timeout())
+            except queue.Full:
+                overflow = entries[i:]
+                break
+        waited = time.perf_counter() - start
+        depth = self._queue.qsize()
+        with self._lock:
+            self._counts['enqueued'] += len(entries) - len(overflow)
+            self._enqueue_wait += waited
+            self._high_water = max(self._high_water, depth)
+        if depth >= get_batch_size():
+            self._wake.set()
+        if overflow:
+            _write(overflow)
+            self._count('overflowed', len(overflow))
+            self._count('written', len(overflow))
+
+    def notify_outbox(self):
+        """Have the writer relay the outbox soon; called after an outbox insert commits."""
+        self._ensure_started()
+        self._relay_pending = True
+        self._wake.set()
+
+    def _take(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_batch(self, batch):
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                _write(batch)
+            except Exception:
+                # The connection may be broken; the next attempt reconnects.
+                connection.close()
+                if attempt == WRITE_ATTEMPTS:
+                    logger.exception('Dropped %d audit entries after %d attempts: %r', len(batch), attempt, batch)
+                    self._count('dropped', len(batch))
+                    return
+                time.sleep(0.1 * 2 ** attempt)
+            else:
+                self._count('flushes')
+                self._count('written', len(batch))
+                return
+
+    def _drain(self):
+        while True:
+            batch = self._take(get_batch_size())
+            if not batch:
+                break
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        if self._relay_pending:
+            self._relay_pending = False
+            try:
+                self._count('relayed', relay_outbox())
+            except DatabaseError:
+                connection.close()
+                self._relay_pending = True
+                logger.exception('Relaying the audit outbox failed; will retry')
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                self._wake.wait(get_flush_interval())
+                self._wake.clear()
+                self._drain()
+            self._drain()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Block until everything queued so far (and the outbox) is written."""
+        if get_mode() == 'outbox':
+            self._count('relayed', relay_outbox())
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._wake.set()
+        self._queue.join()
+
+    def stop(self, timeout=10.0):
+        """Write what is queued and stop the thread (runs at interpreter exit)."""
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+            self._thread = None
+        if thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.warning('Audit writer still had %d entries queued at shutdown', self._queue.qsize())
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counts)
+            stats['enqueue_wait_seconds'] = self._enqueue_wait
+            stats['queue_high_water'] = self._high_water
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        stats['queue_capacity'] = get_queue_size()
+        return stats
+
+
+writer = AuditWriter()
+
+
+def record(entries):
+    """Audit a movement transaction's ``entries`` (from ``entry()``); call
+    it inside the transaction."""
+    if not entries:
+        return
+    mode = get_mode()
+    if mode == 'sync':
+        StockAuditLog.objects.bulk_create(_logs(entries), batch_size=get_batch_size())
+    elif mode == 'outbox':
+        StockAuditOutbox.objects.bulk_create(
+            [StockAuditOutbox(**e._asdict()) for e in entries], batch_size=get_batch_size()
+        )
+        transaction.on_commit(writer.notify_outbox)
+    else:
+        transaction.on_commit(lambda: writer.submit(entries))
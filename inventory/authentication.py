@@ -0,0 +1,125 @@
+"""
+JWT authentication without a ``auth_user`` query on every request.
+
+``CachedJWTAuthentication`` validates the token exactly like simplejwt's
+``JWTAuthentication`` (signature and expiry are checked in process, no
+query), then resolves the user from a per-process cache of up to
+``INVENTORY_AUTH_USER_CACHE_SIZE`` users, each kept for
+``INVENTORY_AUTH_USER_CACHE_TTL`` seconds. Saving or deleting a user
+(e.g. deactivating it or changing its password) drops it from the cache of
+the process that did it when the transaction commits; other processes
+notice within the TTL.
+
+With ``INVENTORY_AUTH_STATELESS`` no lookup is made at all: ``request.user``
+is simplejwt's ``TokenUser``, built from the token's claims. A user who is
+deactivated then keeps access until their access token expires.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+def get_ttl():
+    return getattr(settings, 'INVENTORY_AUTH_USER_CACHE_TTL', 60)
+
+
+def get_cache_size():
+    return getattr(settings, 'INVENTORY_AUTH_USER_CACHE_SIZE', 10000)
+
+
+def is_stateless():
+    return getattr(settings, 'INVENTORY_AUTH_STATELESS', False)
+
+
+class UserCache:
+    """Thread-safe LRU of user instances by user id (as a string, like the
+    token claim), with a TTL."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._users = OrderedDict()
+        # Bumped on every discard, so a lookup that raced an invalidation
+        # doesn't cache the row it read before the change committed.
+        self.generation = 0
+        self.hits = self.misses = 0
+
+    def get(self, user_id):
+        with self._lock:
+            cached = self._users.get(user_id)
+            if cached is None or cached[1] <= time.monotonic():
+                if cached is not None:
+                    del self._users[user_id]
+                self.misses += 1
+                return None
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return cached[0]
+
+    def put(self, user_id, user, generation):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._users[user_id] = (user, time.monotonic() + get_ttl())
+            self._users.move_to_end(user_id)
+            while len(self._users) > get_cache_size():
+                self._users.popitem(last=False)
+
+    def discard(self, user_id):
+        with self._lock:
+            self.generation += 1
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._users.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._users)}
+
+
+users = UserCache()
+
+
+def user_changed(user):
+    """Forget ``user`` once the current transaction commits."""
+    user_id = str(getattr(user, api_settings.USER_ID_FIELD))
+    transaction.on_commit(lambda: users.discard(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` with users served from ``users`` (or, in
+    stateless mode, from the token)."""
+
+    def get_user(self, validated_token):
+        if is_stateless():
+            return JWTStatelessUserAuthentication.get_user(self, validated_token)
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)  # raises InvalidToken
+
+        user = users.get(str(user_id))
+        if user is None:
+            generation = users.generation
+            # Loads the user and applies the active and revocation checks;
+            # only users that pass are cached.
+            user = super().get_user(validated_token)
+            users.put(str(user_id), user, generation)
+        elif api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        # Each request gets its own instance, so nothing it caches on the
+        # user leaks into another request.
+        return copy.copy(user)
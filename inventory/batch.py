@@ -0,0 +1,91 @@
+"""
+Batch reads: many products per request instead of one ``product_detail``
+call per id.
+
+``/api/products/batch/`` and ``/api/products/quantities/`` take up to
+``INVENTORY_BATCH_MAX_IDS`` ids and look them up
+``INVENTORY_BATCH_CHUNK_SIZE`` at a time with ``id__in``, which keeps each
+statement well under the databases' bound-parameter limits. Answers come
+back in request order, with a marker in place of every id that doesn't
+exist.
+"""
+
+from django.conf import settings
+
+from .fastpath import fast_path_enabled, render_rows, row_spec
+from .metrics import measure_serialization
+from .models import Product
+from .serializers import ProductSerializer
+
+
+class BatchError(ValueError):
+    pass
+
+
+def get_max_ids():
+    return getattr(settings, 'INVENTORY_BATCH_MAX_IDS', 5000)
+
+
+def get_chunk_size():
+    return getattr(settings, 'INVENTORY_BATCH_CHUNK_SIZE', 500)
+
+
+def parse_ids(value):
+    """Product ids from ``"1,2,3"`` or a list, in order; raises BatchError."""
+    if isinstance(value, str):
+        value = [part.strip() for part in value.split(',') if part.strip()]
+    if not isinstance(value, list):
+        raise BatchError("ids must be a list of product ids")
+    if not value:
+        raise BatchError("ids is required")
+    if len(value) > get_max_ids():
+        raise BatchError(f"At most {get_max_ids()} ids per request")
+    ids = []
+    for item in value:
+        if isinstance(item, str) and item.isdigit():
+            item = int(item)
+        if not isinstance(item, int) or isinstance(item, bool) or item < 0:
+            raise BatchError(f"Invalid product id: {item!r}")
+        ids.append(item)
+    return ids
+
+
+def in_chunks(queryset, ids):
+    """Rows of ``queryset`` among the distinct ``ids``, one query per chunk."""
+    distinct = list(dict.fromkeys(ids))
+    size = get_chunk_size()
+    for start in range(0, len(distinct), size):
+        yield from queryset.filter(id__in=distinct[start:start + size])
+
+
+def not_found(pk):
+    return {'id': pk, 'error': 'Not found'}
+
+
+def products(ids, fields=None, expand=()):
+    """Serialized products for ``ids`` in the same order (repeats included),
+    plus the ids that don't exist."""
+    if fast_path_enabled(expand):
+        columns = [column for name, column, _, _ in row_spec(ProductSerializer) if fields is None or name in fields]
+        rows = list(in_chunks(Product.objects.values('id', *[c for c in columns if c != 'id']), ids))
+        found = {row['id']: item for row, item in zip(rows, render_rows(ProductSerializer, fields, rows))}
+    else:
+        rows = list(in_chunks(Product.objects.select_related(*expand), ids))
+        with measure_serialization():
+            data = ProductSerializer(rows, many=True, context={'expand': expand, 'fields': fields}).data
+        found = {row.pk: item for row, item in zip(rows, data)}
+    missing = list(dict.fromkeys(pk for pk in ids if pk not in found))
+    return [found[pk] if pk in found else not_found(pk) for pk in ids], missing
+
+
+def quantities(ids):
+    """``{id: quantity}`` and ``{id: available}`` in request order, None for
+    ids that don't exist."""
+    found = {pk: (quantity, reserved) for pk, quantity, reserved in
+             in_chunks(Product.objects.values_list('id', 'quantity', 'reserved'), ids)}
+    on_hand, available = {}, {}
+    for pk in ids:
+        row = found.get(pk)
+        on_hand[pk] = row[0] if row else None
+        available[pk] = row[0] - row[1] if row else None
+    return on_hand, available
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .fastpath import dumps
+
+KEY_PREFIX = 'inventory'
+
+_counters = {'hits': 0, 'misses': 0, 'not_modified': 0, 'invalidations': 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def cache_stats():
+    """Per-process hit/miss counters."""
+    with _counters_lock:
+        stats = dict(_counters)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def get_cache():
+    return caches[getattr(settings, 'INVENTORY_CACHE_ALIAS', 'default')]
+
+
+def _version_key(resource):
+    return f'{KEY_PREFIX}:version:{resource}'
+
+
+def _get_version(cache, resource):
+    version = cache.get(_version_key(resource))
+    if version is None:
+        # A fresh, never-reused number so an evicted version key can't
+        # resurrect entries cached under an older version.
+        cache.add(_version_key(resource), time.time_ns())
+        version = cache.get(_version_key(resource))
+    return version
+
+
+def resource_version(resource):
+    """Current version of ``resource``; it changes whenever the resource is invalidated."""
+    return _get_version(get_cache(), resource)
+
+
+def _bump_version(cache, resource):
+    try:
+        version = cache.incr(_version_key(resource))
+    except ValueError:
+        version = time.time_ns()
+        cache.set(_version_key(resource), version)
+    _count('invalidations')
+    return version
+
+
+def _bump(resources):
+    cache = get_cache()
+    for resource in resources:
+        _bump_version(cache, resource)
+
+
+def bump_version(resource):
+    """Invalidate ``resource`` right away (outside any transaction) and
+    return its new version."""
+    return _bump_version(get_cache(), resource)
+
+
+def invalidate(*resources):
+    """Drop every cached payload of the given resources once the current
+    transaction commits (immediately when there is none)."""
+    transaction.on_commit(lambda: _bump(resources))
+
+
+def _params_digest(request):
+    params = sorted(request.query_params.lists())
+    return hashlib.md5(json.dumps(params).encode()).hexdigest()
+
+
+def _entry_key(cache, resource, depends_on, request):
+    versions = '.'.join(str(_get_version(cache, r)) for r in (resource, *depends_on))
+    return f'{KEY_PREFIX}:{resource}:{versions}:{_params_digest(request)}'
+
+
+async def _aget_version(cache, resource):
+    version = await cache.aget(_version_key(resource))
+    if version is None:
+        await cache.aadd(_version_key(resource), time.time_ns())
+        version = await cache.aget(_version_key(resource))
+    return version
+
+
+async def _aentry_key(cache, resource, depends_on, request):
+    versions = '.'.join([str(await _aget_version(cache, r)) for r in (resource, *depends_on)])
+    return f'{KEY_PREFIX}:{resource}:{versions}:{_params_digest(request)}'
+
+
+def _make_entry(data):
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    return (f'"{hashlib.md5(body).hexdigest()}"', data)
+
+
+def _etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def cached_get(request, resource, build, depends_on=()):
+    """Serve a GET from the cache, calling ``build()`` for the data on a miss.
+
+    Payloads are cached per resource and per query-parameter set, tagged
+    with an ETag so clients can revalidate with ``If-None-Match`` and get a
+    304 without anything being serialized. Invalidating ``resource`` or any
+    resource in ``depends_on`` drops the entry. ``build`` may raise
+    ``DoesNotExist`` to produce an (uncached) 404.
+    """
+    cache = get_cache()
+    key = _entry_key(cache, resource, depends_on, request)
+    entry = cache.get(key)
+    if entry is None:
+        _count('misses')
+        try:
+            data = build()
+        except ObjectDoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        entry = _make_entry(data)
+        cache.set(key, entry, getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 300))
+    else:
+        _count('hits')
+
+    etag, data = entry
+    if _etag_matches(request, etag):
+        _count('not_modified')
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data)
+    response['ETag'] = etag
+    return response
+
+
+async def acached_get(request, resource, build, depends_on=()):
+    """``cached_get()`` for async views.
+
+    ``build`` is a coroutine function and the cache is used through its
+    async API. Returns a plain ``HttpResponse`` since DRF views are sync.
+    """
+    cache = get_cache()
+    key = await _aentry_key(cache, resource, depends_on, request)
+    entry = await cache.aget(key)
+    if entry is None:
+        _count('misses')
+        try:
+            data = await build()
+        except ObjectDoesNotExist:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        entry = _make_entry(data)
+        await cache.aset(key, entry, getattr(settings, 'INVENTORY_CACHE_TIMEOUT', 300))
+    else:
+        _count('hits')
+
+    etag, data = entry
+    if _etag_matches(request, etag):
+        _count('not_modified')
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = HttpResponse(dumps(data), content_type='application/json')
+    response['ETag'] = etag
+    return response
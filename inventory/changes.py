@@ -0,0 +1,242 @@
+"""
+The change feed: a sequence-numbered log of writes clients sync from.
+
+Product, stock and catalog writes append ``Change`` rows in their own
+transaction. ``/api/changes/?since=<seq>`` returns the rows after ``seq``,
+and ``/api/changes/stream/`` pushes them as server-sent events.
+
+Sequence numbers are auto-increment ids, assigned at insert but visible
+only at commit, so a row can appear after a higher one. Readers therefore
+only get settled rows: the longest id-ordered run after ``since`` of rows
+at least ``INVENTORY_CHANGES_SETTLE`` seconds old. A client resuming from
+the last seq it saw misses nothing as long as transactions commit within
+that time of writing their change rows, which is why writers append them
+last.
+
+Streams are fed by one ``ChangeHub`` per event loop (so one per ASGI
+worker): while anyone is subscribed, a single task polls for settled rows
+every ``INVENTORY_CHANGES_POLL_INTERVAL`` seconds and fans them out to
+every stream, instead of each connection querying the database.
+"""
+
+import asyncio
+import datetime
+import logging
+import weakref
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .fastpath import dumps
+from .models import Change
+
+logger = logging.getLogger('inventory.changes')
+
+# Rows read per query, by the feed's default page and the hub.
+BATCH_SIZE = 500
+
+
+def get_settle():
+    return getattr(settings, 'INVENTORY_CHANGES_SETTLE', 1.0)
+
+
+def get_poll_interval():
+    return getattr(settings, 'INVENTORY_CHANGES_POLL_INTERVAL', 0.5)
+
+
+def get_retention():
+    return getattr(settings, 'INVENTORY_CHANGES_RETENTION_DAYS', 7)
+
+
+def get_stream_max_seconds():
+    return getattr(settings, 'INVENTORY_CHANGES_STREAM_MAX_SECONDS', 300)
+
+
+def get_stream_buffer():
+    return getattr(settings, 'INVENTORY_CHANGES_STREAM_BUFFER', 1000)
+
+
+def entry(kind, action, object_id, delta=None):
+    """An unsaved change; see ``Change.KIND_CHOICES``."""
+    return Change(kind=kind, action=action, object_id=object_id, delta=delta)
+
+
+def append(kind, action, object_id, delta=None):
+    return Change.objects.create(kind=kind, action=action, object_id=object_id, delta=delta)
+
+
+def append_many(entries, batch_size=500):
+    Change.objects.bulk_create(entries, batch_size=batch_size)
+
+
+def _settled(rows):
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_settle())
+    for i, row in enumerate(rows):
+        if row.timestamp > cutoff:
+            return rows[:i]
+    return rows
+
+
+def _after(since, limit):
+    return Change.objects.filter(id__gt=since).order_by('id')[:limit]
+
+
+def settled(since, limit=BATCH_SIZE):
+    """Up to ``limit`` settled changes after ``since``, in sequence order."""
+    return _settled(list(_after(since, limit)))
+
+
+async def asettled(since, limit=BATCH_SIZE):
+    return _settled([row async for row in _after(since, limit)])
+
+
+async def atail():
+    """Sequence number of the newest settled change (0 if there are none)."""
+    cutoff = timezone.now() - datetime.timedelta(seconds=get_settle())
+    return await Change.objects.filter(timestamp__lte=cutoff).order_by('-id').values_list('id', flat=True).afirst() or 0
+
+
+_timestamp = serializers.DateTimeField().to_representation
+
+
+def payload(row):
+    return {
+        'seq': row.id,
+        'kind': row.kind,
+        'action': row.action,
+        'object_id': row.object_id,
+        'delta': row.delta,
+        'timestamp': _timestamp(row.timestamp),
+    }
+
+
+def event(row):
+    """``row`` as a server-sent event whose id is its sequence number."""
+    return b'id: %d\nevent: change\ndata: %s\n\n' % (row.id, dumps(payload(row)))
+
+
+def purge(chunk_size=10000):
+    """Delete changes older than ``INVENTORY_CHANGES_RETENTION_DAYS``; returns the count."""
+    cutoff = timezone.now() - datetime.timedelta(days=get_retention())
+    deleted = 0
+    while True:
+        ids = list(Change.objects.filter(timestamp__lt=cutoff).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += Change.objects.filter(id__in=ids).delete()[0]
+
+
+stats = {'streams': 0, 'polls': 0, 'sent': 0, 'dropped': 0}
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue = asyncio.Queue(get_stream_buffer())
+        # Set when the stream fell a full buffer behind; it ends once it
+        # has sent what's queued and the client resumes from the feed.
+        self.dropped = False
+
+
+class ChangeHub:
+    """Polls for settled changes once and hands them to every subscriber."""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.last = 0
+
+    async def subscribe(self):
+        """Returns the subscriber and the sequence number its queue starts after."""
+        async with self._lock:
+            if self._task is None:
+                self.last = await atail()
+                self._task = asyncio.create_task(self._run())
+            subscriber = Subscriber()
+            self._subscribers.add(subscriber)
+            stats['streams'] += 1
+            return subscriber, self.last
+
+    def unsubscribe(self, subscriber):
+        if subscriber in self._subscribers:
+            self._subscribers.discard(subscriber)
+            stats['streams'] -= 1
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _publish(self, rows):
+        for subscriber in list(self._subscribers):
+            try:
+                for row in rows:
+                    subscriber.queue.put_nowait(row)
+            except asyncio.QueueFull:
+                subscriber.dropped = True
+                self.unsubscribe(subscriber)
+                stats['dropped'] += 1
+                continue
+            stats['sent'] += len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                rows = await asettled(self.last)
+                stats['polls'] += 1
+            except Exception:
+                logger.exception('Polling the change feed failed; will retry')
+                rows = []
+            if rows:
+                self.last = rows[-1].id
+                self._publish(rows)
+            if len(rows) < BATCH_SIZE:
+                await asyncio.sleep(get_poll_interval())
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_hub():
+    """The running event loop's hub."""
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs[loop] = ChangeHub()
+    return _hubs[loop]
+
+
+async def stream(since=None, timeout=None, heartbeat=15):
+    """Server-sent events for the changes after ``since`` (or from now on),
+    ending after ``timeout`` seconds; comments keep idle connections open."""
+    hub = get_hub()
+    subscriber, boundary = await hub.subscribe()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(timeout if timeout is not None else get_stream_max_seconds(),
+                                 get_stream_max_seconds())
+    try:
+        # Clients reconnect (with Last-Event-ID) this soon after the end.
+        yield b'retry: 2000\n\n'
+        last = boundary if since is None else since
+        # Catch up from the table to where the hub's queue starts.
+        while last < boundary:
+            rows = [row for row in await asettled(last) if row.id <= boundary]
+            if not rows:
+                break
+            for row in rows:
+                yield event(row)
+            last = rows[-1].id
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0 or (subscriber.dropped and subscriber.queue.empty()):
+                return
+            try:
+                row = await asyncio.wait_for(subscriber.queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if loop.time() < deadline:
+                    yield b': keep-alive\n\n'
+                continue
+            if row.id > last:
+                yield event(row)
+                last = row.id
+    finally:
+        hub.unsubscribe(subscriber)
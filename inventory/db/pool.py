@@ -0,0 +1,173 @@
+"""
+Process-wide connection pooling for Django database backends.
+
+Django keeps one connection per thread, reused across requests only when
+``CONN_MAX_AGE`` is set. That suits a WSGI server's fixed worker threads,
+but under ASGI every request runs its ORM calls on a fresh thread, so
+per-thread persistent connections are never reused. A pooled backend hands
+the raw DB-API connection back to a shared pool whenever Django closes it
+(at the end of each request with ``CONN_MAX_AGE = 0``) and borrows one on
+the next connect, whichever thread that happens on.
+
+Enable it by pointing ``ENGINE`` at ``inventory.db.mysql`` (or
+``inventory.db.sqlite3``) and configuring ``OPTIONS['pool']``::
+
+    'OPTIONS': {'pool': {'max_size': 20, 'timeout': 30, 'check_after': 30}}
+"""
+
+import functools
+import threading
+import time
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """A bounded LIFO pool of raw DB-API connections.
+
+    At most ``max_size`` connections exist at once; ``acquire()`` waits up
+    to ``timeout`` seconds for one to be returned when all are in use.
+    Connections idle for ``check_after`` seconds or more are health-checked
+    before being handed out.
+    """
+
+    def __init__(self, max_size=10, timeout=30, check_after=30):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.check_after = check_after
+        self._idle = []  # (connection, returned at), most recent last
+        self._size = 0
+        self._condition = threading.Condition()
+        self.stats = {'created': 0, 'reused': 0, 'discarded': 0, 'waits': 0, 'timeouts': 0}
+
+    def acquire(self, connect, check):
+        """Return an idle connection that passes ``check(connection)``, or a
+        new one from ``connect()`` while the pool has room."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._condition:
+                while not self._idle and self._size >= self.max_size:
+                    self.stats['waits'] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        self.stats['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No database connection available after {self.timeout}s '
+                            f'({self.max_size} in use)'
+                        )
+                if not self._idle:
+                    self._size += 1
+                    break
+                connection, returned_at = self._idle.pop()
+
+            if time.monotonic() - returned_at < self.check_after or check(connection):
+                with self._condition:
+                    self.stats['reused'] += 1
+                return connection
+            self.discard(connection)
+
+        try:
+            connection = connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.stats['created'] += 1
+        return connection
+
+    def release(self, connection):
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._size -= 1
+            self.stats['discarded'] += 1
+            self._condition.notify()
+
+    def snapshot(self):
+        """Counters plus the current ``idle`` and ``in_use`` connection counts."""
+        with self._condition:
+            idle = len(self._idle)
+            return dict(self.stats, idle=idle, in_use=self._size - idle, max_size=self.max_size)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, options):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(**options)
+        return _pools[alias]
+
+
+def pools():
+    """``{alias: ConnectionPool}`` for every pool created in this process."""
+    with _pools_lock:
+        return dict(_pools)
+
+
+class PooledConnectionMixin:
+    """``DatabaseWrapper`` mixin borrowing connections from a ``ConnectionPool``.
+
+    Use with ``CONN_MAX_AGE = 0``: Django then closes the connection after
+    each request, which returns it to the pool instead.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict['OPTIONS'].get('pool') or {})
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        try:
+            return self.pool.acquire(
+                functools.partial(super().get_new_connection, conn_params), self._check_connection
+            )
+        except PoolTimeout as exc:
+            raise self.Database.OperationalError(str(exc)) from exc
+
+    def _check_connection(self, connection):
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.close()
+            return True
+        except self.Database.Error:
+            return False
+
+    def _close(self):
+        if self.connection is None:
+            return
+        connection = self.connection
+        if self.in_atomic_block:
+            # Django keeps a reference to a connection closed mid-transaction
+            # until the atomic block exits, so it can't be shared yet.
+            self.pool.discard(connection)
+            return
+        try:
+            # Never hand out a connection with a transaction still open.
+            if not self.autocommit:
+                connection.rollback()
+            usable = not self.errors_occurred or self._check_connection(connection)
+        except self.Database.Error:
+            usable = False
+        if usable:
+            self.pool.release(connection)
+        else:
+            self.pool.discard(connection)
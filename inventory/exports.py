@@ -0,0 +1,103 @@
+import csv
+import json
+
+from .models import StockMovement, StockAuditLog
+from .pagination import seek_filter
+
+# ledger name -> (model, [(output name, column)]); id and timestamp come
+# first because chunks are fetched by seeking on them.
+LEDGERS = {
+    'movements': (StockMovement, [
+        ('id', 'id'),
+        ('timestamp', 'timestamp'),
+        ('product', 'product_id'),
+        ('location', 'location_id'),
+        ('movement_type', 'movement_type'),
+        ('quantity', 'quantity'),
+    ]),
+    'audit': (StockAuditLog, [
+        ('id', 'id'),
+        ('timestamp', 'timestamp'),
+        ('product', 'product_id'),
+        ('movement_type', 'movement_type'),
+        ('quantity', 'quantity'),
+        ('user', 'user_id'),
+    ]),
+}
+
+FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_ledger_chunks(ledger, since=None, until=None, product=None, chunk_size=2000):
+    """Yield lists of row tuples from a ledger, oldest first.
+
+    Rows are fetched with ``values_list()`` in ``chunk_size`` batches that
+    seek on ``(timestamp, id)``. Unlike ``.iterator()``, this also keeps
+    memory flat on MySQL, where the driver buffers a whole result set.
+    """
+    model, columns = LEDGERS[ledger]
+    queryset = model.objects.all()
+    if since:
+        queryset = queryset.filter(timestamp__gte=since)
+    if until:
+        queryset = queryset.filter(timestamp__lt=until)
+    if product:
+        queryset = queryset.filter(product_id=product)
+    queryset = queryset.order_by('timestamp', 'id').values_list(
+        *[column for _, column in columns]
+    )
+
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(
+            seek_filter(['timestamp', 'id'], last)
+        )
+        rows = list(chunk[:chunk_size])
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        last = [rows[-1][1], rows[-1][0]]
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+class _Echo:
+    """File-like object whose write() just returns what it was given."""
+
+    def write(self, value):
+        return value
+
+
+def render_ndjson(ledger, chunks):
+    names = [name for name, _ in LEDGERS[ledger][1]]
+    for rows in chunks:
+        yield ''.join(
+            json.dumps(dict(zip(names, row)), default=_isoformat, separators=(',', ':')) + '\n'
+            for row in rows
+        )
+
+
+def render_csv(ledger, chunks):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([name for name, _ in LEDGERS[ledger][1]])
+    for rows in chunks:
+        yield ''.join(
+            writer.writerow([value.isoformat() if hasattr(value, 'isoformat') else value for value in row])
+            for row in rows
+        )
+
+
+def render_ledger(ledger, fmt, **filters):
+    """Stream a ledger export as text chunks in the given format."""
+    chunks = iter_ledger_chunks(ledger, **filters)
+    if fmt == 'csv':
+        return render_csv(ledger, chunks)
+    return render_ndjson(ledger, chunks)
@@ -0,0 +1,119 @@
+import json
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import serializers
+
+from .metrics import measure_serialization
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+def dumps(payload):
+    """Compact UTF-8 JSON, byte-compatible with DRF's default JSONRenderer.
+
+    Like the renderer, U+2028 and U+2029 are escaped: they are valid in
+    JSON strings but end a line in older JavaScript.
+    """
+    if orjson is not None:
+        data = orjson.dumps(payload)
+    else:
+        data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return data.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+@lru_cache(maxsize=None)
+def row_spec(serializer_class):
+    """``(output name, column, converter, source)`` for each field of a flat serializer.
+
+    Foreign keys map to their ``<name>_id`` column. Only decimals and
+    datetimes need the serializer field's own ``to_representation`` to
+    render identically; every other value is emitted as the database
+    returned it.
+    """
+    spec = []
+    for name, field in serializer_class().fields.items():
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            spec.append((name, f'{field.source}_id', None, field.source))
+        elif isinstance(field, (serializers.DecimalField, serializers.DateTimeField)):
+            spec.append((name, field.source, field.to_representation, field.source))
+        else:
+            spec.append((name, field.source, None, field.source))
+    return tuple(spec)
+
+
+def get_fields(request, serializer_class):
+    """Names from ``?fields=a,b`` the serializer has, or None for all fields."""
+    requested = request.GET.get('fields')
+    if not requested:
+        return None
+    requested = requested.split(',')
+    fields = [entry[0] for entry in row_spec(serializer_class) if entry[0] in requested]
+    return fields or None
+
+
+def select_columns(serializer_class, fields, paginator, request, attnames=True):
+    """Columns to load for ``fields``, plus the ones the paginator seeks on.
+
+    With ``attnames=False`` foreign keys are named by field (``category``)
+    rather than column (``category_id``), as ``QuerySet.only()`` expects.
+    """
+    columns = [
+        column if attnames else field_name
+        for name, column, _, field_name in row_spec(serializer_class)
+        if fields is None or name in fields
+    ]
+    for key in paginator.get_ordering(request):
+        key = key.lstrip('-')
+        if key not in columns:
+            columns.append(key)
+    return columns
+
+
+def fast_path_enabled(expand):
+    # Nested (expanded) objects still go through the serializers.
+    return getattr(settings, 'INVENTORY_FAST_LIST_RENDERING', False) and not expand
+
+
+def render_rows(serializer_class, fields, rows):
+    """``values()`` rows as ``serializer_class`` renders them, narrowed to ``fields``."""
+    with measure_serialization():
+        return _convert_rows(serializer_class, fields, rows)
+
+
+def _convert_rows(serializer_class, fields, rows):
+    spec = [entry for entry in row_spec(serializer_class) if fields is None or entry[0] in fields]
+    results = []
+    for row in rows:
+        item = {}
+        for name, column, convert, _ in spec:
+            value = row[column]
+            item[name] = convert(value) if convert is not None and value is not None else value
+        results.append(item)
+    return results
+
+
+def fast_list_response(request, queryset, serializer_class, paginator, fields):
+    """Render a paginated list straight from ``values()`` rows to JSON.
+
+    Skips model and serializer instantiation; the output matches what
+    ``serializer_class(many=True)`` would produce for the same rows.
+    """
+    rows = paginator.paginate_queryset(
+        queryset.values(*select_columns(serializer_class, fields, paginator, request)), request
+    )
+    results = render_rows(serializer_class, fields, rows)
+    return HttpResponse(dumps(paginator.get_paginated_payload(results)), content_type='application/json')
+
+
+async def afast_list_response(request, queryset, serializer_class, paginator, fields):
+    """``fast_list_response()`` for async views."""
+    rows = await paginator.apaginate_queryset(
+        queryset.values(*select_columns(serializer_class, fields, paginator, request)), request
+    )
+    results = render_rows(serializer_class, fields, rows)
+    return HttpResponse(dumps(paginator.get_paginated_payload(results)), content_type='application/json')
@@ -0,0 +1,221 @@
+"""
+Demand forecasting and reorder suggestions.
+
+Daily consumption is the units moved OUT per product per UTC day, read from
+the daily movement rollups. ``DemandModel`` holds, as NumPy arrays over
+every product that consumed stock in the last ``HISTORY_DAYS`` complete
+days, a moving average over the last ``INVENTORY_FORECAST_WINDOW`` days and
+an exponentially smoothed rate (``INVENTORY_FORECAST_ALPHA``). It is built
+once per process and then advanced a day at a time as days close; a rollup
+backfill bumps the ``rollups`` cache version, which makes it rebuild.
+
+``reorder_suggestions()`` evaluates every product against those rates at
+once: days of cover, whether to reorder (below the reorder level, or less
+cover than ``INVENTORY_REORDER_LEAD_TIME`` days) and how much to order to
+last ``INVENTORY_REORDER_COVER_DAYS`` beyond the lead time.
+"""
+
+import datetime
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .cache import resource_version
+from .models import Product, ProductMovementRollup, Supplier
+from .rollups import bucket_start
+
+HISTORY_DAYS = 365
+DAY = datetime.timedelta(days=1)
+
+DEFAULTS = {
+    'INVENTORY_FORECAST_WINDOW': 28,
+    'INVENTORY_FORECAST_ALPHA': 0.3,
+    'INVENTORY_REORDER_LEAD_TIME': 7,
+    'INVENTORY_REORDER_COVER_DAYS': 30,
+}
+
+
+def get_setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+def consumption_rates(index, age, units, size, window, alpha):
+    """Moving-average and exponentially smoothed daily consumption.
+
+    Observations are parallel arrays: ``index`` (product position, below
+    ``size``), ``age`` (days before the last day, 0 for the last day) and
+    ``units`` (units out that day). Days without an observation count as
+    zero. Returns two float arrays of length ``size``.
+    """
+    recent = age < window
+    moving = np.bincount(index[recent], weights=units[recent], minlength=size) / window
+    smoothed = np.bincount(index, weights=units * (alpha * (1 - alpha) ** age), minlength=size)
+    return moving, smoothed
+
+
+def advance(moving, smoothed, new, old, window, alpha):
+    """Rates one day later: ``new`` is the ``(index, units)`` of the day
+    being added and ``old`` those of the day leaving the window."""
+    size = len(moving)
+    added = np.bincount(new[0], weights=new[1], minlength=size)
+    dropped = np.bincount(old[0], weights=old[1], minlength=size)
+    # Clipped so rounding can't leave a tiny negative average.
+    moving = np.maximum(moving + (added - dropped) / window, 0.0)
+    smoothed = (1 - alpha) * smoothed + alpha * added
+    return moving, smoothed
+
+
+def suggest(quantity, reorder_level, rate, lead_time, cover_days):
+    """``(due, days_of_cover, order)`` for every product at once.
+
+    A product is due when it is below its reorder level or will run out
+    before an order placed today arrives; ``order`` tops it up to cover
+    ``lead_time + cover_days`` days of demand, and at least its reorder level.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_of_cover = np.where(rate > 0, quantity / rate, np.inf)
+    target = np.maximum(np.ceil(rate * (lead_time + cover_days)), reorder_level)
+    order = target - quantity
+    due = ((quantity < reorder_level) | (days_of_cover < lead_time)) & (order > 0)
+    return due, days_of_cover, order
+
+
+def _day_rows(day):
+    rows = ProductMovementRollup.objects.filter(
+        granularity='day', bucket=day, units_out__gt=0
+    ).values_list('product_id', 'units_out')
+    data = np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+    return data[:, 0], data[:, 1].astype(np.float64)
+
+
+def _history(through):
+    """Every product-day with consumption in the ``HISTORY_DAYS`` days up
+    to ``through``, in one query: ``(product ids, ages, units)`` arrays."""
+    rows = ProductMovementRollup.objects.filter(
+        granularity='day', bucket__gt=through - HISTORY_DAYS * DAY, bucket__lte=through, units_out__gt=0
+    ).values_list('product_id', 'bucket', 'units_out')
+    data = np.array(
+        [(pk, (through - bucket).days, units) for pk, bucket, units in rows.iterator(chunk_size=10000)],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    return data[:, 0], data[:, 1], data[:, 2].astype(np.float64)
+
+
+class DemandModel:
+    """Per-process consumption rates, current up to the last complete day."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.ids = np.empty(0, dtype=np.int64)  # sorted product ids
+        self.moving = np.empty(0)
+        self.smoothed = np.empty(0)
+        self.through = None  # last day included
+        self._key = None
+
+    def _build(self, through, window, alpha):
+        ids, ages, units = _history(through)
+        self.ids = np.unique(ids)
+        self.moving, self.smoothed = consumption_rates(
+            np.searchsorted(self.ids, ids), ages, units, len(self.ids), window, alpha,
+        )
+
+    def _track(self, product_ids):
+        """Start tracking any of ``product_ids`` not seen yet, at zero rates."""
+        missing = np.setdiff1d(product_ids, self.ids)
+        if not len(missing):
+            return
+        ids = np.union1d(self.ids, missing)
+        at = np.searchsorted(ids, self.ids)
+        for name in ('moving', 'smoothed'):
+            grown = np.zeros(len(ids))
+            grown[at] = getattr(self, name)
+            setattr(self, name, grown)
+        self.ids = ids
+
+    def _advance(self, day, window, alpha):
+        new_ids, new_units = _day_rows(day)
+        old_ids, old_units = _day_rows(day - window * DAY)
+        self._track(new_ids)
+        self.moving, self.smoothed = advance(
+            self.moving, self.smoothed,
+            (np.searchsorted(self.ids, new_ids), new_units),
+            (np.searchsorted(self.ids, old_ids), old_units),
+            window, alpha,
+        )
+
+    def current(self):
+        """``(ids, moving, smoothed, through)``, catching up first if a day
+        has closed since the last call. The arrays must not be modified."""
+        through = bucket_start(timezone.now(), 'day') - DAY
+        window = get_setting('INVENTORY_FORECAST_WINDOW')
+        alpha = get_setting('INVENTORY_FORECAST_ALPHA')
+        key = (resource_version('rollups'), window, alpha)
+        with self._lock:
+            if (key != self._key or self.through is None or self.through > through
+                    or through - self.through > window * DAY):
+                self._build(through, window, alpha)
+            else:
+                for days in range(1, (through - self.through).days + 1):
+                    self._advance(self.through + days * DAY, window, alpha)
+            self.through, self._key = through, key
+            return self.ids, self.moving, self.smoothed, through
+
+
+demand = DemandModel()
+
+
+def reorder_suggestions(supplier=None):
+    """Products due for reordering, grouped by supplier, least cover first."""
+    ids, moving, smoothed, through = demand.current()
+    lead_time = get_setting('INVENTORY_REORDER_LEAD_TIME')
+    cover_days = get_setting('INVENTORY_REORDER_COVER_DAYS')
+
+    products = Product.objects.order_by()
+    if supplier is not None:
+        products = products.filter(supplier_id=supplier)
+    rows = np.array(
+        list(products.values_list('id', 'supplier_id', 'quantity', 'reorder_level')), dtype=np.int64
+    ).reshape(-1, 4)
+    product_ids, supplier_ids, quantity, reorder_level = rows.T
+
+    rate_moving, rate_smoothed = np.zeros(len(rows)), np.zeros(len(rows))
+    if len(ids):
+        at = np.minimum(np.searchsorted(ids, product_ids), len(ids) - 1)
+        tracked = ids[at] == product_ids
+        rate_moving[tracked] = moving[at[tracked]]
+        rate_smoothed[tracked] = smoothed[at[tracked]]
+    # The higher of the two, so a recent rise in demand isn't averaged away.
+    rate = np.maximum(rate_moving, rate_smoothed)
+    due, days_of_cover, order = suggest(quantity, reorder_level, rate, lead_time, cover_days)
+
+    selected = np.flatnonzero(due)
+    selected = selected[np.lexsort((product_ids[selected], days_of_cover[selected], supplier_ids[selected]))]
+    names = dict(Product.objects.filter(pk__in=product_ids[selected].tolist()).values_list('id', 'name'))
+    suppliers = dict(Supplier.objects.filter(pk__in=np.unique(supplier_ids[selected]).tolist()).values_list('id', 'name'))
+
+    groups = []
+    for i in selected.tolist():
+        supplier_id, product_id = int(supplier_ids[i]), int(product_ids[i])
+        if not groups or groups[-1]['supplier'] != supplier_id:
+            groups.append({'supplier': supplier_id, 'supplier_name': suppliers[supplier_id], 'total_units': 0, 'products': []})
+        groups[-1]['total_units'] += int(order[i])
+        groups[-1]['products'].append({
+            'product': product_id,
+            'name': names[product_id],
+            'quantity': int(quantity[i]),
+            'reorder_level': int(reorder_level[i]),
+            'moving_average': round(float(rate_moving[i]), 3),
+            'smoothed': round(float(rate_smoothed[i]), 3),
+            'days_of_cover': round(float(days_of_cover[i]), 1) if np.isfinite(days_of_cover[i]) else None,
+            'suggested_quantity': int(order[i]),
+        })
+    return {
+        'through': through.date(),
+        'window': get_setting('INVENTORY_FORECAST_WINDOW'),
+        'alpha': get_setting('INVENTORY_FORECAST_ALPHA'),
+        'lead_time': lead_time,
+        'cover_days': cover_days,
+        'suppliers': groups,
+    }
@@ -0,0 +1,166 @@
+"""
+``Idempotency-Key`` support for POST endpoints.
+
+A client that may retry a request (e.g. a scanner on a flaky network) sends
+a unique ``Idempotency-Key`` header. The first request with a key claims
+it, runs normally and stores its response with the key; repeats, including
+ones sent while the first is still running, get the stored response back,
+with ``Idempotent-Replayed: true``, without running again.
+Keys are scoped to the user and the path, and kept for
+``INVENTORY_IDEMPOTENCY_TTL`` seconds (see the ``purge_idempotency_keys``
+command). Recently seen keys are also held in a per-process LRU, so most
+retries are answered without a query.
+"""
+
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+
+Stored = namedtuple('Stored', 'request_hash status_code body expires')
+
+
+def get_ttl():
+    return getattr(settings, 'INVENTORY_IDEMPOTENCY_TTL', 24 * 3600)
+
+
+def get_cache_size():
+    return getattr(settings, 'INVENTORY_IDEMPOTENCY_CACHE_SIZE', 10000)
+
+
+_recent = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def _remember(digest, stored):
+    with _recent_lock:
+        _recent[digest] = stored
+        _recent.move_to_end(digest)
+        while len(_recent) > get_cache_size():
+            _recent.popitem(last=False)
+
+
+def _recall(digest):
+    with _recent_lock:
+        stored = _recent.get(digest)
+        if stored is None:
+            return None
+        if stored.expires <= timezone.now():
+            del _recent[digest]
+            return None
+        _recent.move_to_end(digest)
+        return stored
+
+
+def _digest(user_id, path, key):
+    return hashlib.sha256(f'{user_id}\n{path}\n{key}'.encode()).hexdigest()
+
+
+def _fingerprint(data):
+    return hashlib.sha256(json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()).hexdigest()
+
+
+def _lookup(digest):
+    stored = _recall(digest)
+    if stored is not None:
+        return stored
+    row = IdempotencyKey.objects.filter(
+        digest=digest, created__gt=timezone.now() - timedelta(seconds=get_ttl())
+    ).values_list('request_hash', 'status_code', 'response', 'created').first()
+    if row is None:
+        return None
+    request_hash, status_code, body, created = row
+    stored = Stored(request_hash, status_code, body, created + timedelta(seconds=get_ttl()))
+    _remember(digest, stored)
+    return stored
+
+
+def _replay(stored, fingerprint):
+    if stored.request_hash != fingerprint:
+        return Response(
+            {'error': "This Idempotency-Key was already used for a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(json.loads(stored.body), status=stored.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _run_and_store(view, request, args, kwargs, digest, fingerprint):
+    with transaction.atomic():
+        # Claimed before the view runs: a concurrent request with the same
+        # key blocks on this insert until ours commits, then fails it.
+        row = IdempotencyKey.objects.create(digest=digest, request_hash=fingerprint, status_code=0, response='')
+        response = view(request, *args, **kwargs)
+        body = json.dumps(response.data, cls=JSONEncoder)
+        IdempotencyKey.objects.filter(pk=row.pk).update(status_code=response.status_code, response=body)
+        stored = Stored(fingerprint, response.status_code, body, row.created + timedelta(seconds=get_ttl()))
+        transaction.on_commit(lambda: _remember(digest, stored))
+    return response
+
+
+def idempotent(view):
+    """Make POSTs to a function view idempotent under an ``Idempotency-Key``.
+
+    Goes below ``@api_view`` so ``request`` is authenticated. The view runs
+    in a transaction that first inserts the key, then stores the response
+    under it, so the work and the key commit together. A concurrent request
+    with the same key blocks on the key's unique index until the first one
+    commits, then fails to insert, without having run the view, and replays
+    the first response.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if request.method != 'POST' or not key:
+            return view(request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'error': f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        digest = _digest(request.user.pk, request.path, key)
+        fingerprint = _fingerprint(request.data)
+        # Retries are mostly answered from memory; otherwise the key's
+        # insert finds out whether it was used before.
+        stored = _recall(digest)
+        if stored is None:
+            try:
+                return _run_and_store(view, request, args, kwargs, digest, fingerprint)
+            except IntegrityError:
+                # Used before, or by a concurrent request that just committed...
+                stored = _lookup(digest)
+                if stored is None:
+                    # ...or the key's last use has expired but isn't purged yet.
+                    if not IdempotencyKey.objects.filter(digest=digest).delete()[0]:
+                        raise
+                    return _run_and_store(view, request, args, kwargs, digest, fingerprint)
+        return _replay(stored, fingerprint)
+    return wrapper
+
+
+def purge(chunk_size=10000):
+    """Delete keys older than the TTL, ``chunk_size`` rows at a time; returns the count."""
+    expired = IdempotencyKey.objects.filter(
+        created__lte=timezone.now() - timedelta(seconds=get_ttl())
+    ).order_by('id').values_list('id', flat=True)
+    deleted = 0
+    while True:
+        ids = list(expired[:chunk_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,293 @@
+"""
+Streaming product catalog import.
+
+Records are parsed one at a time from CSV or NDJSON, validated in chunks,
+and each chunk is upserted on ``sku`` with one
+``bulk_create(update_conflicts=True)`` in its own transaction. Memory is
+bounded by the chunk size (plus the category and supplier name maps), and
+an interrupted import can be resumed after its last committed chunk.
+
+Category and supplier are given by name. Quantity and reorder point are
+optional: an existing product keeps its own, a new one starts at 0 and
+inherits its category's reorder point. A quantity change is applied to the
+product's stock level at the default location, so a row that would lower
+it by more than that level's unreserved units fails instead of
+overdrawing it. Bulk writes skip ``Product.save()``,
+so the derived columns, stock summaries, ledger, default-location stock
+levels, change feed and caches are kept up to date here.
+"""
+
+import codecs
+import csv
+import json
+
+from django.db import connection, transaction
+from django.db.models import F
+from rest_framework import serializers
+
+from . import changes, ledger
+from .cache import invalidate
+from .models import Category, Product, StockLevel, Supplier, default_location_id
+from .search import build_search_text, python_index
+from .serializers import ProductImportRowSerializer
+from .stock import apply_level_deltas
+from .summary import apply_deltas
+
+FORMATS = ('csv', 'ndjson')
+
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+}
+
+# Failures beyond this many are counted but not described in the report.
+MAX_REPORTED_ERRORS = 1000
+
+UPDATE_FIELDS = [
+    'name', 'category', 'supplier', 'price', 'quantity', 'reorder_point', 'reorder_level', 'search_text',
+]
+
+
+class _Unparseable:
+    def __init__(self, error):
+        self.error = error
+
+
+def text_lines(stream):
+    """Decode a binary stream line by line as UTF-8 (with or without a BOM)."""
+    return codecs.iterdecode(iter(stream.readline, b''), 'utf-8-sig', errors='replace')
+
+
+def parse_csv(lines):
+    reader = csv.DictReader(lines)
+    while True:
+        try:
+            record = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            yield _Unparseable(f"CSV parse error: {exc}")
+            continue
+        # Empty cells are missing values; cells beyond the header are ignored.
+        yield {key: value for key, value in record.items() if key is not None and value not in (None, '')}
+
+
+def parse_ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as exc:
+            yield _Unparseable(f"NDJSON parse error: {exc}")
+
+
+PARSERS = {
+    'csv': parse_csv,
+    'ndjson': parse_ndjson,
+}
+
+
+def _name_map(model, *fields):
+    """``{name: (id, *fields)}``, with None for names shared by several rows."""
+    names = {}
+    for name, *row in model.objects.values_list('name', 'id', *fields).iterator():
+        names[name] = None if name in names else tuple(row)
+    return names
+
+
+def _resolve(names, kind, name):
+    if name not in names:
+        return None, f"Unknown {kind}: {name}"
+    if names[name] is None:
+        return None, f"More than one {kind} is named {name}"
+    return names[name], None
+
+
+def _fail(report, row, errors, max_errors):
+    report['failed'] += 1
+    if len(report['errors']) < max_errors:
+        report['errors'].append({'row': row, 'errors': errors})
+
+
+def _validate(chunk, categories, suppliers, report, max_errors):
+    """Valid rows of a chunk by SKU, and per SKU how many rows a later row
+    for the same SKU replaced."""
+    serializer = ProductImportRowSerializer()
+    rows, replaced = {}, {}
+    for row, record in chunk:
+        if isinstance(record, _Unparseable):
+            _fail(report, row, {'non_field_errors': [record.error]}, max_errors)
+            continue
+        try:
+            data = serializer.run_validation(record)
+        except serializers.ValidationError as exc:
+            _fail(report, row, exc.detail, max_errors)
+            continue
+
+        category, category_error = _resolve(categories, 'category', data['category'])
+        supplier, supplier_error = _resolve(suppliers, 'supplier', data['supplier'])
+        if category_error or supplier_error:
+            errors = {'category': [category_error], 'supplier': [supplier_error]}
+            _fail(report, row, {field: error for field, error in errors.items() if error[0]}, max_errors)
+            continue
+        data['category_id'], data['category_reorder_point'] = category
+        data['supplier_id'] = supplier[0]
+        data['row'] = row
+        if data['sku'] in rows:
+            replaced[data['sku']] = replaced.get(data['sku'], 0) + 1
+        rows[data['sku']] = data
+    return rows, replaced
+
+
+def _upsert_options():
+    options = {'update_conflicts': True, 'update_fields': UPDATE_FIELDS}
+    # MySQL's ON DUPLICATE KEY UPDATE can't name the conflicting key.
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['sku']
+    return options
+
+
+def _overdrawn(rows, existing, lock=False):
+    """Errors, by SKU, of the rows that would lower a product's quantity by
+    more than the unreserved units of its default-location level."""
+    lowered = {}
+    for sku, data in rows.items():
+        previous = existing.get(sku)
+        if previous is not None and data.get('quantity', previous['quantity']) < previous['quantity']:
+            lowered[previous['id']] = sku, previous['quantity'] - data['quantity']
+    if not lowered:
+        return {}
+    levels = StockLevel.objects.filter(product_id__in=lowered, location_id=default_location_id(), slot=0)
+    if lock:
+        # Sharded products' movements don't lock the product row.
+        levels = levels.select_for_update().order_by('product_id')
+    unreserved = dict(levels.values_list('product_id', F('quantity') - F('reserved')))
+    errors = {}
+    for pk, (sku, removed) in lowered.items():
+        available = max(unreserved.get(pk, 0), 0)
+        if available < removed:
+            errors[sku] = {'quantity': [
+                f"Can't remove {removed} units: only {available} at the default location are unreserved"
+            ]}
+    return errors
+
+
+def _write(rows):
+    """Upsert one chunk of validated rows; returns the number created and
+    the errors of the rows rejected by ``_overdrawn()``."""
+    with transaction.atomic():
+        existing = {
+            row['sku']: row
+            for row in Product.objects.select_for_update().filter(sku__in=rows).values(
+                'sku', 'id', 'category_id', 'supplier_id', 'quantity', 'reorder_point'
+            )
+        }
+        rejected = _overdrawn(rows, existing, lock=True)
+        rows = {sku: data for sku, data in rows.items() if sku not in rejected}
+        if not rows:
+            return 0, rejected
+        products = []
+        for sku, data in rows.items():
+            previous = existing.get(sku, {'quantity': 0, 'reorder_point': None})
+            reorder_point = data.get('reorder_point', previous['reorder_point'])
+            if reorder_point is not None:
+                reorder_level = reorder_point
+            elif data['category_reorder_point'] is not None:
+                reorder_level = data['category_reorder_point']
+            else:
+                reorder_level = Product.DEFAULT_REORDER_POINT
+            products.append(Product(
+                sku=sku,
+                name=data['name'],
+                category_id=data['category_id'],
+                supplier_id=data['supplier_id'],
+                price=data['price'],
+                quantity=data.get('quantity', previous['quantity']),
+                reorder_point=reorder_point,
+                reorder_level=reorder_level,
+                search_text=build_search_text(data['name'], data['category'], data['supplier']),
+            ))
+        Product.objects.bulk_create(products, **_upsert_options())
+
+        # bulk_create() doesn't return primary keys of upserted rows on MySQL.
+        created_ids = dict(
+            Product.objects.filter(sku__in=[sku for sku in rows if sku not in existing]).values_list('sku', 'id')
+        )
+        summary_changes, entries, levels, feed = [], [], {}, []
+        for product in products:
+            previous = existing.get(product.sku)
+            summary_changes.append((product.category_id, product.supplier_id, 1, product.quantity))
+            if previous is None:
+                entries.append(ledger.entry(created_ids[product.sku], 'ADJ', product.quantity))
+                levels[created_ids[product.sku]] = product.quantity
+                feed.append(changes.entry('product', 'C', created_ids[product.sku]))
+                continue
+            summary_changes.append((previous['category_id'], previous['supplier_id'], -1, -previous['quantity']))
+            if product.quantity != previous['quantity']:
+                entries.append(ledger.entry(previous['id'], 'ADJ', product.quantity - previous['quantity']))
+                levels[previous['id']] = product.quantity - previous['quantity']
+            feed.append(changes.entry('product', 'U', previous['id']))
+        apply_deltas(summary_changes)
+        ledger.append_many(entries)
+        apply_level_deltas(levels)
+        changes.append_many(feed)
+
+        invalidate('stats', *[f"product:{row['id']}" for row in existing.values()])
+        transaction.on_commit(python_index.invalidate)
+    return len(created_ids), rejected
+
+
+def _chunks(numbered, size):
+    chunk = []
+    for item in numbered:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_products(records, chunk_size=1000, dry_run=False, resume_from=0, on_chunk=None,
+                    max_errors=MAX_REPORTED_ERRORS):
+    """Validate and upsert parsed records, ``chunk_size`` at a time.
+
+    Records are numbered from 1 and those up to ``resume_from`` are skipped,
+    so an interrupted import restarts from the ``checkpoint`` it reported:
+    the number of the last record whose chunk was committed. With
+    ``dry_run`` nothing is written and ``created``/``updated`` count what
+    would have been. ``on_chunk(report)`` is called after every chunk.
+
+    Returns ``{'created', 'updated', 'failed', 'errors', 'checkpoint',
+    'dry_run'}``, where ``errors`` describes the first ``max_errors``
+    failures as ``{'row', 'errors'}``.
+    """
+    categories = _name_map(Category, 'reorder_point')
+    suppliers = _name_map(Supplier)
+    report = {
+        'created': 0, 'updated': 0, 'failed': 0, 'errors': [], 'checkpoint': resume_from, 'dry_run': dry_run,
+    }
+
+    numbered = ((row, record) for row, record in enumerate(records, start=1) if row > resume_from)
+    for chunk in _chunks(numbered, chunk_size):
+        rows, replaced = _validate(chunk, categories, suppliers, report, max_errors)
+        if not rows:
+            created, rejected = 0, {}
+        elif dry_run:
+            existing = {row['sku']: row for row in Product.objects.filter(sku__in=rows).values('sku', 'id', 'quantity')}
+            created, rejected = len(rows) - len(existing), _overdrawn(rows, existing)
+        else:
+            created, rejected = _write(rows)
+        for sku, errors in rejected.items():
+            _fail(report, rows[sku]['row'], errors, max_errors)
+        # A later row for the same SKU updates the product the earlier one wrote.
+        report['created'] += created
+        report['updated'] += len(rows) - len(rejected) - created + sum(
+            count for sku, count in replaced.items() if sku not in rejected
+        )
+        report['checkpoint'] = chunk[-1][0]
+        if on_chunk is not None:
+            on_chunk(report)
+    return report
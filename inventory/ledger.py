@@ -0,0 +1,200 @@
+"""
+Append-only stock ledger.
+
+Every change to ``Product.quantity`` appends a ``StockLedgerEntry`` in the
+same transaction: movements from ``inventory/stock.py`` and adjustments
+from creating or editing a product. The ledger is the history;
+``Product.quantity`` is its current total, kept for fast reads.
+
+``take_snapshots()`` (run periodically, see the ``snapshot_stock``
+command) records each product's running quantity every
+``INVENTORY_LEDGER_SNAPSHOT_EVERY`` entries. Stock as of a point in time is
+then the nearest earlier snapshot plus a replay of at most that many
+entries. ``reconcile()`` checks ``Product.quantity`` against the ledger.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, IntegerField, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .cache import invalidate
+from .models import Product, StockLedgerEntry, StockLevel, StockSnapshot
+from .summary import rebuild as rebuild_summaries
+
+
+def get_snapshot_interval():
+    return getattr(settings, 'INVENTORY_LEDGER_SNAPSHOT_EVERY', 500)
+
+
+def entry(product_id, kind, delta):
+    """An unsaved entry; ``kind`` is IN, OUT or ADJ and ``delta`` is signed."""
+    return StockLedgerEntry(product_id=product_id, kind=kind, delta=delta)
+
+
+def append(product_id, kind, delta):
+    return StockLedgerEntry.objects.create(product_id=product_id, kind=kind, delta=delta)
+
+
+def append_many(entries, batch_size=500):
+    StockLedgerEntry.objects.bulk_create(entries, batch_size=batch_size)
+
+
+def record_quantity_change(previous, product, update_fields=None):
+    """Append an adjustment for a product insert or update that set its quantity.
+
+    ``previous`` holds the row's values before the save (None on insert).
+    """
+    if update_fields is not None and 'quantity' not in update_fields:
+        return
+    before = previous['quantity'] if previous is not None else 0
+    # A new product always gets an entry, so its history starts at creation.
+    if previous is None or product.quantity != before:
+        append(product.pk, 'ADJ', product.quantity - before)
+
+
+def quantity_at(product_id, ts):
+    """Reconstruct a product's stock as of ``ts``.
+
+    Returns ``{'quantity', 'snapshot', 'replayed'}``, where ``snapshot`` is
+    the ledger entry id of the snapshot used (or None) and ``replayed`` the
+    number of entries summed on top of it. ``quantity`` is None when the
+    product has no ledger history at ``ts``.
+    """
+    snapshot = StockSnapshot.objects.filter(
+        product_id=product_id, timestamp__lte=ts
+    ).order_by('-entry_id').values('entry_id', 'quantity').first()
+
+    entries = StockLedgerEntry.objects.filter(product_id=product_id, timestamp__lte=ts)
+    if snapshot is not None:
+        entries = entries.filter(id__gt=snapshot['entry_id'])
+    replay = entries.aggregate(total=Sum('delta'), count=Count('id'))
+
+    if snapshot is None and not replay['count']:
+        quantity = None
+    else:
+        quantity = (snapshot['quantity'] if snapshot else 0) + (replay['total'] or 0)
+    return {
+        'quantity': quantity,
+        'snapshot': snapshot['entry_id'] if snapshot else None,
+        'replayed': replay['count'],
+    }
+
+
+def _latest_snapshot(field):
+    return Subquery(
+        StockSnapshot.objects.filter(product_id=OuterRef('product_id')).order_by('-entry_id').values(field)[:1]
+    )
+
+
+def _snapshot_products(product_ids, every):
+    bases = dict(
+        StockSnapshot.objects.filter(product_id__in=product_ids)
+        .values('product_id')
+        .annotate(entry=Max('entry_id'))
+        .values_list('product_id', 'entry')
+    )
+    quantities = dict(StockSnapshot.objects.filter(entry_id__in=bases.values()).values_list('product_id', 'quantity'))
+    rows = (
+        StockLedgerEntry.objects.filter(product_id__in=product_ids)
+        .filter(id__gt=Coalesce(_latest_snapshot('entry_id'), 0))
+        .order_by('product_id', 'id')
+        .values_list('product_id', 'id', 'delta', 'timestamp')
+    )
+
+    snapshots = []
+    product, running, count = None, 0, 0
+    for product_id, entry_id, delta, timestamp in rows.iterator(chunk_size=5000):
+        if product_id != product:
+            product, running, count = product_id, quantities.get(product_id, 0), 0
+        running += delta
+        count += 1
+        if count % every == 0:
+            snapshots.append(StockSnapshot(product_id=product_id, entry_id=entry_id, quantity=running, timestamp=timestamp))
+    StockSnapshot.objects.bulk_create(snapshots, batch_size=500)
+    return len(snapshots)
+
+
+def take_snapshots(every=None, chunk_size=1000):
+    """Snapshot every product at each ``every``-th entry since its last
+    snapshot; returns the number of snapshots created."""
+    every = every or get_snapshot_interval()
+    ids = Product.objects.order_by('id').values_list('id', flat=True)
+    created, last = 0, 0
+    while True:
+        chunk = list(ids.filter(id__gt=last)[:chunk_size])
+        if not chunk:
+            return created
+        created += _snapshot_products(chunk, every)
+        last = chunk[-1]
+
+
+def with_ledger_quantity(products):
+    """Annotate ``ledger_quantity``: the latest snapshot plus the entries since."""
+    snapshots = StockSnapshot.objects.filter(product_id=OuterRef('pk')).order_by('-entry_id')
+    replay = (
+        StockLedgerEntry.objects.filter(product_id=OuterRef('pk'), id__gt=Coalesce(OuterRef('snapshot_entry'), 0))
+        .order_by()
+        .values('product_id')
+        .annotate(total=Sum('delta'))
+        .values('total')
+    )
+    return products.annotate(
+        snapshot_entry=Subquery(snapshots.values('entry_id')[:1]),
+    ).annotate(
+        ledger_quantity=Coalesce(Subquery(snapshots.values('quantity')[:1]), 0)
+        + Coalesce(Subquery(replay, output_field=IntegerField()), 0),
+    )
+
+
+def _reconcile_range(start, stop):
+    try:
+        return list(
+            with_ledger_quantity(Product.objects.filter(id__gte=start, id__lt=stop))
+            .exclude(quantity=F('ledger_quantity'))
+            .values_list('id', 'quantity', 'ledger_quantity')
+        )
+    finally:
+        # Worker threads exit after the run; don't leave their connections open.
+        connection.close()
+
+
+def _fix(product_id, stored, ledger_quantity):
+    from .stock import apply_level_deltas
+
+    with transaction.atomic():
+        updated = Product.objects.filter(pk=product_id, quantity=stored).update(quantity=ledger_quantity)
+        if updated:
+            # The stock levels must sum to the quantity too (sharded products
+            # refold it from them): whatever they are off by goes to the
+            # default location's.
+            levels = StockLevel.objects.select_for_update().filter(product_id=product_id)
+            apply_level_deltas({product_id: ledger_quantity - sum(levels.values_list('quantity', flat=True))})
+    if updated:
+        invalidate(f'product:{product_id}', 'stats')
+    return updated
+
+
+def reconcile(chunk_size=10000, workers=4, fix=False):
+    """Compare ``Product.quantity`` with the ledger in parallel id-range chunks.
+
+    Returns ``[(product id, stored quantity, ledger quantity)]`` for every
+    mismatch. With ``fix``, products are set to their ledger quantity
+    (skipping any whose stock changed in the meantime) with their stock
+    levels brought to the same total at the default location, and the stock
+    summaries are rebuilt, since whatever broke the quantity may not have
+    gone through them either.
+    """
+    bounds = Product.objects.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return []
+    ranges = [(start, start + chunk_size) for start in range(bounds['low'], bounds['high'] + 1, chunk_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        mismatches = [row for rows in executor.map(lambda r: _reconcile_range(*r), ranges) for row in rows]
+    if fix and mismatches:
+        for row in mismatches:
+            _fix(*row)
+        rebuild_summaries()
+    return mismatches
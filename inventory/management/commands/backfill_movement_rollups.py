@@ -0,0 +1,47 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory.models import StockMovement
+from inventory.rollups import backfill, bucket_start
+
+
+def _day(value):
+    day = parse_date(value)
+    if day is None:
+        raise CommandError(f"Invalid date: {value}")
+    return datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.timezone.utc)
+
+
+class Command(BaseCommand):
+    help = "Rebuild the hourly and daily stock movement rollups from the movement table, one UTC day at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First day to rebuild, YYYY-MM-DD (default: the first movement's day)")
+        parser.add_argument('--until', help="Day to stop before, YYYY-MM-DD (default and latest: today, UTC)")
+
+    def handle(self, *args, **options):
+        # Today's rows are still being written by the movement path.
+        today = bucket_start(timezone.now(), 'day')
+        until = _day(options['until']) if options['until'] else today
+        if until > today:
+            self.stdout.write(self.style.WARNING("Stopping before today; its rollups are still being updated."))
+            until = today
+
+        if options['since']:
+            since = _day(options['since'])
+        else:
+            since = StockMovement.objects.aggregate(first=Min('timestamp'))['first']
+            if since is None:
+                self.stdout.write("No stock movements to roll up.")
+                return
+
+        days = rows = 0
+        for day, written in backfill(since, until):
+            days += 1
+            rows += written
+            self.stdout.write(f"{day:%Y-%m-%d}: {written} rollup rows")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {days} days ({rows} rollup rows)."))
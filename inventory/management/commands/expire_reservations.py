@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.reservations import expire
+
+
+class Command(BaseCommand):
+    help = "Release held stock reservations that are past their expires_at."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Reservations per transaction")
+
+    def handle(self, *args, **options):
+        expired = expire(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} reservations."))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from inventory.exports import FORMATS, LEDGERS, render_ledger
+
+
+class Command(BaseCommand):
+    help = "Stream the stock movement or audit ledger as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ledger', choices=sorted(LEDGERS))
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, default='ndjson')
+        parser.add_argument('--since', help="ISO datetime, inclusive")
+        parser.add_argument('--until', help="ISO datetime, exclusive")
+        parser.add_argument('--product', type=int)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--output', '-o', help="File to write (default: stdout)")
+
+    def handle(self, *args, **options):
+        filters = {'product': options['product'], 'chunk_size': options['chunk_size']}
+        for param in ('since', 'until'):
+            if options[param]:
+                try:
+                    filters[param] = parse_datetime(options[param])
+                except ValueError:
+                    filters[param] = None
+                if filters[param] is None:
+                    raise CommandError(f"Invalid --{param} datetime: {options[param]}")
+                if timezone.is_naive(filters[param]):
+                    filters[param] = timezone.make_aware(filters[param])
+
+        chunks = render_ledger(options['ledger'], options['fmt'], **filters)
+        if options['output']:
+            with open(options['output'], 'w', newline='') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.write(chunk)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.audit import relay_outbox
+
+
+class Command(BaseCommand):
+    help = "Move pending audit outbox rows (INVENTORY_AUDIT_MODE = 'outbox') into the stock audit log."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Rows per transaction")
+
+    def handle(self, *args, **options):
+        moved = relay_outbox(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Moved {moved} audit entries from the outbox."))
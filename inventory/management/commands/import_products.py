@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.imports import FORMATS, PARSERS, import_products, text_lines
+
+
+class Command(BaseCommand):
+    help = "Stream a CSV or NDJSON product catalog into the products table, upserting on SKU."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin")
+        parser.add_argument('--format', dest='fmt', choices=FORMATS, help="Default: from the file extension")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Records per transaction")
+        parser.add_argument('--dry-run', action='store_true', help="Validate only; write nothing")
+        parser.add_argument('--resume-from', type=int, default=0, help="Skip records up to this checkpoint")
+        parser.add_argument('--checkpoint', help="File recording progress; an existing one is resumed from")
+
+    def handle(self, *args, **options):
+        fmt = options['fmt'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if fmt not in FORMATS:
+            raise CommandError("Pass --format csv or --format ndjson")
+
+        resume_from = options['resume_from']
+        checkpoint = options['checkpoint']
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                resume_from = int(f.read().strip() or 0)
+            self.stdout.write(f"Resuming after record {resume_from}")
+
+        def on_chunk(report):
+            if checkpoint and not options['dry_run']:
+                with open(checkpoint, 'w') as f:
+                    f.write(str(report['checkpoint']))
+            if options['verbosity'] > 1:
+                self.stdout.write(
+                    f"{report['checkpoint']} records: {report['created']} created, "
+                    f"{report['updated']} updated, {report['failed']} failed"
+                )
+
+        stream = sys.stdin.buffer if options['path'] == '-' else open(options['path'], 'rb')
+        with stream:
+            report = import_products(
+                PARSERS[fmt](text_lines(stream)),
+                chunk_size=options['chunk_size'],
+                dry_run=options['dry_run'],
+                resume_from=resume_from,
+                on_chunk=on_chunk,
+            )
+
+        for error in report['errors']:
+            self.stderr.write(json.dumps(error))
+        if report['failed'] > len(report['errors']):
+            self.stderr.write(f"... and {report['failed'] - len(report['errors'])} more failed records")
+        summary = (
+            f"{'Would create' if report['dry_run'] else 'Created'} {report['created']}, "
+            f"{'would update' if report['dry_run'] else 'updated'} {report['updated']}, "
+            f"{report['failed']} failed (checkpoint {report['checkpoint']})."
+        )
+        self.stdout.write(self.style.WARNING(summary) if report['failed'] else self.style.SUCCESS(summary))
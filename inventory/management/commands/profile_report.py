@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from inventory.profiling import get_dir, hot_functions, hot_statements, read_requests, read_stacks
+
+
+class Command(BaseCommand):
+    help = "Summarize the sampled request profiles: hottest functions and SQL per view."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help="Profile directory (default INVENTORY_PROFILE_DIR)")
+        parser.add_argument('--view', action='append', help="Only this view name (repeatable)")
+        parser.add_argument('--limit', type=int, default=10, help="Functions listed per view")
+        parser.add_argument('--statements', type=int, default=5, help="SQL statements listed per view")
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or get_dir()
+        stacks = read_stacks(directory)
+        requests = read_requests(directory)
+        keys = sorted(set(stacks) | set(requests))
+        if options['view']:
+            keys = [key for key in keys if key[0] in options['view']]
+        if not keys:
+            self.stdout.write(self.style.WARNING(f"No profiles in {directory}."))
+            return
+
+        for view, method in keys:
+            sampled = sum(stacks[view, method].values())
+            records = requests[view, method]
+            durations = sorted(record['ms'] for record in records)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{method} {view}"))
+            if records:
+                queries = sum(len(record['queries']) for record in records)
+                db_ms = sum(query['ms'] for record in records for query in record['queries'])
+                self.stdout.write(
+                    f"  {len(records)} requests, p50 {durations[len(durations) // 2]:.1f} ms, "
+                    f"max {durations[-1]:.1f} ms, {queries / len(records):.1f} queries and "
+                    f"{db_ms / len(records):.1f} ms of SQL per request, {sampled / 1000:.0f} ms sampled"
+                )
+            if sampled:
+                self.stdout.write(f"  {'self':>6} {'total':>6}  function")
+                for frame, own, total in hot_functions(stacks[view, method], options['limit']):
+                    self.stdout.write(f"  {own / sampled:>6.1%} {total / sampled:>6.1%}  {frame}")
+            if records and options['statements']:
+                self.stdout.write(f"  {'ms':>9} {'runs':>6}  statement")
+                for sql, runs, ms in hot_statements(records, options['statements']):
+                    sql = ' '.join(sql.split())
+                    self.stdout.write(f"  {ms:>9.1f} {runs:>6}  {sql[:120] + '...' if len(sql) > 120 else sql}")
+            self.stdout.write('')
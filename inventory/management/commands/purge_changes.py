@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.changes import get_retention, purge
+
+
+class Command(BaseCommand):
+    help = "Delete change feed entries older than INVENTORY_CHANGES_RETENTION_DAYS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Rows per DELETE")
+
+    def handle(self, *args, **options):
+        deleted = purge(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} changes older than {get_retention()} days."))
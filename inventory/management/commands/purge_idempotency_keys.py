@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.idempotency import get_ttl, purge
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than INVENTORY_IDEMPOTENCY_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Rows per DELETE")
+
+    def handle(self, *args, **options):
+        deleted = purge(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} keys older than {get_ttl()} seconds."))
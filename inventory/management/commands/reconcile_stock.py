@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from inventory.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = "Check Product.quantity against the stock ledger and report (or fix) mismatches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Product ids per batch")
+        parser.add_argument('--workers', type=int, default=4, help="Batches checked in parallel")
+        parser.add_argument('--fix', action='store_true', help="Set mismatched products to their ledger quantity")
+
+    def handle(self, *args, **options):
+        mismatches = reconcile(
+            chunk_size=options['chunk_size'], workers=options['workers'], fix=options['fix']
+        )
+        for product_id, stored, ledger_quantity in mismatches:
+            self.stdout.write(f"Product {product_id}: stored {stored}, ledger {ledger_quantity}")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Product quantities match the ledger."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {len(mismatches)} products."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(mismatches)} products don't match the ledger."))
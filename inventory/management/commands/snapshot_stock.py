@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventory.ledger import get_snapshot_interval, take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot product stock from the ledger so point-in-time lookups replay few entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, help="Entries between snapshots (default: INVENTORY_LEDGER_SNAPSHOT_EVERY)")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Products per batch")
+
+    def handle(self, *args, **options):
+        every = options['every'] or get_snapshot_interval()
+        created = take_snapshots(every=every, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} snapshots (every {every} entries)."))
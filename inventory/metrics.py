@@ -0,0 +1,235 @@
+"""
+Per-view request metrics: query count, database time, serialization time
+and total time, exported in the Prometheus text format.
+
+``QueryMetricsMiddleware`` opens a ``RequestStats`` for each request in a
+context variable. Every database connection gets an execute wrapper that
+adds to the current request's stats, and since ``sync_to_async`` copies
+the context, queries the async views run on other threads are counted too.
+Counters are per process.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger('inventory.metrics')
+
+# Upper bounds, in seconds, of the request duration histogram buckets.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = contextvars.ContextVar('inventory_request_stats', default=None)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time', 'serialization_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+
+
+def start_request():
+    """Begin collecting stats for the current context; returns ``(stats, token)``."""
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def _record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - start
+
+
+def install_query_hook(connection):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def measure_serialization():
+    """Add the time spent in the block to the current request's serialization time."""
+    stats = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serialization_time += time.perf_counter() - start
+
+
+class _ViewMetrics:
+    __slots__ = ('requests', 'queries', 'db_time', 'serialization_time', 'total_time',
+                 'buckets', 'over_budget')
+
+    def __init__(self):
+        self.requests = self.queries = self.over_budget = 0
+        self.db_time = self.serialization_time = self.total_time = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+_views = {}
+_views_lock = threading.Lock()
+
+
+def get_query_budget():
+    return getattr(settings, 'INVENTORY_QUERY_BUDGET', None)
+
+
+def record(request, stats, elapsed):
+    """Add a finished request to its view's totals and log it if it ran
+    more queries than ``INVENTORY_QUERY_BUDGET``."""
+    match = request.resolver_match
+    key = (match.view_name if match else 'unresolved', request.method)
+    budget = get_query_budget()
+    over_budget = budget is not None and stats.queries > budget
+
+    with _views_lock:
+        metrics = _views.get(key)
+        if metrics is None:
+            metrics = _views[key] = _ViewMetrics()
+        metrics.requests += 1
+        metrics.queries += stats.queries
+        metrics.db_time += stats.db_time
+        metrics.serialization_time += stats.serialization_time
+        metrics.total_time += elapsed
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if elapsed <= bound:
+                metrics.buckets[i] += 1
+        metrics.over_budget += over_budget
+
+    if over_budget:
+        logger.warning(
+            '%s %s (%s) ran %d queries, over the budget of %d; %.1f ms in the database, %.1f ms total',
+            request.method, request.get_full_path(), key[0], stats.queries, budget,
+            stats.db_time * 1000, elapsed * 1000,
+        )
+
+
+def reset():
+    with _views_lock:
+        _views.clear()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _family(lines, name, kind, help_text, samples):
+    lines.append(f'# HELP {name} {help_text}')
+    lines.append(f'# TYPE {name} {kind}')
+    for labels, value in samples:
+        lines.append(f'{name}{labels} {value}')
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _views_lock:
+        views = []
+        for key, metrics in sorted(_views.items()):
+            copy = _ViewMetrics()
+            for name in _ViewMetrics.__slots__:
+                setattr(copy, name, getattr(metrics, name))
+            copy.buckets = list(metrics.buckets)
+            views.append((_labels(view=key[0], method=key[1]), key, copy))
+
+    lines = []
+    for name, attr, help_text in (
+        ('inventory_requests_total', 'requests', 'Requests handled.'),
+        ('inventory_db_queries_total', 'queries', 'Database queries run while handling requests.'),
+        ('inventory_db_seconds_total', 'db_time', 'Time spent executing database queries.'),
+        ('inventory_serialization_seconds_total', 'serialization_time', 'Time spent serializing and rendering responses.'),
+        ('inventory_query_budget_exceeded_total', 'over_budget', 'Requests that ran more queries than the budget.'),
+    ):
+        _family(lines, name, 'counter', help_text, [(labels, getattr(m, attr)) for labels, _, m in views])
+
+    lines.append('# HELP inventory_request_duration_seconds Total request handling time.')
+    lines.append('# TYPE inventory_request_duration_seconds histogram')
+    for labels, (view, method), m in views:
+        for bound, count in zip((*DURATION_BUCKETS, '+Inf'), (*m.buckets, m.requests)):
+            lines.append(f'inventory_request_duration_seconds_bucket{_labels(view=view, method=method, le=bound)} {count}')
+        lines.append(f'inventory_request_duration_seconds_sum{labels} {m.total_time}')
+        lines.append(f'inventory_request_duration_seconds_count{labels} {m.requests}')
+
+    from .cache import cache_stats
+    from .db.pool import pools
+
+    cache = cache_stats()
+    _family(lines, 'inventory_cache_lookups_total', 'counter', 'Response cache lookups by result.',
+            [(_labels(result=result), cache[name]) for result, name in (('hit', 'hits'), ('miss', 'misses'))])
+    _family(lines, 'inventory_cache_not_modified_total', 'counter', 'Cached responses answered with 304.',
+            [('', cache['not_modified'])])
+
+    from .authentication import users as auth_users
+
+    auth = auth_users.stats()
+    _family(lines, 'inventory_auth_user_cache_lookups_total', 'counter', 'Authenticated user cache lookups by result.',
+            [(_labels(result=result), auth[name]) for result, name in (('hit', 'hits'), ('miss', 'misses'))])
+
+    from .audit import writer as audit_writer
+
+    audit = audit_writer.stats()
+    for name, help_text in (
+        ('enqueued', 'Audit entries queued for the background writer.'),
+        ('written', 'Audit entries written from the queue or by requests.'),
+        ('relayed', 'Audit entries moved from the outbox.'),
+        ('overflowed', 'Audit entries requests wrote themselves because the queue was full.'),
+        ('dropped', 'Audit entries lost after failed writes.'),
+    ):
+        _family(lines, f'inventory_audit_{name}_total', 'counter', help_text, [('', audit[name])])
+    _family(lines, 'inventory_audit_enqueue_wait_seconds_total', 'counter',
+            'Time requests spent waiting for audit queue space.', [('', audit['enqueue_wait_seconds'])])
+    for name, help_text in (
+        ('queue_depth', 'Audit entries waiting to be written.'),
+        ('queue_high_water', 'Largest audit queue depth seen.'),
+        ('queue_capacity', 'Audit queue size limit.'),
+    ):
+        _family(lines, f'inventory_audit_{name}', 'gauge', help_text, [('', audit[name])])
+
+    from .changes import stats as change_stats
+
+    _family(lines, 'inventory_change_streams', 'gauge', 'Open change feed event streams.',
+            [('', change_stats['streams'])])
+    for name, help_text in (
+        ('polls', 'Change feed polls by the stream hubs.'),
+        ('sent', 'Changes queued for event streams.'),
+        ('dropped', 'Event streams ended for falling a full buffer behind.'),
+    ):
+        _family(lines, f'inventory_change_stream_{name}_total', 'counter', help_text, [('', change_stats[name])])
+
+    snapshots = sorted((alias, pool.snapshot()) for alias, pool in pools().items())
+    if snapshots:
+        _family(lines, 'inventory_db_pool_connections', 'gauge', 'Pooled database connections by state.',
+                [(_labels(alias=alias, state=state), snapshot[state])
+                 for alias, snapshot in snapshots for state in ('idle', 'in_use')])
+        _family(lines, 'inventory_db_pool_max_size', 'gauge', 'Connection pool size limit.',
+                [(_labels(alias=alias), snapshot['max_size']) for alias, snapshot in snapshots])
+        for name, help_text in (
+            ('created', 'Connections opened by the pool.'),
+            ('reused', 'Connections handed out again from the pool.'),
+            ('discarded', 'Pooled connections closed as unusable.'),
+            ('timeouts', 'Connection requests that timed out waiting for the pool.'),
+        ):
+            _family(lines, f'inventory_db_pool_{name}_total', 'counter', help_text,
+                    [(_labels(alias=alias), snapshot[name]) for alias, snapshot in snapshots])
+
+    return '\n'.join(lines) + '\n'
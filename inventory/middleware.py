@@ -0,0 +1,89 @@
+import sys
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, profiling
+
+
+class QueryMetricsMiddleware:
+    """Record query count, DB time, serialization time and total time per view.
+
+    Works in both sync and async mode, so async views stay on the event
+    loop. Put it first in ``MIDDLEWARE`` so the total covers the others.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        metrics.record(request, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        metrics.record(request, stats, time.perf_counter() - start)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that too.
+        render = response.render
+
+        def timed_render():
+            with metrics.measure_serialization():
+                return render()
+
+        response.render = timed_render
+        return response
+
+
+class ProfilingMiddleware:
+    """Sample stacks and queries of ``INVENTORY_PROFILE_RATE`` of requests;
+    see ``inventory/profiling.py``.
+
+    Drops out of the chain at startup while the rate is 0, and in an async
+    chain (under ASGI), where views don't run on the request's thread.
+    Without ``async_capable`` Django would hand it a sync ``get_response``
+    there and keep it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling.get_rate() or iscoroutinefunction(get_response):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            profiling.finish(request, response)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if profiling.should_profile(request):
+            # The caller is the handler's _get_response, which runs the
+            # view and renders its response.
+            profiling.start(sys._getframe(1))
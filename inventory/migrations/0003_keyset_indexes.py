@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stockauditlog'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='inventory_p_name_5a5314_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['price', 'id'], name='inventory_p_price_03b579_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['quantity', 'id'], name='inventory_p_quantit_b1fc73_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockauditlog',
+            index=models.Index(fields=['timestamp', 'id'], name='inventory_s_timesta_17d3d0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['timestamp', 'id'], name='inventory_s_timesta_7c54a1_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_summaries(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    for model_name, column in (('CategoryStockSummary', 'category_id'), ('SupplierStockSummary', 'supplier_id')):
+        model = apps.get_model('inventory', model_name)
+        rows = Product.objects.values(column).annotate(products=Count('id'), quantity=Sum('quantity'))
+        model.objects.bulk_create([
+            model(pk=row[column], total_products=row['products'], total_quantity=row['quantity'] or 0)
+            for row in rows
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStockSummary',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='inventory.category')),
+                ('total_products', models.IntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SupplierStockSummary',
+            fields=[
+                ('supplier', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_summary', serialize=False, to='inventory.supplier')),
+                ('total_products', models.IntegerField(default=0)),
+                ('total_quantity', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
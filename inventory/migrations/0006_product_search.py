@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:55
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Concat
+
+
+def populate_search_text(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Category = apps.get_model('inventory', 'Category')
+    Supplier = apps.get_model('inventory', 'Supplier')
+    Product.objects.update(search_text=Concat(
+        'name', Value(' '),
+        Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]),
+        Value(' '),
+        Subquery(Supplier.objects.filter(pk=OuterRef('supplier_id')).values('name')[:1]),
+        output_field=TextField(),
+    ))
+
+
+def create_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX inventory_product_search_ft ON inventory_product (search_text)"
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute("DROP INDEX inventory_product_search_ft ON inventory_product")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_reorder_points'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(populate_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
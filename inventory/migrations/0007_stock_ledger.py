@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_ledger(apps, schema_editor):
+    # Earlier history can't be rebuilt (products could be edited in place),
+    # so each product's ledger opens with its current quantity.
+    Product = apps.get_model('inventory', 'Product')
+    StockLedgerEntry = apps.get_model('inventory', 'StockLedgerEntry')
+    rows = Product.objects.values_list('id', 'quantity').iterator(chunk_size=5000)
+    batch = []
+    for product_id, quantity in rows:
+        batch.append(StockLedgerEntry(product_id=product_id, kind='ADJ', delta=quantity))
+        if len(batch) == 5000:
+            StockLedgerEntry.objects.bulk_create(batch)
+            batch = []
+    StockLedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('IN', 'In'), ('OUT', 'Out'), ('ADJ', 'Adjustment')], max_length=3)),
+                ('delta', models.IntegerField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='inventory.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField()),
+                ('timestamp', models.DateTimeField()),
+                ('entry', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='snapshot', to='inventory.stockledgerentry')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_snapshots', to='inventory.product')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='stockledgerentry',
+            index=models.Index(fields=['product', 'id'], name='inventory_s_product_4c4536_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['product', 'entry'], name='inventory_s_product_ac07f9_idx'),
+        ),
+        migrations.RunPython(open_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryMovementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('units_in', models.BigIntegerField(default=0)),
+                ('units_out', models.BigIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movement_rollups', to='inventory.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['granularity', 'bucket'], name='inventory_c_granula_9e0070_idx')],
+                'constraints': [models.UniqueConstraint(fields=('category', 'granularity', 'bucket'), name='inventory_category_rollup_bucket')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductMovementRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4)),
+                ('bucket', models.DateTimeField()),
+                ('units_in', models.BigIntegerField(default=0)),
+                ('units_out', models.BigIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movement_rollups', to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'granularity', 'bucket'), name='inventory_product_rollup_bucket')],
+            },
+        ),
+    ]
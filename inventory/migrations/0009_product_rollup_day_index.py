@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_movement_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productmovementrollup',
+            index=models.Index(fields=['granularity', 'bucket'], name='inventory_p_granula_5a8307_idx'),
+        ),
+    ]
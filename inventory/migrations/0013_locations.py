@@ -0,0 +1,90 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:40
+
+import django.core.validators
+import django.db.models.deletion
+import inventory.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_main_location(apps, schema_editor):
+    # Stock so far lived on the product row: it all moves to one location,
+    # which existing movements are assigned to.
+    Location = apps.get_model('inventory', 'Location')
+    Product = apps.get_model('inventory', 'Product')
+    StockLevel = apps.get_model('inventory', 'StockLevel')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    code = getattr(settings, 'INVENTORY_DEFAULT_LOCATION', 'MAIN')
+    main, _ = Location.objects.get_or_create(code=code, defaults={'name': 'Main warehouse'})
+    StockMovement.objects.update(location=main)
+    rows = Product.objects.exclude(quantity=0).values_list('id', 'quantity').iterator(chunk_size=5000)
+    batch = []
+    for product_id, quantity in rows:
+        batch.append(StockLevel(product_id=product_id, location=main, slot=0, quantity=quantity))
+        if len(batch) == 5000:
+            StockLevel.objects.bulk_create(batch)
+            batch = []
+    StockLevel.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_audit_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='stock_slots',
+            field=models.PositiveSmallIntegerField(default=1, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(64)]),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movements', to='inventory.location'),
+        ),
+        migrations.CreateModel(
+            name='StockLevel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_levels', to='inventory.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'location', 'slot'), name='inventory_stocklevel_slot')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfers_in', to='inventory.location')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfers', to='inventory.product')),
+                ('source', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfers_out', to='inventory.location')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='inventory_s_timesta_0656f6_idx')],
+            },
+        ),
+        migrations.RunPython(open_main_location, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='location',
+            field=models.ForeignKey(default=inventory.models.default_location_id, on_delete=django.db.models.deletion.PROTECT, related_name='movements', to='inventory.location'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:50
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('product', 'Product'), ('stock', 'Stock'), ('category', 'Category'), ('supplier', 'Supplier'), ('location', 'Location')], max_length=8)),
+                ('action', models.CharField(choices=[('C', 'Created'), ('U', 'Updated'), ('D', 'Deleted')], max_length=1)),
+                ('object_id', models.BigIntegerField()),
+                ('delta', models.IntegerField(null=True)),
+                ('timestamp', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:10
+
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def hold_in_levels(apps, schema_editor):
+    # Held reservations so far only counted on the product row: hold their
+    # units in slot 0 of their location.
+    StockLevel = apps.get_model('inventory', 'StockLevel')
+    StockReservation = apps.get_model('inventory', 'StockReservation')
+    held = StockReservation.objects.filter(status='HELD').values('product_id', 'location_id').annotate(
+        total=Sum('quantity')
+    ).order_by()
+    for row in held.iterator(chunk_size=5000):
+        level, _ = StockLevel.objects.get_or_create(
+            product_id=row['product_id'], location_id=row['location_id'], slot=0
+        )
+        StockLevel.objects.filter(pk=level.pk).update(reserved=F('reserved') + row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocklevel',
+            name='reserved',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='stockreservation',
+            name='slot',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(hold_in_levels, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,33 @@
-from django.db import models
+from django.conf import settings
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
-    
+    # Reorder point for products in this category that don't set their own.
+    reorder_point = models.PositiveIntegerField(null=True, blank=True)
+
+    def save(self, *args, **kwargs):
+        from .cache import invalidate
+        from .search import refresh_search_text
+        with transaction.atomic():
+            old_name = Category.objects.filter(pk=self.pk).values_list('name', flat=True).first() if self.pk else None
+            super().save(*args, **kwargs)
+            if old_name is not None and old_name != self.name:
+                refresh_search_text(Product.objects.filter(category=self))
+            # Products inheriting the category's reorder point get the new level.
+            level = self.reorder_point if self.reorder_point is not None else Product.DEFAULT_REORDER_POINT
+            inheriting = Product.objects.filter(category=self, reorder_point__isnull=True).exclude(reorder_level=level)
+            ids = list(inheriting.values_list('id', flat=True))
+            if ids:
+                Product.objects.filter(pk__in=ids).update(reorder_level=level)
+                invalidate(*[f'product:{pk}' for pk in ids])
+
     def __str__(self):
         return self.name
 
@@ -14,15 +36,120 @@ class Supplier(models.Model):
     email = models.EmailField()
     phone = models.CharField(max_length=20)
     address = models.TextField()
+
+    def save(self, *args, **kwargs):
+        from .search import refresh_search_text
+        with transaction.atomic():
+            old_name = Supplier.objects.filter(pk=self.pk).values_list('name', flat=True).first() if self.pk else None
+            super().save(*args, **kwargs)
+            if old_name is not None and old_name != self.name:
+                refresh_search_text(Product.objects.filter(supplier=self))
+
     def __str__(self):
         return self.name
 
+class Location(models.Model):
+    """A warehouse or store that holds stock."""
+    code = models.CharField(max_length=20, unique=True)
+    name = models.CharField(max_length=100)
+
+    def __str__(self):
+        return f"{self.code} ({self.name})"
+
+
+_default_location_ids = {}
+
+
+def default_location_id():
+    """Primary key of the ``INVENTORY_DEFAULT_LOCATION`` location, which
+    movements without a location and direct stock edits apply to."""
+    code = getattr(settings, 'INVENTORY_DEFAULT_LOCATION', 'MAIN')
+    pk = _default_location_ids.get(code)
+    if pk is None:
+        pk = Location.objects.get_or_create(code=code, defaults={'name': code})[0].pk
+        # Remembered once committed: a row whose transaction rolls back (as
+        # every test's does) would otherwise leave a dead key behind.
+        transaction.on_commit(lambda: _default_location_ids.__setitem__(code, pk))
+    return pk
+
+
+def forget_default_location():
+    """Drop the cached default location, e.g. when locations change."""
+    _default_location_ids.clear()
+
+
 class Product(models.Model):
+    # Catalog key that bulk imports upsert on; optional for products created
+    # through the API.
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=100)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     quantity = models.IntegerField(default=0)
+    # Own reorder point; when unset the category's (or the default) applies.
+    reorder_point = models.PositiveIntegerField(null=True, blank=True)
+    # The reorder point in effect, denormalized so the low-stock predicate
+    # (quantity < reorder_level) can be served from an index. Signed, like
+    # quantity: MySQL computes quantity - reorder_level as UNSIGNED
+    # otherwise, and the headroom index then fails on low-stock rows.
+    reorder_level = models.IntegerField(default=5, editable=False)
+
+    # Name, category name and supplier name, denormalized for the search
+    # index (a FULLTEXT index on MySQL can't span the joined tables).
+    search_text = models.TextField(default='', editable=False)
+
+    # Stock rows per location. More than one spreads a hot product's
+    # movements over several rows; see inventory/stock.py.
+    stock_slots = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1), MaxValueValidator(64)]
+    )
+
+    # Units held by open reservations (the sum of the stock levels'
+    # ``reserved``); available stock is quantity - reserved. Only changed by
+    # inventory/reservations.py, and folded like quantity for sharded
+    # products. Signed for the same reason as reorder_level.
+    reserved = models.IntegerField(default=0, editable=False)
+
+    DEFAULT_REORDER_POINT = 5
+
+    class Meta:
+        # Keyset pagination seeks on (ordering key, id).
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['quantity', 'id']),
+            # Low-stock scans filter and sort on headroom below the reorder level.
+            models.Index(F('quantity') - F('reorder_level'), F('id'), name='inventory_product_headroom_idx'),
+        ]
+
+    def get_reorder_level(self):
+        if self.reorder_point is not None:
+            return self.reorder_point
+        if self.category.reorder_point is not None:
+            return self.category.reorder_point
+        return self.DEFAULT_REORDER_POINT
+
+    def save(self, *args, **kwargs):
+        from .ledger import record_quantity_change
+        from .search import build_search_text
+        from .stock import record_level_change
+        from .summary import record_product_change
+        self.reorder_level = self.get_reorder_level()
+        self.search_text = build_search_text(self.name, self.category.name, self.supplier.name)
+        with transaction.atomic():
+            previous = None
+            if self.pk is not None:
+                previous = Product.objects.select_for_update().filter(pk=self.pk).values(
+                    'category_id', 'supplier_id', 'quantity', 'reserved'
+                ).first()
+                if previous is not None:
+                    # A save of a stale instance mustn't undo reservations.
+                    self.reserved = previous['reserved']
+            super().save(*args, **kwargs)
+            record_product_change(previous, self, kwargs.get('update_fields'))
+            record_quantity_change(previous, self, kwargs.get('update_fields'))
+            record_level_change(previous, self, kwargs.get('update_fields'))
 
     def __str__(self):
          return f"{self.name} ({self.category.name})"
@@ -32,29 +159,288 @@ class StockMovement(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     movement_type = models.CharField(max_length=3, choices=MOVEMENT_CHOICES)
     quantity = models.PositiveIntegerField()
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, related_name='movements', default=default_location_id
+    )
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['timestamp', 'id'])]
+
     def save(self, *args, **kwargs):
-        if self.pk is None:
-            if self.movement_type == 'IN':
-                self.product.quantity += self.quantity
-            elif self.movement_type == 'OUT':
-                if self.product.quantity < self.quantity:
-                    raise ValueError("Not enough stock!")
-                self.product.quantity -= self.quantity
-            self.product.save()
-        super().save(*args, **kwargs)
+        # Movements are part of the stock ledger; correct one by recording
+        # a reversing movement.
+        if self.pk is not None:
+            raise ValueError("Stock movements can't be changed")
+        from .stock import adjust_stock
+        # No savepoint of its own: record_movement() runs it in one, and a
+        # failure rolls the whole movement back anyway.
+        with transaction.atomic(savepoint=False):
+            settle = adjust_stock(self.product, self.location_id, self.movement_type, self.quantity)
+            super().save(*args, **kwargs)
+            settle.rollups.append((
+                self.product_id, self.product.category_id, self.movement_type, self.quantity, self.timestamp
+            ))
+            settle.finish()
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Stock movements can't be deleted")
 
     def __str__(self):
         return f"{self.movement_type} - {self.product.name} - {self.quantity}"
     
 
+class StockLevel(models.Model):
+    """Part of a product's stock at a location.
+
+    A location's stock is the sum of its ``Product.stock_slots`` rows
+    (more, briefly, after the slot count is lowered).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_levels')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_levels')
+    slot = models.PositiveSmallIntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    # Units of ``quantity`` held by reservations; OUT movements and
+    # transfers only take the rest. See inventory/reservations.py.
+    reserved = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'location', 'slot'], name='inventory_stocklevel_slot'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.location_id}[{self.slot}]: {self.quantity}"
+
+
+class StockTransfer(models.Model):
+    """Stock moved between two locations; the product's total is unchanged."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='transfers')
+    source = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='transfers_out')
+    destination = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='transfers_in')
+    quantity = models.PositiveIntegerField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['timestamp', 'id'])]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} from {self.source_id} to {self.destination_id}"
+
+
+class StockReservation(models.Model):
+    """Stock held for a checkout until it is confirmed, released or expires."""
+    HELD, CONFIRMED, RELEASED, EXPIRED = 'HELD', 'CONFIRMED', 'RELEASED', 'EXPIRED'
+    STATUS_CHOICES = [(HELD, 'Held'), (CONFIRMED, 'Confirmed'), (RELEASED, 'Released'), (EXPIRED, 'Expired')]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    location = models.ForeignKey(
+        Location, on_delete=models.PROTECT, related_name='reservations', default=default_location_id
+    )
+    # Stock level slot the units are held in.
+    slot = models.PositiveSmallIntegerField(default=0, editable=False)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=HELD)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    movement = models.OneToOneField(
+        StockMovement, on_delete=models.SET_NULL, null=True, related_name='reservation'
+    )
+    timestamp = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id']),
+            # The sweeper takes held reservations in expiry order.
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.status} {self.quantity} of {self.product_id}"
+
+
+class Change(models.Model):
+    """One entry in the change feed; ``id`` is the sequence number clients
+    sync from. See inventory/changes.py."""
+    KIND_CHOICES = [
+        ('product', 'Product'),
+        # Stock of the product ``object_id`` changed by ``delta`` (0 for
+        # transfers and reservations, which change where or how it's held).
+        ('stock', 'Stock'),
+        ('category', 'Category'),
+        ('supplier', 'Supplier'),
+        ('location', 'Location'),
+    ]
+    ACTION_CHOICES = [('C', 'Created'), ('U', 'Updated'), ('D', 'Deleted')]
+
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    action = models.CharField(max_length=1, choices=ACTION_CHOICES)
+    object_id = models.BigIntegerField()
+    delta = models.IntegerField(null=True)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.kind} {self.object_id} {self.action}"
+
+
 class StockAuditLog(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     movement_type = models.CharField(max_length=10)  # IN or OUT
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add: rows written later by the audit writer keep the
+    # time of their movement.
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [models.Index(fields=['timestamp', 'id'])]
 
     def __str__(self):
         return f"{self.product.name} | {self.movement_type} | {self.quantity} | by {self.user}"
+
+
+class StockAuditOutbox(models.Model):
+    """Audit rows committed with their movement, waiting for the audit
+    writer to move them into ``StockAuditLog`` (``INVENTORY_AUDIT_MODE = 'outbox'``)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    quantity = models.IntegerField()
+    movement_type = models.CharField(max_length=10)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    timestamp = models.DateTimeField(default=timezone.now)
+
+
+class CategoryStockSummary(models.Model):
+    """Running product count and stock total per category.
+
+    Kept up to date by delta from product saves/deletes and stock movements
+    (see ``inventory/summary.py``); ``rebuild_inventory_stats`` recomputes it.
+    """
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='stock_summary')
+    total_products = models.IntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.category_id}: {self.total_products} products, {self.total_quantity} units"
+
+
+class SupplierStockSummary(models.Model):
+    """Running product count and stock total per supplier."""
+    supplier = models.OneToOneField(Supplier, on_delete=models.CASCADE, primary_key=True, related_name='stock_summary')
+    total_products = models.IntegerField(default=0)
+    total_quantity = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.supplier_id}: {self.total_products} products, {self.total_quantity} units"
+
+
+class LowStockAlert(models.Model):
+    """Appended when a stock movement takes a product below its reorder level."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField()
+    reorder_level = models.PositiveIntegerField()
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.product_id} below {self.reorder_level} ({self.quantity})"
+
+
+class StockLedgerEntry(models.Model):
+    """One change to a product's stock: a movement in or out, or an
+    adjustment from creating or editing the product.
+
+    Append-only; a product's quantity at any point in time is the sum of
+    its entries up to then (see ``inventory/ledger.py``).
+    """
+    KIND_CHOICES = [('IN', 'In'), ('OUT', 'Out'), ('ADJ', 'Adjustment')]
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='ledger_entries')
+    kind = models.CharField(max_length=3, choices=KIND_CHOICES)
+    delta = models.IntegerField()
+    timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # Replays scan one product's entries after a snapshot.
+        indexes = [models.Index(fields=['product', 'id'])]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Ledger entries can't be changed")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Ledger entries can't be deleted")
+
+    def __str__(self):
+        return f"{self.product_id} {self.kind} {self.delta:+d}"
+
+
+class StockSnapshot(models.Model):
+    """A product's quantity after ``entry``, so reconstructing stock at a
+    point in time only replays the entries since the nearest snapshot."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_snapshots')
+    entry = models.OneToOneField(StockLedgerEntry, on_delete=models.CASCADE, related_name='snapshot')
+    quantity = models.IntegerField()
+    timestamp = models.DateTimeField()  # the entry's timestamp
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'entry'])]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.entry_id}: {self.quantity}"
+
+
+class ProductMovementRollup(models.Model):
+    """Units moved in and out of one product per hour or day.
+
+    Kept up to date from the movement write path (see
+    ``inventory/rollups.py``); ``backfill_movement_rollups`` rebuilds it.
+    """
+    GRANULARITY_CHOICES = [('hour', 'Hour'), ('day', 'Day')]
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movement_rollups')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()  # start of the hour/day, UTC
+    units_in = models.BigIntegerField(default=0)
+    units_out = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'granularity', 'bucket'], name='inventory_product_rollup_bucket'),
+        ]
+        # Demand forecasting reads every product's row for one day at a time.
+        indexes = [models.Index(fields=['granularity', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.product_id} {self.granularity} {self.bucket:%Y-%m-%d %H:00}: +{self.units_in} -{self.units_out}"
+
+
+class CategoryMovementRollup(models.Model):
+    """Units moved in and out of a category's products per hour or day."""
+    GRANULARITY_CHOICES = ProductMovementRollup.GRANULARITY_CHOICES
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='movement_rollups')
+    granularity = models.CharField(max_length=4, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    units_in = models.BigIntegerField(default=0)
+    units_out = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'granularity', 'bucket'], name='inventory_category_rollup_bucket'),
+        ]
+        # Store-wide trends sum every category's rows for a range of buckets.
+        indexes = [models.Index(fields=['granularity', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.category_id} {self.granularity} {self.bucket:%Y-%m-%d %H:00}: +{self.units_in} -{self.units_out}"
+
+
+class IdempotencyKey(models.Model):
+    """The response to a POST made with an ``Idempotency-Key`` header,
+    replayed when the key is reused (see ``inventory/idempotency.py``)."""
+    digest = models.CharField(max_length=64, unique=True)  # sha256 of user, path and key
+    request_hash = models.CharField(max_length=64)  # sha256 of the request body
+    status_code = models.PositiveSmallIntegerField()
+    response = models.TextField()  # JSON
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.digest[:12]} -> {self.status_code}"
@@ -0,0 +1,214 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def seek_filter(fields, values):
+    """Rows strictly after ``values`` in the ordering given by ``fields``."""
+    condition = Q()
+    for i, field in enumerate(fields):
+        name = field.lstrip('-')
+        lookup = 'lt' if field.startswith('-') else 'gt'
+        clause = Q(**{f'{name}__{lookup}': values[i]})
+        for prev_field, prev_value in zip(fields[:i], values[:i]):
+            clause &= Q(**{prev_field.lstrip('-'): prev_value})
+        condition |= clause
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination that seeks on the ordering key instead of OFFSET.
+
+    Each page is fetched with ``WHERE (k1, k2) < (last_k1, last_k2)`` style
+    filters on an indexed ordering, so page N costs the same as page 1.
+    ``id`` is always the final tiebreaker, which keeps the ordering total.
+    The exact total is only computed when ``?count=true``, or on the first
+    page when ``include_count`` is on and the client doesn't send
+    ``?count=false``; cursor links drop ``count``, so later pages skip it.
+    """
+
+    page_size = 10
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    ordering_query_param = 'ordering'
+    # Default ordering and the fields clients may order by.
+    ordering = ('-id',)
+    ordering_fields = ()
+    include_count = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = queryset.count() if self.get_include_count(request) else None
+        return self._finish_page(list(self._page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        """``paginate_queryset()`` for async views, using the async ORM."""
+        self.count = await queryset.acount() if self.get_include_count(request) else None
+        return self._finish_page([row async for row in self._page_queryset(queryset, request)])
+
+    def _page_queryset(self, queryset, request):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = self.get_ordering(request)
+
+        self.cursor_values, self.reverse = self.decode_cursor(request, queryset)
+        fields = [self.flip(f) for f in self.fields] if self.reverse else self.fields
+        queryset = queryset.order_by(*fields)
+        if self.cursor_values is not None:
+            queryset = queryset.filter(seek_filter(fields, self.cursor_values))
+        return queryset[:self.page_size + 1]
+
+    def _finish_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        # Moving backwards, "more" means there is an earlier page; the page
+        # we came from is always reachable going forwards, and vice versa.
+        started = self.cursor_values is not None
+        self.has_next = has_more if not self.reverse else started
+        self.has_previous = started if not self.reverse else has_more
+        self.page = rows
+        return rows
+
+    def get_paginated_payload(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, **payload}
+        return payload
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_payload(data))
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+        try:
+            size = int(raw)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be an integer.'})
+        return max(1, min(size, self.max_page_size))
+
+    def get_include_count(self, request):
+        raw = request.query_params.get(self.count_query_param)
+        if raw is None:
+            return self.include_count and not request.query_params.get(self.cursor_query_param)
+        return raw.lower() in ('1', 'true', 'yes')
+
+    def get_ordering(self, request):
+        raw = request.query_params.get(self.ordering_query_param)
+        if not raw or not self.ordering_fields:
+            ordering = list(self.ordering)
+        else:
+            if raw.lstrip('-') not in self.ordering_fields:
+                raise ValidationError({self.ordering_query_param: f"Cannot order by '{raw}'."})
+            ordering = [raw]
+        if ordering[-1].lstrip('-') != 'id':
+            # Tiebreak in the same direction as the last key so one index serves both.
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def position(self, row):
+        values = []
+        for field in self.fields:
+            name = field.lstrip('-')
+            value = row[name] if isinstance(row, dict) else getattr(row, name)
+            if isinstance(value, (datetime, Decimal)):
+                value = value.isoformat() if isinstance(value, datetime) else str(value)
+            values.append(value)
+        return values
+
+    def encode_cursor(self, values, reverse):
+        raw = json.dumps({'v': values, 'r': reverse}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(raw.encode()).decode()
+        url = replace_query_param(self.base_url, self.cursor_query_param, cursor)
+        # Counting again on every page would defeat the point of the cursor.
+        return remove_query_param(url, self.count_query_param)
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values, reverse = data['v'], bool(data['r'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise NotFound('Invalid cursor')
+        # Cursors come from the client: convert each value as its ordering
+        # field would, so a tampered one is a 404 rather than a query error.
+        try:
+            values = [
+                self.cursor_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (DjangoValidationError, TypeError, ValueError):
+            raise NotFound('Invalid cursor')
+        if None in values:
+            raise NotFound('Invalid cursor')
+        return values, reverse
+
+    @staticmethod
+    def cursor_field(queryset, name):
+        """Model field or annotation output field ordered on as ``name``."""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position(self.page[-1]), False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.position(self.page[0]), True)
+
+
+class ProductPagination(KeysetPagination):
+    ordering = ('id',)
+    ordering_fields = ('id', 'name', 'price', 'quantity')
+    include_count = True
+
+
+class SearchPagination(ProductPagination):
+    """Best match first, on the ``search_rank`` annotation."""
+
+    ordering = ('-search_rank', 'id')
+    ordering_fields = ()
+
+
+class TimelinePagination(KeysetPagination):
+    """Newest first on ``(timestamp, id)`` for movements and audit logs."""
+
+    page_size = 50
+    ordering = ('-timestamp', '-id')
+
+
+class LowStockPagination(KeysetPagination):
+    """Largest shortfall first; ``headroom`` is ``quantity - reorder_level``."""
+
+    page_size = 50
+    ordering = ('headroom', 'id')
@@ -0,0 +1,280 @@
+"""
+Sampled request profiling: where a slow view's time goes.
+
+With ``INVENTORY_PROFILE_RATE`` above 0, ``ProfilingMiddleware`` profiles
+that share of requests (to the views named in ``INVENTORY_PROFILE_VIEWS``,
+when set). From URL resolution to the rendered response, a sampler thread
+records the request thread's stack every ``INVENTORY_PROFILE_INTERVAL``
+seconds, with the SQL statement running at the time as an extra leaf
+frame, so query building, the database, validation, serialization and
+rendering show up as separate towers. Each stack is weighted by the
+microseconds since the previous sample. The sampler needs the GIL to look,
+so while any request is being profiled the interpreter's switch interval
+is lowered to a tenth of the sampling interval; otherwise it would mostly
+see the request thread when it lets go of the GIL to wait on the database,
+and code in between only every 5 ms.
+
+Stacks are appended per view to ``<view>.<METHOD>.collapsed`` in
+``INVENTORY_PROFILE_DIR``, in the collapsed format flamegraph.pl, inferno
+and speedscope read (they sum repeated stacks), and each profiled
+request's queries and timings to ``requests.ndjson`` beside them.
+``manage.py profile_report`` lists the hottest functions and statements
+per view.
+
+While the rate is 0 the middleware drops out of the chain at startup and
+no query hook is installed, so requests pay nothing. It also drops out of
+an async middleware chain, as under ASGI, where work is spread over the
+event loop and thread pools rather than one request thread.
+"""
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('inventory.profiling')
+
+REQUESTS_FILE = 'requests.ndjson'
+
+_current = contextvars.ContextVar('inventory_profile', default=None)
+
+
+def get_rate():
+    return getattr(settings, 'INVENTORY_PROFILE_RATE', 0)
+
+
+def get_views():
+    return getattr(settings, 'INVENTORY_PROFILE_VIEWS', None)
+
+
+def get_interval():
+    return getattr(settings, 'INVENTORY_PROFILE_INTERVAL', 0.001)
+
+
+def get_dir():
+    return Path(getattr(settings, 'INVENTORY_PROFILE_DIR', Path(settings.BASE_DIR) / 'profiles'))
+
+
+@functools.lru_cache(maxsize=None)
+def _path_prefixes():
+    return sorted({os.path.join(os.path.abspath(p), '') for p in sys.path if p}, key=len, reverse=True)
+
+
+_labels = {}
+
+
+def _label(code):
+    """``package/module.py:Class.function`` for a code object."""
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        for prefix in _path_prefixes():
+            if path.startswith(prefix):
+                path = path[len(prefix):]
+                break
+        label = _labels[code] = f'{path}:{code.co_qualname}'.replace(';', ',')
+    return label
+
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+[`"]?(\w+)', re.IGNORECASE)
+
+
+def statement(sql):
+    """``SELECT inventory_product``: the verb and first table of ``sql``."""
+    words = sql.split(None, 1)
+    match = _TABLE.search(sql)
+    verb = words[0].upper() if words else ''
+    return f'{verb} {match.group(1)}' if match else verb
+
+
+class Profile:
+    """One request's sampled stacks (in microseconds) and queries."""
+
+    def __init__(self, root, interval):
+        # Stacks are cut at this frame (the handler's _get_response).
+        self.root = root
+        self.thread_id = threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self.queries = []
+        self.statement = None
+        self.start = time.perf_counter()
+        self.done = threading.Event()
+        self.sampler = threading.Thread(target=self._sample, name='inventory-profiler', daemon=True)
+
+    def _sample(self):
+        last = self.start
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            stack = self._collapse(frame)
+            if stack is not None:
+                self.stacks[stack] += int((now - last) * 1e6)
+            last = now
+
+    def _collapse(self, frame):
+        labels = [] if self.statement is None else [f'sql:{self.statement}']
+        while frame is not None:
+            labels.append(_label(frame.f_code))
+            if frame is self.root:
+                return ';'.join(reversed(labels))
+            frame = frame.f_back
+        # Outside the view (before it started or after it returned).
+        return None
+
+
+def _record_query(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    profile.statement = statement(sql)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.statement = None
+        profile.queries.append((sql, time.perf_counter() - start))
+
+
+def should_profile(request):
+    views = get_views()
+    match = request.resolver_match
+    if views is not None and (match is None or match.view_name not in views):
+        return False
+    return random.random() < get_rate()
+
+
+_switch_lock = threading.Lock()
+_switch = {'active': 0, 'saved': None}
+
+
+def _hold_switch_interval(interval):
+    with _switch_lock:
+        if not _switch['active']:
+            _switch['saved'] = sys.getswitchinterval()
+            sys.setswitchinterval(min(interval / 10, _switch['saved']))
+        _switch['active'] += 1
+
+
+def _release_switch_interval():
+    with _switch_lock:
+        _switch['active'] -= 1
+        if not _switch['active']:
+            sys.setswitchinterval(_switch['saved'])
+
+
+def start(root):
+    """Profile the current request from ``root`` down until ``finish()``."""
+    for connection in connections.all():
+        if _record_query not in connection.execute_wrappers:
+            connection.execute_wrappers.append(_record_query)
+    profile = Profile(root, get_interval())
+    _hold_switch_interval(profile.interval)
+    _current.set(profile)
+    profile.sampler.start()
+
+
+def finish(request, response):
+    """Stop the current request's profile, if any, and save it."""
+    profile = _current.get()
+    if profile is None:
+        return
+    _current.set(None)
+    profile.done.set()
+    profile.sampler.join()
+    _release_switch_interval()
+    elapsed = time.perf_counter() - profile.start
+    match = request.resolver_match
+    try:
+        save(match.view_name if match else 'unresolved', request.method, request.get_full_path(),
+             response.status_code if response is not None else None, elapsed, profile)
+    except OSError:
+        logger.exception('Could not save the profile of %s %s', request.method, request.path)
+
+
+def _filename(view, method):
+    return re.sub(r'[^\w.-]', '_', f'{view}.{method}') + '.collapsed'
+
+
+_write_lock = threading.Lock()
+
+
+def save(view, method, path, status_code, elapsed, profile):
+    directory = get_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    record = {
+        'view': view,
+        'method': method,
+        'path': path,
+        'status': status_code,
+        'ms': round(elapsed * 1000, 3),
+        'sampled_ms': round(sum(profile.stacks.values()) / 1000, 3),
+        'queries': [{'sql': sql, 'ms': round(seconds * 1000, 3)} for sql, seconds in profile.queries],
+    }
+    stacks = ''.join(f'{stack} {count}\n' for stack, count in profile.stacks.items())
+    # Unbuffered appends, one write per file per request, so lines from
+    # concurrent workers don't interleave.
+    with _write_lock:
+        if stacks:
+            with open(directory / _filename(view, method), 'ab', buffering=0) as f:
+                f.write(stacks.encode('utf-8'))
+        with open(directory / REQUESTS_FILE, 'ab', buffering=0) as f:
+            f.write((json.dumps(record) + '\n').encode('utf-8'))
+
+
+def read_stacks(directory):
+    """``{(view, method): Counter({stack: microseconds})}`` from the collapsed files."""
+    stacks = defaultdict(Counter)
+    for path in sorted(Path(directory).glob('*.collapsed')):
+        view, method = path.stem.rsplit('.', 1)
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[view, method][stack] += int(count)
+    return stacks
+
+
+def read_requests(directory):
+    """``{(view, method): [record, ...]}`` from ``requests.ndjson``."""
+    requests = defaultdict(list)
+    path = Path(directory) / REQUESTS_FILE
+    if path.exists():
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    requests[record['view'], record['method']].append(record)
+    return requests
+
+
+def hot_functions(stacks, limit=10):
+    """``[(frame, self time, total time)]``, most self time first."""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return [(frame, samples, total[frame]) for frame, samples in own.most_common(limit)]
+
+
+def hot_statements(records, limit=5):
+    """``[(sql, executions, total ms)]`` over ``records``, most time first."""
+    times, counts = Counter(), Counter()
+    for record in records:
+        for query in record['queries']:
+            times[query['sql']] += query['ms']
+            counts[query['sql']] += 1
+    return [(sql, counts[sql], ms) for sql, ms in times.most_common(limit)]
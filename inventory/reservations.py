@@ -0,0 +1,191 @@
+"""
+Stock reservations for checkout: reserve, then confirm or release.
+
+A reservation holds units in one stock level slot at its location, with a
+conditional UPDATE that raises ``StockLevel.reserved`` while the slot's
+unreserved quantity covers the request. OUT movements and transfers only
+take a slot's unreserved units, so concurrent checkouts and movements can't
+take held stock, and sharded products (see ``inventory/stock.py``) keep
+their movements off the product row. ``Product.reserved`` is the sum over
+its levels: updated in the same transaction for ordinary products and
+folded right after commit for sharded ones.
+
+No movement or audit row is written until the reservation is confirmed,
+which turns it into an ordinary OUT movement at its location. Reservations
+that are neither confirmed nor released by ``expires_at`` are released in
+batches by ``expire()`` (``manage.py expire_reservations``); until then
+they can no longer be confirmed.
+"""
+
+import datetime
+import random
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import changes
+from .cache import invalidate
+from .models import Product, StockLevel, StockReservation, default_location_id
+from .stock import InsufficientStock, fold_totals, record_movement
+
+
+class ReservationNotHeld(ValueError):
+    pass
+
+
+def get_ttl():
+    return getattr(settings, 'INVENTORY_RESERVATION_TTL', 15 * 60)
+
+
+def get_max_ttl():
+    return getattr(settings, 'INVENTORY_RESERVATION_MAX_TTL', 24 * 3600)
+
+
+def _fold_later(product_ids):
+    """Refold sharded products' ``reserved`` (and total) once the
+    transaction commits."""
+    product_ids = sorted(product_ids)
+
+    def fold():
+        with transaction.atomic():
+            fold_totals(product_ids)
+        invalidate(*[f'product:{pk}' for pk in product_ids])
+
+    transaction.on_commit(fold, robust=True)
+
+
+def _hold(product, location_id, quantity):
+    """Hold ``quantity`` in one of the product's slots at a location; returns
+    the slot or raises InsufficientStock."""
+    levels = StockLevel.objects.filter(product_id=product.pk, location_id=location_id)
+    fits = {'quantity__gte': F('reserved') + quantity}
+    slot = random.randrange(product.stock_slots)
+    if levels.filter(slot=slot, **fits).update(reserved=F('reserved') + quantity):
+        return slot
+    if product.stock_slots > 1:
+        # The slot with the most unreserved units.
+        roomiest = levels.order_by(F('reserved') - F('quantity')).values_list('slot', flat=True).first()
+        if roomiest is not None and levels.filter(slot=roomiest, **fits).update(reserved=F('reserved') + quantity):
+            return roomiest
+
+    # No slot has enough on its own: with all of them locked, move units
+    # from the others into the roomiest and hold them there.
+    rows = list(levels.select_for_update().order_by('slot').values_list('id', 'slot', F('quantity') - F('reserved')))
+    if sum(max(free, 0) for _, _, free in rows) < quantity:
+        raise InsufficientStock("Not enough stock!")
+    rows.sort(key=lambda row: -row[2])
+    (target, slot, free), others = rows[0], rows[1:]
+    needed = quantity - free
+    for pk, _, available in others:
+        part = min(available, needed)
+        StockLevel.objects.filter(pk=pk).update(quantity=F('quantity') - part)
+        needed -= part
+        if not needed:
+            break
+    StockLevel.objects.filter(pk=target).update(
+        quantity=F('quantity') + (quantity - free), reserved=F('reserved') + quantity
+    )
+    return slot
+
+
+def _unhold(rows):
+    """Give back held ``(product_id, location_id, slot, quantity)`` rows;
+    returns their change feed entries for the caller to append last."""
+    totals = defaultdict(int)
+    for product_id, _, _, quantity in rows:
+        totals[product_id] += quantity
+    sharded = set(Product.objects.filter(pk__in=totals, stock_slots__gt=1).values_list('id', flat=True))
+    # Product rows before levels, the order movements lock them in.
+    for product_id in sorted(totals.keys() - sharded):
+        Product.objects.filter(pk=product_id).update(reserved=F('reserved') - totals[product_id])
+    held = defaultdict(int)
+    for product_id, location_id, slot, quantity in rows:
+        held[product_id, location_id, slot] += quantity
+    for (product_id, location_id, slot), quantity in sorted(held.items()):
+        StockLevel.objects.filter(product_id=product_id, location_id=location_id, slot=slot).update(
+            reserved=F('reserved') - quantity
+        )
+    if sharded:
+        _fold_later(sharded)
+    invalidate(*[f'product:{pk}' for pk in totals])
+    return [changes.entry('stock', 'U', pk, 0) for pk in sorted(totals)]
+
+
+def reserve(product, quantity, user=None, location=None, ttl=None):
+    """Hold ``quantity`` of a product at a location for ``ttl`` seconds, or
+    raise InsufficientStock."""
+    location_id = location.pk if location is not None else default_location_id()
+    sharded = product.stock_slots > 1
+    with transaction.atomic():
+        if not sharded and not Product.objects.filter(pk=product.pk).update(reserved=F('reserved') + quantity):
+            raise Product.DoesNotExist(f"Product {product.pk} does not exist")
+        reservation = StockReservation.objects.create(
+            product=product,
+            location_id=location_id,
+            slot=_hold(product, location_id, quantity),
+            quantity=quantity,
+            user=user,
+            expires_at=timezone.now() + datetime.timedelta(seconds=ttl or get_ttl()),
+        )
+        if sharded:
+            _fold_later([product.pk])
+        changes.append('stock', 'U', product.pk, 0)
+        invalidate(f'product:{product.pk}')
+    return reservation
+
+
+def _close(pk, status):
+    """Move a held, unexpired reservation to ``status``; returns it and its
+    change feed entries."""
+    closed = StockReservation.objects.filter(pk=pk, status=StockReservation.HELD, expires_at__gt=timezone.now())
+    if not closed.update(status=status):
+        raise ReservationNotHeld("Reservation is not held (already confirmed, released or expired)")
+    reservation = StockReservation.objects.select_related('product', 'location').get(pk=pk)
+    feed = _unhold([(reservation.product_id, reservation.location_id, reservation.slot, reservation.quantity)])
+    return reservation, feed
+
+
+def confirm(pk, user=None):
+    """Turn a held reservation into an OUT movement (and its audit entry)."""
+    with transaction.atomic():
+        reservation, feed = _close(pk, StockReservation.CONFIRMED)
+        # The units just given back are locked by this transaction, so the
+        # OUT movement finds them.
+        reservation.movement = record_movement(
+            reservation.product, 'OUT', reservation.quantity, user=user, location=reservation.location
+        )
+        reservation.save(update_fields=['movement'])
+        changes.append_many(feed)
+    return reservation
+
+
+def release(pk):
+    """Give a held reservation's stock back."""
+    with transaction.atomic():
+        reservation, feed = _close(pk, StockReservation.RELEASED)
+        changes.append_many(feed)
+    return reservation
+
+
+def expire(batch_size=500, now=None):
+    """Release every held reservation past its ``expires_at``, one batch
+    per transaction; returns the number expired."""
+    now = now or timezone.now()
+    expired = 0
+    while True:
+        with transaction.atomic():
+            due = StockReservation.objects.filter(status=StockReservation.HELD, expires_at__lte=now).order_by('expires_at')
+            if connection.features.has_select_for_update_skip_locked:
+                # Confirms and other sweepers in flight keep their rows.
+                due = due.select_for_update(skip_locked=True)
+            rows = list(due.values_list('id', 'product_id', 'location_id', 'slot', 'quantity')[:batch_size])
+            if not rows:
+                return expired
+            StockReservation.objects.filter(
+                pk__in=[row[0] for row in rows], status=StockReservation.HELD
+            ).update(status=StockReservation.EXPIRED)
+            changes.append_many(_unhold([row[1:] for row in rows]))
+        expired += len(rows)
@@ -0,0 +1,188 @@
+"""
+Hourly and daily IN/OUT unit totals of stock movements, per product and per
+category, so trend queries read a few rollup rows instead of scanning
+``StockMovement``.
+
+``record_movements()`` adds each movement to its buckets in a short
+transaction right after the movement commits (see ``inventory/stock.py``),
+so movements of a category's products don't queue on its rollup rows while
+holding their stock locks. Movements count towards the category the product
+was in when they were recorded. ``backfill()`` rebuilds whole days from the
+movement table, using each product's current category.
+"""
+
+import datetime
+import functools
+import operator
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When
+from django.db.models.functions import TruncHour
+
+from .cache import invalidate
+from .models import CategoryMovementRollup, ProductMovementRollup, StockMovement
+
+GRANULARITIES = {
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+}
+
+# Scope index -> (model, key column); the index also orders row updates.
+SCOPES = (
+    (ProductMovementRollup, 'product_id'),
+    (CategoryMovementRollup, 'category_id'),
+)
+
+# Range /api/stock-movements/trends/ covers when ``since`` isn't given,
+# and the longest series it will return.
+DEFAULT_SPAN = {
+    'hour': datetime.timedelta(hours=48),
+    'day': datetime.timedelta(days=30),
+}
+MAX_BUCKETS = 3000
+
+# Rollup rows per UPDATE, which keeps each CASE well under the databases'
+# bound-parameter limits.
+CHUNK_SIZE = 200
+
+
+def bucket_start(ts, granularity):
+    """Start of the UTC hour or day containing ``ts``."""
+    ts = ts.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        ts = ts.replace(hour=0)
+    return ts
+
+
+def _apply(model, column, totals):
+    """Add ``totals``, ``{(key, granularity, bucket): [units_in, units_out]}``,
+    to one scope's rows with one UPDATE per chunk of rows."""
+    for start in range(0, len(totals), CHUNK_SIZE):
+        chunk = dict(sorted(totals.items())[start:start + CHUNK_SIZE])
+        buckets = defaultdict(set)
+        for key, granularity, bucket in chunk:
+            buckets[granularity].add(bucket)
+        rows = model.objects.filter(
+            functools.reduce(operator.or_, [Q(granularity=g, bucket__in=b) for g, b in buckets.items()]),
+            **{f'{column}__in': {key for key, _, _ in chunk}},
+        )
+        # Existing rows are locked in key order, so concurrent writers can't
+        # deadlock; missing ones are created before the update.
+        existing = set(rows.select_for_update().order_by(column, 'granularity', 'bucket').values_list(
+            column, 'granularity', 'bucket'
+        ))
+        missing = [row for row in chunk if row not in existing]
+        if missing:
+            model.objects.bulk_create([
+                model(**{column: key}, granularity=granularity, bucket=bucket)
+                for key, granularity, bucket in missing
+            ], ignore_conflicts=True)
+
+        rows.update(**{
+            field: F(field) + Case(*[
+                When(**{column: key}, granularity=granularity, bucket=bucket, then=Value(units[side]))
+                for (key, granularity, bucket), units in chunk.items()
+            ], default=Value(0))
+            for side, field in enumerate(('units_in', 'units_out'))
+        })
+
+
+def record_movements(movements):
+    """Add movements to their hourly and daily rollup rows.
+
+    ``movements`` are ``(product_id, category_id, movement_type, quantity,
+    timestamp)`` tuples. Totals are merged per row first, then applied with
+    a few statements per scope, however many movements there are.
+    """
+    totals = [defaultdict(lambda: [0, 0]) for _ in SCOPES]
+    for product_id, category_id, movement_type, quantity, timestamp in movements:
+        side = 0 if movement_type == 'IN' else 1
+        for granularity in GRANULARITIES:
+            bucket = bucket_start(timestamp, granularity)
+            totals[0][(product_id, granularity, bucket)][side] += quantity
+            totals[1][(category_id, granularity, bucket)][side] += quantity
+
+    for (model, column), scope_totals in zip(SCOPES, totals):
+        if scope_totals:
+            _apply(model, column, scope_totals)
+
+
+def trend(granularity, since, until, product=None, category=None):
+    """``[(bucket, units_in, units_out)]`` for every bucket from the one
+    containing ``since`` up to ``until`` (exclusive), with empty buckets as
+    zeros. Scoped to one product, one category, or else the whole store."""
+    if product is not None:
+        rows = ProductMovementRollup.objects.filter(product_id=product)
+    elif category is not None:
+        rows = CategoryMovementRollup.objects.filter(category_id=category)
+    else:
+        rows = CategoryMovementRollup.objects.all()
+
+    start = bucket_start(since, granularity)
+    rows = (
+        rows.filter(granularity=granularity, bucket__gte=start, bucket__lt=until)
+        .values('bucket')
+        .annotate(units_in=Sum('units_in'), units_out=Sum('units_out'))
+        .order_by('bucket')
+    )
+    found = {row['bucket']: (row['units_in'], row['units_out']) for row in rows}
+
+    series = []
+    bucket, step = start, GRANULARITIES[granularity]
+    while bucket < until:
+        series.append((bucket, *found.get(bucket, (0, 0))))
+        bucket += step
+    return series
+
+
+def bucket_count(granularity, since, until):
+    """Length of the series ``trend()`` returns for these arguments."""
+    start = bucket_start(since, granularity)
+    step = GRANULARITIES[granularity]
+    return max(0, -((start - until) // step))
+
+
+def _rebuild_day(day):
+    end = day + GRANULARITIES['day']
+    hourly = (
+        StockMovement.objects.filter(timestamp__gte=day, timestamp__lt=end)
+        .annotate(bucket=TruncHour('timestamp', tzinfo=datetime.timezone.utc))
+        .values('product_id', 'product__category_id', 'bucket')
+        .annotate(
+            units_in=Sum(Case(When(movement_type='IN', then='quantity'), default=0)),
+            units_out=Sum(Case(When(movement_type='OUT', then='quantity'), default=0)),
+        )
+        .order_by()
+    )
+
+    rows = {scope: defaultdict(lambda: [0, 0]) for scope in range(len(SCOPES))}
+    for row in hourly:
+        for scope, key in ((0, row['product_id']), (1, row['product__category_id'])):
+            for granularity, bucket in (('hour', row['bucket']), ('day', day)):
+                totals = rows[scope][(key, granularity, bucket)]
+                totals[0] += row['units_in']
+                totals[1] += row['units_out']
+
+    with transaction.atomic():
+        for scope, (model, column) in enumerate(SCOPES):
+            model.objects.filter(bucket__gte=day, bucket__lt=end).delete()
+            model.objects.bulk_create([
+                model(**{column: key}, granularity=granularity, bucket=bucket, units_in=units_in, units_out=units_out)
+                for (key, granularity, bucket), (units_in, units_out) in rows[scope].items()
+            ], batch_size=1000)
+        invalidate('rollups')
+    return sum(len(scope_rows) for scope_rows in rows.values())
+
+
+def backfill(since, until):
+    """Rebuild the rollups of every UTC day from the one containing
+    ``since`` up to ``until`` (exclusive), one day per transaction.
+
+    A day's rows are replaced from the movement table, so only rebuild days
+    that no longer receive movements. Yields ``(day, rows written)``.
+    """
+    day = bucket_start(since, 'day')
+    while day < until:
+        yield day, _rebuild_day(day)
+        day += GRANULARITIES['day']
@@ -0,0 +1,224 @@
+import bisect
+import re
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, FloatField, OuterRef, Subquery, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Concat
+
+from .cache import bump_version, invalidate, resource_version
+from .models import Category, Supplier, Product
+
+TOKEN_RE = re.compile(r'\w+')
+
+# Relative weight of a match in each indexed field.
+NAME_WEIGHT = 3.0
+CATALOG_WEIGHT = 1.0
+# An exact token match ranks above a prefix (type-ahead) match.
+EXACT_BONUS = 2.0
+# Cache resource whose version changes whenever indexed data does.
+RESOURCE = 'search'
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def build_search_text(name, category_name, supplier_name):
+    return f"{name} {category_name} {supplier_name}"
+
+
+def search_text_expression():
+    """SQL expression recomputing ``Product.search_text`` for bulk updates."""
+    return Concat(
+        'name', Value(' '),
+        Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1]),
+        Value(' '),
+        Subquery(Supplier.objects.filter(pk=OuterRef('supplier_id')).values('name')[:1]),
+        output_field=TextField(),
+    )
+
+
+def refresh_search_text(products):
+    """Recompute ``search_text`` in SQL after a category or supplier rename."""
+    products.update(search_text=search_text_expression())
+    python_index.invalidate()
+
+
+class InvertedIndex:
+    """Pure-Python token -> {product id: weight} index.
+
+    Used where the database has no FULLTEXT support (SQLite, tests). Each
+    process builds its own from the product table on first use, at the
+    current version of the ``search`` cache resource. Committed product
+    changes (see ``inventory/signals.py``) are applied to this process's
+    index and bump that version; an index that finds the version moved by
+    anyone else, e.g. another worker or a category rename, is rebuilt on
+    its next search.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)
+        self._tokens = []  # sorted, for prefix lookups
+        self._docs = {}    # product id -> tokens it was indexed under
+        self._built = False
+        self._version = None
+
+    def _index(self, product_id, name, category_name, supplier_name):
+        weights = defaultdict(float)
+        for token in tokenize(name):
+            weights[token] += NAME_WEIGHT
+        for token in tokenize(f"{category_name} {supplier_name}"):
+            weights[token] += CATALOG_WEIGHT
+        for token, weight in weights.items():
+            if token not in self._postings:
+                bisect.insort(self._tokens, token)
+            self._postings[token][product_id] = weight
+        self._docs[product_id] = list(weights)
+
+    def _remove(self, product_id):
+        for token in self._docs.pop(product_id, ()):
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                del self._tokens[bisect.bisect_left(self._tokens, token)]
+
+    def _build(self, version):
+        self._postings.clear()
+        self._tokens.clear()
+        self._docs.clear()
+        rows = Product.objects.values_list('id', 'name', 'category__name', 'supplier__name')
+        for row in rows.iterator(chunk_size=5000):
+            self._index(*row)
+        self._built, self._version = True, version
+
+    def _changed(self):
+        # Our own change moves the version by one; anything more means
+        # someone else changed the index's data too.
+        version = bump_version(RESOURCE)
+        if self._version is None or version != self._version + 1:
+            self._built = False
+        self._version = version
+
+    def invalidate(self):
+        """Rebuild on the next search, in every process once the current
+        transaction commits."""
+        with self._lock:
+            self._built = False
+        invalidate(RESOURCE)
+
+    def update(self, product):
+        """Reindex a product whose save has committed."""
+        with self._lock:
+            if self._built:
+                self._remove(product.pk)
+                self._index(product.pk, product.name, product.category.name, product.supplier.name)
+            self._changed()
+
+    def remove(self, product_id):
+        """Drop a product whose deletion has committed."""
+        with self._lock:
+            if self._built:
+                self._remove(product_id)
+            self._changed()
+
+    def _expand(self, term):
+        """Tokens ``term`` matches: itself exactly, or any token it prefixes."""
+        start = bisect.bisect_left(self._tokens, term)
+        for token in self._tokens[start:]:
+            if not token.startswith(term):
+                break
+            yield token, EXACT_BONUS if token == term else 1.0
+
+    def search(self, query):
+        """Rank products matching every term of ``query``: ``[(id, score)]``."""
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Read before building, so changes committed meanwhile trigger
+        # another build rather than being missed.
+        version = resource_version(RESOURCE)
+        with self._lock:
+            if not self._built or version != self._version:
+                self._build(version)
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token, bonus in self._expand(term):
+                    for product_id, weight in self._postings[token].items():
+                        term_scores[product_id] = max(term_scores[product_id], weight * bonus)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pk: scores[pk] + s for pk, s in term_scores.items() if pk in scores}
+                if not scores:
+                    return []
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+python_index = InvertedIndex()
+
+
+def get_backend():
+    backend = getattr(settings, 'INVENTORY_SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        return 'fulltext' if connection.vendor == 'mysql' else 'python'
+    return backend
+
+
+def _id_list(ids):
+    return ','.join(str(int(pk)) for pk in ids)
+
+
+def _boolean_query(query):
+    # Every term is required and prefix-matched: "ham cla" -> "+ham* +cla*"
+    return ' '.join(f'+{term}*' for term in tokenize(query))
+
+
+def _no_matches(queryset):
+    # Still annotated, so callers can order by the rank of an empty result.
+    return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+def search_products(queryset, query):
+    """Filter ``queryset`` to products matching ``query``, annotated with a
+    ``search_rank`` (higher is better).
+
+    Searches product name, category name and supplier name, with prefix
+    matching on every term. Uses the MySQL FULLTEXT index on
+    ``search_text`` when available and the in-process index otherwise.
+    """
+    if not tokenize(query):
+        return _no_matches(queryset)
+
+    if get_backend() == 'fulltext':
+        rank = RawSQL(
+            f"MATCH({Product._meta.db_table}.search_text) AGAINST (%s IN BOOLEAN MODE)",
+            [_boolean_query(query)],
+            output_field=FloatField(),
+        )
+        return queryset.annotate(search_rank=rank).filter(search_rank__gt=0)
+
+    ranked = python_index.search(query)
+    if not ranked:
+        return _no_matches(queryset)
+    # Scores take few distinct values, so one WHEN per score keeps the CASE
+    # small. The ids are written into the SQL rather than bound: a broad
+    # query can match more products than a statement takes parameters.
+    by_score = defaultdict(list)
+    for pk, score in ranked:
+        by_score[score].append(pk)
+    column = f'{Product._meta.db_table}.{Product._meta.pk.column}'
+    matches = RawSQL(f"{column} IN ({_id_list(pk for pk, _ in ranked)})", [], output_field=BooleanField())
+    rank = RawSQL(
+        'CASE ' + ' '.join(f'WHEN {column} IN ({_id_list(pks)}) THEN {score!r}' for score, pks in by_score.items())
+        + ' ELSE 0.0 END',
+        [],
+        output_field=FloatField(),
+    )
+    return queryset.filter(matches).annotate(search_rank=rank)
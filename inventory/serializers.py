@@ -1,11 +1,40 @@
+from django.contrib.auth.models import User
 from rest_framework import serializers
 from .models import Category, Supplier, Product, StockMovement
-from .models import StockAuditLog
+from .models import StockAuditLog, LowStockAlert, Location, StockTransfer, StockReservation
+from .stock import record_movement, transfer_stock
+from .reservations import get_max_ttl, reserve
 
-class StockAuditLogSerializer(serializers.ModelSerializer):
+
+class ExpandableFieldsMixin:
+    """Swaps foreign-key ids for nested objects on request.
+
+    Fields named in ``context['expand']`` that appear in
+    ``expandable_fields`` are rendered with the mapped serializer. Views
+    must ``select_related()`` the same names to keep the query count flat.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in self.context.get('expand', ()):
+            if name in self.expandable_fields:
+                self.fields[name] = self.expandable_fields[name](read_only=True)
+
+class SparseFieldsMixin:
+    """Drops every field not named in ``context['fields']`` (when given)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+class UserSummarySerializer(serializers.ModelSerializer):
     class Meta:
-        model = StockAuditLog
-        fields = '__all__'
+        model = User
+        fields = ['id', 'username']
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,33 +46,127 @@ class SupplierSerializer(serializers.ModelSerializer):
         model = Supplier
         fields = '__all__'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'category': CategorySerializer, 'supplier': SupplierSerializer}
+
     class Meta:
         model = Product
+        exclude = ['search_text']
+        # Unset is null; a blank SKU would collide with the next blank one.
+        extra_kwargs = {'sku': {'allow_blank': False}}
+
+class StockAuditLogSerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'product': ProductSerializer, 'user': UserSummarySerializer}
+
+    class Meta:
+        model = StockAuditLog
         fields = '__all__'
 
-class StockMovementSerializer(serializers.ModelSerializer):
+class StockMovementSerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'product': ProductSerializer}
+
     class Meta:
         model = StockMovement
         fields = '__all__'
     def create(self, validated_data):
-        movement = StockMovement.objects.create(**validated_data)
-
-        # Auto-update product quantity
-        product = movement.product
-        if movement.movement_type == 'IN':
-            product.quantity += movement.quantity
-        elif movement.movement_type == 'OUT':
-            product.quantity -= movement.quantity
-        product.save()
-
-        #  Create audit log
-        from .models import StockAuditLog
-        StockAuditLog.objects.create(
-            product=product,
-            quantity=movement.quantity,
-            movement_type=movement.movement_type,
-            user=self.context['request'].user  # Very important
+        request = self.context.get('request')
+        user = request.user if request and request.user.is_authenticated else None
+        return record_movement(
+            validated_data['product'],
+            validated_data['movement_type'],
+            validated_data['quantity'],
+            user=user,
+            location=validated_data.get('location'),
+        )
+
+
+class BulkStockMovementItemSerializer(serializers.Serializer):
+    # Validates shape only; product existence is checked in one query per batch.
+    product = serializers.IntegerField(min_value=1)
+    movement_type = serializers.ChoiceField(choices=StockMovement.MOVEMENT_CHOICES)
+    quantity = serializers.IntegerField(min_value=0)
+    # Defaults to INVENTORY_DEFAULT_LOCATION; checked with the products.
+    location = serializers.IntegerField(min_value=1, required=False)
+
+
+class ProductImportRowSerializer(serializers.Serializer):
+    # Category and supplier are names, resolved by the importer with one
+    # lookup map per import.
+    sku = serializers.CharField(max_length=64)
+    name = serializers.CharField(max_length=100)
+    category = serializers.CharField(max_length=100)
+    supplier = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    quantity = serializers.IntegerField(min_value=0, required=False)
+    reorder_point = serializers.IntegerField(min_value=0, required=False)
+
+
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = '__all__'
+
+
+class StockTransferSerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'product': ProductSerializer}
+
+    class Meta:
+        model = StockTransfer
+        fields = '__all__'
+        read_only_fields = ['user']
+
+    def validate(self, data):
+        if data['source'] == data['destination']:
+            raise serializers.ValidationError("Source and destination must differ")
+        if data['quantity'] < 1:
+            raise serializers.ValidationError({'quantity': "Must be at least 1"})
+        return data
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        user = request.user if request and request.user.is_authenticated else None
+        return transfer_stock(
+            validated_data['product'],
+            validated_data['source'],
+            validated_data['destination'],
+            validated_data['quantity'],
+            user=user,
+        )
+
+
+class StockReservationSerializer(SparseFieldsMixin, ExpandableFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = {'product': ProductSerializer}
+    # Seconds to hold the stock for; defaults to INVENTORY_RESERVATION_TTL.
+    ttl = serializers.IntegerField(min_value=1, required=False, write_only=True)
+
+    class Meta:
+        model = StockReservation
+        fields = '__all__'
+        read_only_fields = ['status', 'user', 'movement', 'expires_at']
+
+    def validate_ttl(self, value):
+        if value > get_max_ttl():
+            raise serializers.ValidationError(f"Must be at most {get_max_ttl()} seconds")
+        return value
+
+    def validate_quantity(self, value):
+        if value < 1:
+            raise serializers.ValidationError("Must be at least 1")
+        return value
+
+    def create(self, validated_data):
+        request = self.context.get('request')
+        user = request.user if request and request.user.is_authenticated else None
+        return reserve(
+            validated_data['product'],
+            validated_data['quantity'],
+            user=user,
+            location=validated_data.get('location'),
+            ttl=validated_data.get('ttl'),
         )
 
-        return movement
\ No newline at end of file
+
+class LowStockAlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = LowStockAlert
+        fields = '__all__'
@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import changes
+from .authentication import user_changed
+from .cache import invalidate
+from .metrics import install_query_hook
+from .search import python_index
+from .summary import record_product_delete
+from .models import Category, Supplier, Product, StockMovement, Location, StockTransfer, forget_default_location
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate('categories', 'stats')
+
+
+@receiver([post_save, post_delete], sender=Supplier)
+def supplier_changed(sender, instance, **kwargs):
+    invalidate('suppliers', 'stats')
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    invalidate(f'product:{instance.pk}', 'stats')
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, **kwargs):
+    transaction.on_commit(lambda: python_index.update(instance))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    # Runs inside the deletion transaction, also for cascades from Category/Supplier.
+    record_product_delete(instance)
+    pk = instance.pk
+    transaction.on_commit(lambda: python_index.remove(pk))
+
+
+@receiver([post_save, post_delete], sender=StockMovement)
+def stock_movement_changed(sender, instance, **kwargs):
+    # Stock is adjusted with queryset.update(), which sends no Product signal.
+    invalidate(f'product:{instance.product_id}', 'stats')
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Supplier)
+@receiver(post_save, sender=Location)
+def catalog_saved(sender, instance, created, **kwargs):
+    changes.append(sender._meta.model_name, 'C' if created else 'U', instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Location)
+def location_changed(sender, instance, **kwargs):
+    # The default location may have been renamed, deleted or recreated.
+    forget_default_location()
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Supplier)
+@receiver(post_delete, sender=Location)
+def catalog_deleted(sender, instance, **kwargs):
+    changes.append(sender._meta.model_name, 'D', instance.pk)
+
+
+@receiver(post_save, sender=StockMovement)
+def stock_moved(sender, instance, created, **kwargs):
+    if created:
+        delta = instance.quantity if instance.movement_type == 'IN' else -instance.quantity
+        changes.append('stock', 'U', instance.product_id, delta)
+
+
+@receiver(post_save, sender=StockTransfer)
+def stock_transferred(sender, instance, created, **kwargs):
+    if created:
+        changes.append('stock', 'U', instance.product_id, 0)
+
+
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def auth_user_changed(sender, instance, **kwargs):
+    # Deactivations and password changes must not be served from the cache.
+    user_changed(instance)
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install_query_hook(connection)
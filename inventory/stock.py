@@ -0,0 +1,398 @@
+"""
+The stock write path.
+
+A product's stock at each location is kept in ``StockLevel`` rows, split
+into ``Product.stock_slots`` slots. An IN movement adds to a random slot;
+an OUT movement takes from a random slot if it holds enough, then from the
+fullest one, and only then locks all of the location's slots and takes
+from several. Units a slot holds for reservations (``StockLevel.reserved``)
+are never taken, so location quantities never go below what is reserved
+there, or below zero.
+
+``Product.quantity`` is the product's total over all locations. For an
+ordinary product (one slot) a movement updates it in its own transaction.
+For a sharded product (more than one slot), every movement would otherwise
+queue on that row, so the movement transaction only touches its slot (plus
+inserts) and the total is folded from the slots afterwards.
+
+The stock summaries and movement rollups are shared by every product in a
+category, so no movement transaction touches them: they are updated in a
+short transaction right after it commits, together with the folded totals
+and, for sharded products, the low-stock alerts. If the process dies in
+between, ``rebuild_inventory_stats``
+refolds the totals and repairs the summaries, and
+``backfill_movement_rollups`` the rollups.
+"""
+
+import random
+
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
+
+from . import audit, changes, ledger
+from .cache import invalidate
+from .models import Location, LowStockAlert, Product, StockLevel, StockMovement, StockTransfer, default_location_id
+from .rollups import record_movements as record_rollups
+from .summary import apply_quantity_deltas
+
+
+# Sent after commit with ``alerts`` (saved LowStockAlert rows) whenever stock
+# movements take products below their reorder level.
+low_stock = Signal()
+
+
+class InsufficientStock(ValueError):
+    pass
+
+
+def _record_crossings(deltas):
+    """Write a LowStockAlert for each product a negative delta took below
+    its reorder level, i.e. ``quantity < level <= quantity - delta``.
+
+    ``deltas`` maps product id to the net change just applied.
+    """
+    drops = {pk: -delta for pk, delta in deltas.items() if delta < 0}
+    if not drops:
+        return
+    rows = Product.objects.filter(
+        pk__in=drops, quantity__lt=F('reorder_level')
+    ).values_list('id', 'quantity', 'reorder_level')
+    alerts = [
+        LowStockAlert(product_id=pk, quantity=quantity, reorder_level=level)
+        for pk, quantity, level in rows
+        if quantity + drops[pk] >= level
+    ]
+    if alerts:
+        LowStockAlert.objects.bulk_create(alerts)
+        transaction.on_commit(lambda: low_stock.send(sender=LowStockAlert, alerts=alerts))
+
+
+def fold_totals(product_ids):
+    """Set ``Product.quantity`` and ``Product.reserved`` to the sums of the
+    products' stock levels."""
+    levels = StockLevel.objects.filter(product=OuterRef('pk')).order_by().values('product')
+    Product.objects.filter(pk__in=list(product_ids)).update(
+        quantity=Coalesce(Subquery(levels.annotate(total=Sum('quantity')).values('total')), 0),
+        reserved=Coalesce(Subquery(levels.annotate(total=Sum('reserved')).values('total')), 0),
+    )
+
+
+class Settlement:
+    """What movements change besides stock levels and the ledger: stock
+    summaries, low-stock alerts, rollups and, for sharded products, the
+    folded total.
+
+    Summaries and rollups are applied just after the movement transaction
+    commits, in a short one of their own, so writers don't hold their
+    stock locks while queueing on the shared summary and rollup rows.
+    Alerts are recorded in the movement transaction, or after the total is
+    folded when ``deferred``."""
+
+    def __init__(self, deferred=False):
+        self.deferred = deferred
+        self.deltas = {}
+        self.rollups = []
+
+    def add(self, product_id, delta):
+        self.deltas[product_id] = self.deltas.get(product_id, 0) + delta
+
+    def finish(self):
+        if not self.deltas and not self.rollups:
+            return
+        if not self.deferred:
+            _record_crossings(self.deltas)
+        transaction.on_commit(self._settle_committed, robust=True)
+
+    def _settle_committed(self):
+        with transaction.atomic():
+            if self.deferred:
+                fold_totals(self.deltas)
+                _record_crossings(self.deltas)
+            apply_quantity_deltas(self.deltas)
+            record_rollups(self.rollups)
+            invalidate('stats', *[f'product:{pk}' for pk in self.deltas])
+
+
+def _put(product_id, location_id, quantity, slots):
+    """Add ``quantity`` (which may be negative) to a random slot."""
+    slot = random.randrange(slots)
+    levels = StockLevel.objects.filter(product_id=product_id, location_id=location_id, slot=slot)
+    if not levels.update(quantity=F('quantity') + quantity):
+        StockLevel.objects.bulk_create(
+            [StockLevel(product_id=product_id, location_id=location_id, slot=slot)], ignore_conflicts=True
+        )
+        levels.update(quantity=F('quantity') + quantity)
+
+
+def _take(product_id, location_id, quantity, slots):
+    """Remove ``quantity`` unreserved units from a location's slots, or
+    raise InsufficientStock."""
+    levels = StockLevel.objects.filter(product_id=product_id, location_id=location_id)
+    take = F('quantity') - quantity
+    enough = F('reserved') + quantity
+    if levels.filter(slot=random.randrange(slots), quantity__gte=enough).update(quantity=take):
+        return
+    if slots > 1:
+        fullest = levels.order_by(F('reserved') - F('quantity')).values_list('slot', flat=True).first()
+        if fullest is not None and levels.filter(slot=fullest, quantity__gte=enough).update(quantity=take):
+            return
+
+    # No single slot holds enough: take from several, with all of them locked.
+    rows = list(levels.select_for_update().order_by('slot').values_list('id', F('quantity') - F('reserved')))
+    if sum(max(available, 0) for _, available in rows) < quantity:
+        raise InsufficientStock("Not enough stock!")
+    remaining = quantity
+    for pk, available in sorted(rows, key=lambda row: -row[1]):
+        part = min(available, remaining)
+        StockLevel.objects.filter(pk=pk).update(quantity=F('quantity') - part)
+        remaining -= part
+        if not remaining:
+            break
+
+
+def adjust_stock(product, location_id, movement_type, quantity):
+    """Apply an IN/OUT movement to a product's stock at a location.
+
+    Must run in a transaction. Updates the stock level and, for an
+    ordinary product, ``Product.quantity``, appends the ledger entry and
+    returns the movement's ``Settlement``; the caller adds its rollup row
+    and calls ``finish()``.
+    """
+    if movement_type not in ('IN', 'OUT'):
+        raise ValueError(f"Unknown movement type: {movement_type}")
+    delta = quantity if movement_type == 'IN' else -quantity
+    sharded = product.stock_slots > 1
+    if not sharded:
+        # Locks the product row first, as product edits do; whether there
+        # is enough unreserved stock is up to the location's levels.
+        if not Product.objects.filter(pk=product.pk).update(quantity=F('quantity') + delta):
+            raise Product.DoesNotExist(f"Product {product.pk} does not exist")
+    if movement_type == 'IN':
+        _put(product.pk, location_id, quantity, product.stock_slots)
+    else:
+        _take(product.pk, location_id, quantity, product.stock_slots)
+
+    ledger.append(product.pk, movement_type, delta)
+    settlement = Settlement(deferred=sharded)
+    settlement.add(product.pk, delta)
+    return settlement
+
+
+def _add_in_place(nets, existing, batch_size):
+    """Add ``{(product_id, location_id): quantity}`` (which may be negative)
+    to ordinary products' levels and totals, all rows already locked, with
+    one UPDATE per batch for each. ``existing`` holds the keys that have a
+    level row."""
+    StockLevel.objects.bulk_create(
+        [StockLevel(product_id=pk, location_id=loc) for pk, loc in sorted(nets) if (pk, loc) not in existing],
+        batch_size=batch_size, ignore_conflicts=True,
+    )
+    totals = {}
+    for (product_id, _), net in nets.items():
+        totals[product_id] = totals.get(product_id, 0) + net
+    keys, products = sorted(nets), sorted(totals)
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+        StockLevel.objects.filter(
+            product_id__in={pk for pk, _ in chunk}, location_id__in={loc for _, loc in chunk}, slot=0
+        ).update(quantity=F('quantity') + Case(
+            *[When(product_id=pk, location_id=loc, then=Value(nets[pk, loc])) for pk, loc in chunk],
+            default=Value(0),
+        ))
+    for start in range(0, len(products), batch_size):
+        chunk = products[start:start + batch_size]
+        Product.objects.filter(pk__in=chunk).update(
+            quantity=F('quantity') + Case(*[When(pk=pk, then=Value(totals[pk])) for pk in chunk])
+        )
+
+
+def record_level_change(previous, product, update_fields=None):
+    """Apply a product insert or update that set its quantity directly to
+    its stock at the default location.
+
+    ``previous`` holds the row's values before the save (None on insert).
+    """
+    if update_fields is not None and 'quantity' not in update_fields:
+        return
+    delta = product.quantity - (previous['quantity'] if previous is not None else 0)
+    if delta:
+        _put(product.pk, default_location_id(), delta, 1)
+
+
+def apply_level_deltas(deltas):
+    """``record_level_change`` for many products, ``{product_id: delta}``,
+    in two queries."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    location_id = default_location_id()
+    StockLevel.objects.bulk_create(
+        [StockLevel(product_id=pk, location_id=location_id) for pk in sorted(deltas)], ignore_conflicts=True
+    )
+    StockLevel.objects.filter(product_id__in=deltas, location_id=location_id, slot=0).update(
+        quantity=F('quantity') + Case(*[When(product_id=pk, then=Value(delta)) for pk, delta in deltas.items()])
+    )
+
+
+def record_movement(product, movement_type, quantity, user=None, location=None):
+    """Adjust stock and write the movement atomically; its audit row is
+    written per ``INVENTORY_AUDIT_MODE`` (see ``inventory/audit.py``)."""
+    with transaction.atomic():
+        movement = StockMovement(
+            product=product,
+            movement_type=movement_type,
+            quantity=quantity,
+            location_id=location.pk if location is not None else default_location_id(),
+        )
+        movement.save()  # save() applies the stock adjustment
+        audit.record([audit.entry(product.pk, movement_type, quantity, user, movement.timestamp)])
+    return movement
+
+
+def transfer_stock(product, source, destination, quantity, user=None):
+    """Move stock between two locations in one transaction."""
+    if source.pk == destination.pk:
+        raise ValueError("Source and destination must differ")
+    with transaction.atomic():
+        _take(product.pk, source.pk, quantity, product.stock_slots)
+        _put(product.pk, destination.pk, quantity, product.stock_slots)
+        return StockTransfer.objects.create(
+            product=product, source=source, destination=destination, quantity=quantity, user=user
+        )
+
+
+def stock_by_location(product_id):
+    """``[(location, quantity)]`` for every location holding the product."""
+    totals = dict(
+        StockLevel.objects.filter(product_id=product_id).order_by().values('location').annotate(
+            total=Sum('quantity')
+        ).values_list('location', 'total')
+    )
+    locations = Location.objects.filter(pk__in=totals).order_by('code')
+    return [(location, totals[location.pk]) for location in locations]
+
+
+def _accept_in_order(start, items):
+    """Walk one product's movements in order and keep those stock allows.
+
+    Returns ``(accepted, rejected, net)``.
+    """
+    accepted, rejected = [], []
+    running = start
+    for item in items:
+        delta = item['quantity'] if item['movement_type'] == 'IN' else -item['quantity']
+        if running + delta < 0:
+            rejected.append(item)
+            continue
+        accepted.append(item)
+        running += delta
+    return accepted, rejected, running - start
+
+
+def record_movements_bulk(items, user=None, batch_size=500):
+    """Apply many already-validated movements with one stock update per
+    product and location.
+
+    ``items`` are dicts with ``index``, ``product_id``, ``location_id``
+    (None for the default location), ``movement_type`` and ``quantity``.
+    Movements for a product at a location are applied in request order;
+    OUT movements that would take its stock there below zero are rejected
+    individually and the rest are committed. Returns ``(created_count,
+    errors)`` where ``errors`` maps item index to a message.
+    """
+    default = default_location_id()
+    groups = {}
+    for item in items:
+        groups.setdefault((item['product_id'], item['location_id'] or default), []).append(item)
+
+    errors = {}
+    movements, audits, entries, feed = [], [], [], []
+    in_place = {}
+    now, later = Settlement(), Settlement(deferred=True)
+    with transaction.atomic():
+        products = {
+            pk: (slots, category_id)
+            for pk, slots, category_id in Product.objects.filter(
+                pk__in={product_id for product_id, _ in groups}
+            ).values_list('id', 'stock_slots', 'category_id')
+        }
+        locations = set(Location.objects.filter(
+            pk__in={location_id for _, location_id in groups}
+        ).values_list('id', flat=True))
+        # Lock in the order single movements do: ordinary products, then levels.
+        # OUT movements can take the levels' unreserved stock.
+        list(Product.objects.select_for_update().filter(
+            pk__in=[pk for pk, (slots, _) in products.items() if slots == 1]
+        ).order_by('pk').values_list('id', flat=True))
+        current, spread = {}, set()
+        for product_id, location_id, slot, quantity in StockLevel.objects.select_for_update().filter(
+            product_id__in=products, location_id__in=locations
+        ).order_by('product_id', 'location_id', 'slot').values_list(
+            'product_id', 'location_id', 'slot', F('quantity') - F('reserved')
+        ):
+            current[(product_id, location_id)] = current.get((product_id, location_id), 0) + quantity
+            if slot:
+                spread.add((product_id, location_id))
+
+        for (product_id, location_id), group in groups.items():
+            if product_id not in products or location_id not in locations:
+                message = (f"Product {product_id} does not exist" if product_id not in products
+                           else f"Location {location_id} does not exist")
+                for item in group:
+                    errors[item['index']] = message
+                continue
+
+            start = current.get((product_id, location_id), 0)
+            accepted, rejected, net = _accept_in_order(start, group)
+            for item in rejected:
+                errors[item['index']] = "Not enough stock!"
+            if not accepted:
+                continue
+
+            slots, category_id = products[product_id]
+            if slots == 1 and (product_id, location_id) not in spread:
+                # Its one level row is locked and holds enough: applied
+                # below, with the others'.
+                in_place[product_id, location_id] = net
+            else:
+                if net > 0:
+                    _put(product_id, location_id, net, slots)
+                elif net < 0:
+                    _take(product_id, location_id, -net, slots)
+                if slots == 1:
+                    Product.objects.filter(pk=product_id).update(quantity=F('quantity') + net)
+            (later if slots > 1 else now).add(product_id, net)
+
+            for item in accepted:
+                movements.append(StockMovement(
+                    product_id=product_id,
+                    location_id=location_id,
+                    movement_type=item['movement_type'],
+                    quantity=item['quantity'],
+                ))
+                audits.append(audit.entry(product_id, item['movement_type'], item['quantity'], user))
+                delta = item['quantity'] if item['movement_type'] == 'IN' else -item['quantity']
+                entries.append(ledger.entry(product_id, item['movement_type'], delta))
+                feed.append(changes.entry('stock', 'U', product_id, delta))
+
+        _add_in_place(in_place, current, batch_size)
+        # bulk_create() skips StockMovement.save(), so stock isn't adjusted twice.
+        StockMovement.objects.bulk_create(movements, batch_size=batch_size)
+        audit.record(audits)
+        ledger.append_many(entries, batch_size=batch_size)
+        for m in movements:
+            slots, category_id = products[m.product_id]
+            (later if slots > 1 else now).rollups.append(
+                (m.product_id, category_id, m.movement_type, m.quantity, m.timestamp)
+            )
+        now.finish()
+        later.finish()
+        changes.append_many(feed, batch_size=batch_size)
+
+        # bulk_create() sends no post_save signals either.
+        if movements:
+            invalidate(*{f'product:{m.product_id}' for m in movements}, 'stats')
+
+    return len(movements), errors
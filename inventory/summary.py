@@ -0,0 +1,192 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from .models import Product, CategoryStockSummary, SupplierStockSummary
+
+DIMENSIONS = (
+    (CategoryStockSummary, 'category_id'),
+    (SupplierStockSummary, 'supplier_id'),
+)
+
+
+def _apply(model, key, products, quantity, create):
+    rows = model.objects.filter(pk=key)
+    changes = {
+        'total_products': F('total_products') + products,
+        'total_quantity': F('total_quantity') + quantity,
+    }
+    if not rows.update(**changes) and create:
+        model.objects.bulk_create([model(pk=key)], ignore_conflicts=True)
+        rows.update(**changes)
+
+
+def apply_delta(category_id, supplier_id, products=0, quantity=0, create=True):
+    """Add ``products``/``quantity`` to one category's and one supplier's row.
+
+    Missing rows are created unless ``create`` is False, which deletes use
+    because the row may already be gone with its category/supplier.
+    """
+    if not products and not quantity:
+        return
+    _apply(CategoryStockSummary, category_id, products, quantity, create)
+    _apply(SupplierStockSummary, supplier_id, products, quantity, create)
+
+
+def apply_deltas(changes):
+    """``apply_delta()`` for many products at once.
+
+    ``changes`` are ``(category_id, supplier_id, products, quantity)``
+    tuples; they are merged per summary row and applied in key order.
+    """
+    totals = [defaultdict(lambda: [0, 0]) for _ in DIMENSIONS]
+    for category_id, supplier_id, products, quantity in changes:
+        for dimension, key in zip(totals, (category_id, supplier_id)):
+            dimension[key][0] += products
+            dimension[key][1] += quantity
+    for (model, _), dimension in zip(DIMENSIONS, totals):
+        for key in sorted(dimension):
+            products, quantity = dimension[key]
+            if products or quantity:
+                _apply(model, key, products, quantity, create=True)
+
+
+def apply_quantity_delta(product_id, delta):
+    """Move a product's stock change into its summaries without loading it.
+
+    Runs on the stock-adjustment path, which only knows the product id, so
+    the category/supplier are resolved by the UPDATE's own subquery.
+    """
+    if not delta:
+        return
+    for model, column in DIMENSIONS:
+        model.objects.filter(
+            pk=Subquery(Product.objects.filter(pk=product_id).values(column)[:1])
+        ).update(total_quantity=F('total_quantity') + delta)
+
+
+def apply_quantity_deltas(deltas):
+    """``apply_quantity_delta()`` for many products, ``{product_id: delta}``:
+    one query for their categories and suppliers, then one UPDATE per
+    dimension."""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if len(deltas) <= 1:
+        for product_id, delta in deltas.items():
+            apply_quantity_delta(product_id, delta)
+        return
+    totals = [defaultdict(int) for _ in DIMENSIONS]
+    for pk, *keys in Product.objects.filter(pk__in=deltas).values_list('id', *[c for _, c in DIMENSIONS]):
+        for dimension, key in zip(totals, keys):
+            dimension[key] += deltas[pk]
+    for (model, _), dimension in zip(DIMENSIONS, totals):
+        dimension = {key: quantity for key, quantity in dimension.items() if quantity}
+        if dimension:
+            model.objects.filter(pk__in=dimension).update(total_quantity=F('total_quantity') + Case(
+                *[When(pk=key, then=Value(quantity)) for key, quantity in sorted(dimension.items())]
+            ))
+
+
+def record_product_change(previous, product, update_fields=None):
+    """Apply the summary delta for a product insert or update.
+
+    ``previous`` holds the row's values before the save (None on insert).
+    """
+    if previous is None:
+        apply_delta(product.category_id, product.supplier_id, 1, product.quantity)
+        return
+
+    def saved(column):
+        # Columns left out of update_fields keep their previous value.
+        if update_fields is not None and column not in update_fields and column.removesuffix('_id') not in update_fields:
+            return previous[column]
+        return getattr(product, column)
+
+    category_id, supplier_id, quantity = saved('category_id'), saved('supplier_id'), saved('quantity')
+    if (category_id, supplier_id) == (previous['category_id'], previous['supplier_id']):
+        apply_delta(category_id, supplier_id, 0, quantity - previous['quantity'])
+    else:
+        apply_delta(previous['category_id'], previous['supplier_id'], -1, -previous['quantity'], create=False)
+        apply_delta(category_id, supplier_id, 1, quantity)
+
+
+def record_product_delete(product):
+    apply_delta(product.category_id, product.supplier_id, -1, -product.quantity, create=False)
+
+
+def _summary_rows(by):
+    if by == 'supplier':
+        rows = SupplierStockSummary.objects.values_list('supplier__name', 'total_products', 'total_quantity')
+    else:
+        rows = CategoryStockSummary.objects.values_list('category__name', 'total_products', 'total_quantity')
+    return rows.filter(total_products__gt=0)
+
+
+def _merge_totals(rows):
+    result = {}
+    for name, total_products, total_quantity in rows:
+        entry = result.setdefault(name, {"total_products": 0, "total_quantity": 0})
+        entry["total_products"] += total_products
+        entry["total_quantity"] += total_quantity
+    return result
+
+
+def summary_totals(by='category'):
+    """``{name: {total_products, total_quantity}}`` read from the summary table.
+
+    Costs O(categories) or O(suppliers), independent of the product count.
+    Rows sharing a name are merged, as the old GROUP BY on the name did.
+    """
+    return _merge_totals(_summary_rows(by))
+
+
+async def asummary_totals(by='category'):
+    """``summary_totals()`` using the async ORM."""
+    return _merge_totals([row async for row in _summary_rows(by)])
+
+
+def compute_actual():
+    """Recompute every summary from the product table: {model: {pk: (products, quantity)}}."""
+    actual = {}
+    for model, column in DIMENSIONS:
+        rows = Product.objects.values(column).annotate(
+            products=Count('id'), quantity=Coalesce(Sum('quantity'), 0)
+        ).values_list(column, 'products', 'quantity')
+        actual[model] = {key: (products, quantity) for key, products, quantity in rows}
+    return actual
+
+
+def rebuild(dry_run=False):
+    """Compare the summary tables to the product table and fix any drift.
+
+    Returns a list of ``(model, pk, stored, actual)`` tuples for rows that
+    differed, where ``stored``/``actual`` are ``(products, quantity)``.
+
+    The summary rows are locked before the products are counted, so
+    product edits and movement settlements (see ``inventory/stock.py``)
+    still in flight wait for the rebuild and then apply their deltas on top
+    of it. Differences are applied as deltas too, which keeps rows created
+    in the meantime intact. A movement that commits while the products are
+    counted but settles after the rebuild is counted twice; a second
+    rebuild with writes quiet repairs that.
+    """
+    drift = []
+    with transaction.atomic():
+        stored = {}
+        for model, _ in DIMENSIONS:
+            rows = model.objects.order_by('pk')
+            if not dry_run:
+                rows = rows.select_for_update()
+            stored[model] = {
+                pk: (products, quantity)
+                for pk, products, quantity in rows.values_list('pk', 'total_products', 'total_quantity')
+            }
+        for model, expected in compute_actual().items():
+            for pk in sorted(set(stored[model]) | set(expected)):
+                have, want = stored[model].get(pk, (0, 0)), expected.get(pk, (0, 0))
+                if have != want:
+                    drift.append((model, pk, have, want))
+                    if not dry_run:
+                        _apply(model, pk, want[0] - have[0], want[1] - have[1], create=True)
+    return drift
@@ -0,0 +1,28 @@
+from contextlib import contextmanager
+
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def assert_max_queries(limit, using='default'):
+    """Fail if the block runs more than ``limit`` SQL queries.
+
+    Unlike ``assertNumQueries`` this only sets a ceiling, so a test can pin
+    an endpoint's query budget without breaking when a query is saved.
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    executed = len(context.captured_queries)
+    if executed > limit:
+        queries = '\n'.join(
+            f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1)
+        )
+        raise AssertionError(f"{executed} queries executed, at most {limit} expected:\n{queries}")
+
+
+class QueryBudgetMixin:
+    """TestCase mixin exposing ``assert_max_queries`` as an assertion method."""
+
+    def assertMaxQueries(self, limit, using='default'):
+        return assert_max_queries(limit, using)
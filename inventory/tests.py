@@ -1,3 +1,1242 @@
-from django.test import TestCase
+import base64
+import datetime
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.base import BaseHandler
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import (
+    async_views, authentication, changes, fastpath, forecast, idempotency, ledger, metrics, reservations, rollups,
+    search, summary,
+)
+from .cache import bump_version, cache_stats, get_cache
+from .db.pool import ConnectionPool, PoolTimeout, pools
+from .db.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+from .middleware import ProfilingMiddleware
+from .models import (
+    Category, CategoryMovementRollup, CategoryStockSummary, Change, Location, LowStockAlert, Supplier, Product,
+    ProductMovementRollup, StockLevel, StockMovement, forget_default_location,
+)
+from .stock import InsufficientStock, record_movement, stock_by_location, transfer_stock
+from .testing import QueryBudgetMixin
+
+
+def make_product(quantity=0, name='Hammer', **kwargs):
+    category = Category.objects.create(name='Tools')
+    supplier = Supplier.objects.create(name='Acme', email='a@example.com', phone='0', address='-')
+    return Product.objects.create(
+        name=name, category=category, supplier=supplier, price='1.00', quantity=quantity, **kwargs
+    )
+
+
+# Audit rows are written in the test transaction so the audit list has data.
+@override_settings(INVENTORY_AUDIT_MODE='sync')
+class ExpandQueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Expanded list endpoints must cost the same number of queries for any page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        for i in range(3):
+            category = Category.objects.create(name=f'Category {i}')
+            supplier = Supplier.objects.create(name=f'Supplier {i}', email='s@example.com', phone='0', address='-')
+            for j in range(5):
+                product = Product.objects.create(
+                    name=f'Product {i}-{j}', category=category, supplier=supplier, price='1.00', quantity=10
+                )
+                record_movement(product, 'OUT', 1, user=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_product_list_expand(self):
+        with self.assertMaxQueries(2):  # count + page
+            response = self.client.get('/api/products/?expand=category,supplier&page_size=15')
+        self.assertEqual(response.status_code, 200)
+        first = response.data['results'][0]
+        self.assertEqual(first['category']['name'], 'Category 0')
+        self.assertEqual(first['supplier']['name'], 'Supplier 0')
+
+    def test_product_detail_expand(self):
+        product = Product.objects.first()
+        with self.assertMaxQueries(1):
+            response = self.client.get(f'/api/products/{product.pk}/?expand=category')
+        self.assertEqual(response.data['category']['name'], 'Category 0')
+        self.assertIsInstance(response.data['supplier'], int)
+
+    def test_stock_movement_list_expand(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/stock-movements/?expand=product&page_size=15')
+        self.assertEqual(len(response.data['results']), 15)
+        self.assertIn('name', response.data['results'][0]['product'])
+
+    def test_audit_log_expand(self):
+        with self.assertMaxQueries(1):
+            response = self.client.get('/api/stock-audit/?expand=product,user&page_size=15')
+        self.assertEqual(response.data['results'][0]['user']['username'], 'tester')
+
+
+@override_settings(INVENTORY_AUDIT_MODE='sync')
+class BulkMovementTests(QueryBudgetMixin, APITestCase):
+    """Bulk movements apply per item, in queries that don't grow with the items."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        supplier = Supplier.objects.create(name='Acme', email='a@example.com', phone='0', address='-')
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        cls.products = [
+            Product.objects.create(
+                name=f'Product {i}', category=cls.categories[i % 3], supplier=supplier, price='1.00', quantity=10
+            )
+            for i in range(30)
+        ]
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def post(self, items):
+        return self.client.post('/api/stock-movements/bulk/', items, format='json')
+
+    def test_queries_do_not_grow_with_items(self):
+        items = [{'product': p.pk, 'movement_type': 'OUT', 'quantity': 3} for p in self.products]
+        items += [{'product': p.pk, 'movement_type': 'IN', 'quantity': 1} for p in self.products]
+        with self.assertMaxQueries(25), self.captureOnCommitCallbacks(execute=True):
+            response = self.post(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(Product.objects.values_list('quantity', flat=True)), {8})
+        self.assertEqual(set(StockLevel.objects.values_list('quantity', flat=True)), {8})
+        self.assertEqual(set(CategoryStockSummary.objects.values_list('total_quantity', flat=True)), {80})
+        rollups = CategoryMovementRollup.objects.filter(granularity='day')
+        self.assertEqual(set(rollups.values_list('category_id', 'units_in', 'units_out')),
+                         {(category.pk, 10, 30) for category in self.categories})
+
+    def test_failures_are_reported_per_item(self):
+        first, second = self.products[:2]
+        response = self.post([
+            {'product': first.pk, 'movement_type': 'OUT', 'quantity': 4},
+            {'product': first.pk, 'movement_type': 'OUT', 'quantity': 7},
+            {'product': second.pk, 'movement_type': 'SIDEWAYS', 'quantity': 1},
+            {'product': 999999, 'movement_type': 'IN', 'quantity': 1},
+            {'product': second.pk, 'movement_type': 'IN', 'quantity': 1},
+            {'product': first.pk, 'movement_type': 'OUT', 'quantity': 6},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (3, 3))
+        self.assertEqual([error['index'] for error in response.data['errors']], [1, 2, 3])
+        self.assertEqual(response.data['errors'][0]['error'], 'Not enough stock!')
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.quantity, second.quantity), (0, 11))
+
+    def test_nothing_created_is_a_400(self):
+        response = self.post([{'product': self.products[0].pk, 'movement_type': 'OUT', 'quantity': 11}])
+        self.assertEqual((response.status_code, response.data['created']), (400, 0))
+        self.assertEqual(self.post({'product': 1}).status_code, 400)
+
+
+@override_settings(INVENTORY_AUDIT_MODE='sync')
+class StockEngineTests(QueryBudgetMixin, APITestCase):
+    """Movements change stock with conditional updates that never overdraw it."""
+
+    def state(self, product):
+        product.refresh_from_db()
+        levels = sum(StockLevel.objects.filter(product=product).values_list('quantity', flat=True))
+        return product.quantity, levels, ledger.quantity_at(product.pk, timezone.now())['quantity']
+
+    def test_out_never_takes_more_than_is_on_hand(self):
+        product = make_product(quantity=5)
+        with self.assertRaises(InsufficientStock):
+            record_movement(product, 'OUT', 6)
+        self.assertEqual(self.state(product), (5, 5, 5))
+        self.assertFalse(StockMovement.objects.filter(product=product).exists())
+        record_movement(product, 'OUT', 5)
+        record_movement(product, 'IN', 2)
+        self.assertEqual(self.state(product), (2, 2, 2))
+
+    def test_out_is_per_location(self):
+        product = make_product(quantity=5)
+        backroom = Location.objects.create(code='B', name='Backroom')
+        record_movement(product, 'IN', 1, location=backroom)
+        with self.assertRaises(InsufficientStock):
+            record_movement(product, 'OUT', 2, location=backroom)
+        self.assertEqual(dict((location.code, quantity) for location, quantity in stock_by_location(product.pk)),
+                         {'MAIN': 5, 'B': 1})
+
+    def test_low_stock_alert_when_crossing_the_reorder_level(self):
+        product = make_product(quantity=6)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movement(product, 'OUT', 2)
+            record_movement(product, 'OUT', 1)
+        self.assertEqual(list(LowStockAlert.objects.filter(product=product).values_list('quantity', 'reorder_level')),
+                         [(4, 5)])
+
+    def test_statements_per_movement(self):
+        # Remember the default location, as a running process would.
+        with self.captureOnCommitCallbacks(execute=True):
+            product = make_product(quantity=10)
+        self.addCleanup(forget_default_location)
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+
+        def post():
+            return self.client.post(
+                '/api/stock-movements/', {'product': product.pk, 'movement_type': 'OUT', 'quantity': 1}, format='json'
+            )
+
+        # The first movement of the hour creates its rollup rows.
+        with self.assertMaxQueries(settings.INVENTORY_QUERY_BUDGET), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(post().status_code, 201)
+        # Validation, then 9 for the movement with its audit row and 8 for
+        # its settlement, savepoints included.
+        with self.assertNumQueries(18), self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(post().status_code, 201)
+
+    def test_api_reports_insufficient_stock(self):
+        product = make_product(quantity=1)
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        response = self.client.post(
+            '/api/stock-movements/', {'product': product.pk, 'movement_type': 'OUT', 'quantity': 2}, format='json'
+        )
+        self.assertEqual((response.status_code, response.data), (400, {'error': 'Not enough stock!'}))
+
+
+class ShardedStockTests(TestCase):
+    """Sharded products spread stock over slots; transfers move it between locations."""
+
+    def test_movements_spread_over_slots_and_fold_into_the_total(self):
+        product = make_product(stock_slots=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(20):
+                record_movement(product, 'IN', 1)
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 20)
+        slots = dict(StockLevel.objects.filter(product=product).values_list('slot', 'quantity'))
+        self.assertEqual(sum(slots.values()), 20)
+        self.assertGreater(len(slots), 1)
+        self.assertEqual(CategoryStockSummary.objects.get(pk=product.category_id).total_quantity, 20)
+
+        # No slot holds 20: the OUT takes from all of them.
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movement(product, 'OUT', 20)
+        with self.assertRaises(InsufficientStock):
+            record_movement(product, 'OUT', 1)
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 0)
+        self.assertEqual(set(StockLevel.objects.filter(product=product).values_list('quantity', flat=True)), {0})
+
+    def test_transfers(self):
+        for slots in (1, 4):
+            with self.subTest(stock_slots=slots):
+                product = make_product(quantity=5, stock_slots=slots)
+                main = Location.objects.get(code='MAIN')
+                backroom = Location.objects.get_or_create(code='B', defaults={'name': 'Backroom'})[0]
+                transfer_stock(product, main, backroom, 3)
+                with self.assertRaises(InsufficientStock):
+                    transfer_stock(product, main, backroom, 3)
+                with self.assertRaises(ValueError):
+                    transfer_stock(product, main, main, 1)
+                reservations.reserve(product, 2, location=main)
+                with self.assertRaises(InsufficientStock):
+                    transfer_stock(product, main, backroom, 1)
+                product.refresh_from_db()
+                self.assertEqual(product.quantity, 5)
+                self.assertEqual({location.code: quantity for location, quantity in stock_by_location(product.pk)},
+                                 {'MAIN': 2, 'B': 3})
+
+
+@override_settings(INVENTORY_AUDIT_MODE='sync')
+class IdempotencyTests(APITestCase):
+    """Retries with an ``Idempotency-Key`` get the first response back without running again."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.product = make_product(quantity=10)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # Keys remembered by this process outlive each test's transaction.
+        idempotency._recent.clear()
+
+    def post(self, quantity, key='scan-1'):
+        return self.client.post(
+            '/api/stock-movements/', {'product': self.product.pk, 'movement_type': 'OUT', 'quantity': quantity},
+            format='json', headers={'Idempotency-Key': key},
+        )
+
+    def moved(self):
+        self.product.refresh_from_db()
+        return self.product.quantity, StockMovement.objects.filter(product=self.product).count()
+
+    def test_retry_is_replayed(self):
+        first = self.post(2)
+        idempotency._recent.clear()  # answered from the table, as by another process
+        for _ in range(2):
+            retry = self.post(2)
+            self.assertEqual((retry.status_code, retry.data), (201, first.data))
+            self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(self.moved(), (8, 1))
+        # Failures are replayed too.
+        self.assertEqual(self.post(50, key='scan-2').status_code, 400)
+        self.assertEqual(self.post(50, key='scan-2').status_code, 400)
+
+    def test_key_reused_for_another_request(self):
+        self.post(2)
+        self.assertEqual(self.post(3).status_code, 422)
+        self.assertEqual(self.moved(), (8, 1))
+
+
+@override_settings(INVENTORY_AUDIT_MODE='sync')
+class ConcurrentIdempotencyTests(TransactionTestCase):
+    """A request racing another with the same key waits for it and replays
+    its response. A TransactionTestCase, since each request runs on its own
+    thread and connection."""
+
+    def setUp(self):
+        # The flush after each test, skipped or not, deletes the default
+        # location unseen.
+        self.addCleanup(forget_default_location)
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("an in-memory SQLite database fails a blocked write instead of waiting")
+        idempotency._recent.clear()
+
+    def test_two_requests_with_the_same_key(self):
+        user = User.objects.create_user('tester', password='secret')
+        product = make_product(quantity=10)
+        moving, finish = threading.Event(), threading.Event()
+        responses = {}
+
+        def slow_movement(*args, **kwargs):
+            moving.set()
+            finish.wait(10)
+            return record_movement(*args, **kwargs)
+
+        def post(name):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                responses[name] = client.post(
+                    '/api/stock-movements/', {'product': product.pk, 'movement_type': 'OUT', 'quantity': 2},
+                    format='json', headers={'Idempotency-Key': 'scan-1'},
+                )
+            finally:
+                connections.close_all()
+
+        with mock.patch('inventory.serializers.record_movement', slow_movement):
+            first = threading.Thread(target=post, args=('first',))
+            first.start()
+            self.assertTrue(moving.wait(10))
+            moving.clear()
+            second = threading.Thread(target=post, args=('second',))
+            second.start()
+            second.join(0.5)
+            self.assertTrue(second.is_alive())  # waiting on the first request's key
+            finish.set()
+            first.join(10)
+            second.join(10)
+
+        self.assertFalse(moving.is_set())  # the second request never moved stock
+        self.assertEqual(responses['first'].status_code, 201)
+        self.assertEqual((responses['second'].status_code, responses['second']['Idempotent-Replayed']),
+                         (201, 'true'))
+        self.assertEqual(responses['second'].data, responses['first'].data)
+        product.refresh_from_db()
+        self.assertEqual((product.quantity, StockMovement.objects.count()), (8, 1))
+
+
+class PaginationTests(QueryBudgetMixin, APITestCase):
+    """Keyset cursors walk every row once in either direction."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        category = Category.objects.create(name='Tools')
+        supplier = Supplier.objects.create(name='Acme', email='a@example.com', phone='0', address='-')
+        for i in range(12):
+            Product.objects.create(
+                name=f'Product {i % 5}', category=category, supplier=supplier, price=f'{i % 3}.50', quantity=i
+            )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data[link]
+        return ids, response.data
+
+    def cursor(self, *values):
+        return base64.urlsafe_b64encode(json.dumps({'v': values, 'r': False}).encode()).decode()
+
+    def test_round_trip(self):
+        for ordering in ('id', 'price', '-price', 'name', '-quantity'):
+            with self.subTest(ordering=ordering):
+                expected = list(Product.objects.order_by(
+                    ordering, '-id' if ordering.startswith('-') else 'id'
+                ).values_list('id', flat=True))
+                forwards, last = self.walk(f'/api/products/?ordering={ordering}&page_size=5', 'next')
+                self.assertEqual(forwards, expected)
+                # Back from the last page: the earlier pages, nearest first.
+                backwards, _ = self.walk(last['previous'], 'previous')
+                self.assertEqual(backwards, expected[5:10] + expected[:5])
+
+    def test_tampered_cursors(self):
+        for url in (
+            f'/api/products/?ordering=price&cursor={self.cursor("cheap", 1)}',
+            f'/api/products/?cursor={self.cursor("x")}',
+            f'/api/products/?cursor={self.cursor([1])}',
+            f'/api/products/?cursor={self.cursor(None)}',
+            f'/api/stock-movements/?cursor={self.cursor("yesterday", 1)}',
+            f'/api/low-stock/?cursor={self.cursor("low", 1)}',
+        ):
+            with self.subTest(url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_later_pages_skip_the_count(self):
+        with self.assertMaxQueries(2):  # count + page
+            first = self.client.get('/api/products/?page_size=5')
+        self.assertEqual(first.data['count'], 12)
+        self.assertNotIn('count=', first.data['next'])
+        with self.assertMaxQueries(1):
+            second = self.client.get(first.data['next'])
+        self.assertNotIn('count', second.data)
+        self.assertEqual(self.client.get(first.data['next'] + '&count=true').data['count'], 12)
+
+
+class ImportTests(APITestCase):
+    """Catalog imports upsert on SKU and never overdraw a stock level."""
+
+    HEADER = 'sku,name,category,supplier,price,quantity\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.product = make_product(quantity=10, sku='HAM-1')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def load(self, rows, query=''):
+        return self.client.generic(
+            'POST', f'/api/products/import/{query}', self.HEADER + ''.join(f'{row}\n' for row in rows),
+            content_type='text/csv',
+        )
+
+    def stock(self):
+        self.product.refresh_from_db()
+        return self.product.quantity, StockLevel.objects.get(product=self.product).quantity
+
+    def test_upsert_by_sku(self):
+        response = self.load([
+            'HAM-1,Claw hammer,Tools,Acme,2.50,12', 'SAW-1,Saw,Tools,Acme,9.00,', 'SAW-1,Hand saw,Tools,Acme,9.00,3',
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({key: response.data[key] for key in ('created', 'updated', 'failed')},
+                         {'created': 1, 'updated': 2, 'failed': 0})
+        self.assertEqual(self.stock(), (12, 12))
+        self.assertEqual(self.product.name, 'Claw hammer')
+        self.assertEqual(Product.objects.filter(sku='SAW-1').values_list('name', 'quantity').get(), ('Hand saw', 3))
+
+    def test_malformed_rows(self):
+        response = self.load([
+            'HAM-1,Hammer,Tools,Acme,abc,1', 'NEW-1,Nail,Nowhere,Acme,1.00,1', ',Bolt,Tools,Acme,1.00,1',
+            'NEW-2,Screw,Tools,Acme,1.00,2',
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 3))
+        self.assertEqual([(error['row'], list(error['errors'])) for error in response.data['errors']],
+                         [(1, ['price']), (2, ['category']), (3, ['sku'])])
+        self.assertEqual(self.stock(), (10, 10))
+        body = '{"sku": "NEW-3", "name": "Tape", "category": "Tools", "supplier": "Acme", "price": "1"}\n{oops\n'
+        response = self.client.generic('POST', '/api/products/import/', body, content_type='application/x-ndjson')
+        self.assertEqual((response.status_code, response.data['created'], response.data['errors'][0]['row']),
+                         (207, 1, 2))
+
+    def test_cannot_remove_reserved_stock(self):
+        reservations.reserve(self.product, 6)
+        for query in ('?dry_run=1', ''):
+            with self.subTest(query):
+                response = self.load(['HAM-1,Hammer,Tools,Acme,1.00,3'], query)
+                self.assertEqual((response.status_code, response.data['updated'], response.data['failed']), (400, 0, 1))
+                self.assertEqual(response.data['errors'][0]['errors']['quantity'],
+                                 ["Can't remove 7 units: only 4 at the default location are unreserved"])
+        self.assertEqual(self.stock(), (10, 10))
+        self.assertEqual(self.load(['HAM-1,Hammer,Tools,Acme,1.00,6']).status_code, 200)
+        self.assertEqual(self.stock(), (6, 6))
+
+
+class ExportTests(APITestCase):
+    """Ledger exports over the API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.product = make_product()
+        cls.location = Location.objects.create(code='B', name='Backroom')
+        record_movement(cls.product, 'IN', 4, location=cls.location)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def export(self, query=''):
+        response = self.client.get(f'/api/stock-movements/export/{query}')
+        return response.status_code, b''.join(getattr(response, 'streaming_content', [])).decode()
+
+    def test_movements_carry_their_location(self):
+        status_code, body = self.export()
+        self.assertEqual(status_code, 200)
+        row = json.loads(body.splitlines()[-1])
+        self.assertEqual((row['product'], row['location'], row['quantity']), (self.product.pk, self.location.pk, 4))
+        self.assertIn('location', self.export('?fmt=csv')[1].splitlines()[0].split(','))
+
+    def test_datetimes(self):
+        self.assertEqual(len(self.export('?since=2000-01-01T00:00')[1].splitlines()), 1)
+        self.assertEqual(self.export('?until=2000-01-01T00:00:00Z')[1], '')
+        for query in ('?since=yesterday', '?until=2024-13-45T00:00'):
+            with self.subTest(query):
+                self.assertEqual(self.export(query)[0], 400)
+        for url in ('/api/stock-movements/trends/?since=2024-02-30T00:00',
+                    f'/api/products/{self.product.pk}/stock-at/?ts=2024-13-45T00:00'):
+            with self.subTest(url):
+                self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class ResponseCacheTests(APITestCase):
+    """Cached reads revalidate with ETags and drop out when writes commit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.product = make_product(quantity=10)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        # Entries outlive each test's transaction, and primary keys repeat.
+        get_cache().clear()
+
+    def test_etag_revalidation(self):
+        url = f'/api/products/{self.product.pk}/'
+        before = cache_stats()
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        again = self.client.get(url, headers={'If-None-Match': first['ETag']})
+        self.assertEqual((again.status_code, again['ETag']), (304, first['ETag']))
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': '"stale", ' + first['ETag']}).status_code, 304)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': '"stale"'}).status_code, 200)
+        after = cache_stats()
+        self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (1, 3))
+        self.assertEqual(after['not_modified'] - before['not_modified'], 2)
+
+    def test_writes_invalidate_once_committed(self):
+        url = f'/api/products/{self.product.pk}/'
+        etag = self.client.get(url)['ETag']
+        with self.captureOnCommitCallbacks() as callbacks:
+            record_movement(self.product, 'OUT', 3)
+        # Not until the movement commits.
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        for callback in callbacks:
+            callback()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual((response.status_code, response.data['quantity']), (200, 7))
+
+        self.assertEqual(len(self.client.get('/api/categories/').data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Garden')
+        self.assertEqual(len(self.client.get('/api/categories/').data), 2)
+
+
+class StockSummaryTests(TestCase):
+    """Summaries follow movements once they commit; ``rebuild_inventory_stats``
+    repairs any that drifted from the products."""
+
+    def test_movements_apply_their_deltas_after_commit(self):
+        product = make_product(quantity=7)
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as movement:
+            record_movement(product, 'OUT', 2)
+        self.assertFalse([query for query in movement.captured_queries if 'stocksummary' in query['sql']])
+        self.assertEqual(CategoryStockSummary.objects.get(pk=product.category_id).total_quantity, 7)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(summary.summary_totals(), {'Tools': {'total_products': 1, 'total_quantity': 5}})
+
+    def test_rebuild_fixes_drift(self):
+        product = make_product(quantity=7)
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movement(product, 'OUT', 2)
+        CategoryStockSummary.objects.filter(pk=product.category_id).update(total_products=3, total_quantity=1)
+        self.assertEqual(summary.rebuild(), [(CategoryStockSummary, product.category_id, (3, 1), (1, 5))])
+        self.assertEqual(summary.summary_totals(), {'Tools': {'total_products': 1, 'total_quantity': 5}})
+        self.assertEqual(summary.rebuild(), [])
+
+
+class LowStockTests(APITestCase):
+    """Reorder levels, the low-stock list and the alert feed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.short = make_product(quantity=1)  # the default level, 5
+        cls.category = cls.short.category
+        cls.own = Product.objects.create(
+            name='Saw', category=cls.category, supplier=cls.short.supplier, price='1.00', quantity=8, reorder_point=10,
+        )
+        cls.plenty = Product.objects.create(
+            name='Drill', category=cls.category, supplier=cls.short.supplier, price='1.00', quantity=50,
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def levels(self):
+        return list(Product.objects.order_by('id').values_list('reorder_level', flat=True))
+
+    def low(self, query=''):
+        response = self.client.get(f'/api/low-stock/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [(row['id'], row['reorder_level'], row['shortfall']) for row in response.data['results']]
+
+    def test_reorder_levels(self):
+        self.assertEqual(self.levels(), [5, 10, 5])
+        # Products without their own point follow their category's.
+        self.category.reorder_point = 2
+        self.category.save()
+        self.assertEqual(self.levels(), [2, 10, 2])
+        self.plenty.reorder_point = 60
+        self.plenty.save()
+        self.assertEqual(self.levels(), [2, 10, 60])
+
+    def test_low_stock_list(self):
+        self.assertEqual(self.low(), [(self.short.pk, 5, 4), (self.own.pk, 10, 2)])
+        self.assertEqual(self.low('?threshold=9'), [(self.short.pk, 9, 8), (self.own.pk, 9, 1)])
+        self.assertEqual(self.low('?threshold=1'), [])
+        self.assertEqual(self.client.get('/api/low-stock/?threshold=-1').status_code, 400)
+
+    def test_feed(self):
+        record_movement(self.plenty, 'OUT', 46)
+        record_movement(self.plenty, 'OUT', 1)  # already below: no second alert
+        response = self.client.get('/api/low-stock/feed/')
+        self.assertEqual([(row['product'], row['quantity'], row['reorder_level']) for row in response.data['results']],
+                         [(self.plenty.pk, 4, 5)])
+        since = response.data['since']
+        self.assertEqual(self.client.get(f'/api/low-stock/feed/?since={since}').data, {'since': since, 'results': []})
+        record_movement(self.plenty, 'IN', 10)
+        record_movement(self.plenty, 'OUT', 12)
+        later = self.client.get(f'/api/low-stock/feed/?since={since}').data['results']
+        self.assertEqual([row['quantity'] for row in later], [1])
+        self.assertEqual(self.client.get('/api/low-stock/feed/?since=x').status_code, 400)
+
+
+class RollupTests(APITestCase):
+    """Movement rollups behind the trends endpoint, and their backfill."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.product = make_product(quantity=10)
+        cls.other = Product.objects.create(
+            name='Saw', category=cls.product.category, supplier=cls.product.supplier, price='1.00'
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def move(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            record_movement(self.product, 'IN', 5)
+            record_movement(self.product, 'OUT', 2)
+            record_movement(self.other, 'IN', 1)
+
+    def latest(self, query):
+        response = self.client.get(f'/api/stock-movements/trends/?granularity=hour{query}')
+        self.assertEqual(response.status_code, 200)
+        bucket = response.data['buckets'][-1]
+        return bucket['in'], bucket['out'], bucket['net']
+
+    def test_trends(self):
+        self.move()
+        self.assertEqual(self.latest(''), (6, 2, 4))
+        self.assertEqual(self.latest(f'&product={self.product.pk}'), (5, 2, 3))
+        self.assertEqual(self.latest(f'&category={self.product.category_id}'), (6, 2, 4))
+        self.assertEqual(len(self.client.get('/api/stock-movements/trends/').data['buckets']), 31)
+        for query in ('granularity=week', 'product=1&category=1', 'product=abc',
+                      'since=2024-01-02T00:00Z&until=2024-01-01T00:00Z',
+                      'granularity=hour&since=2000-01-01T00:00Z'):
+            with self.subTest(query):
+                self.assertEqual(self.client.get(f'/api/stock-movements/trends/?{query}').status_code, 400)
+
+    def test_recorded_after_the_movement_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as movement:
+            record_movement(self.product, 'IN', 1)
+        self.assertFalse([query for query in movement.captured_queries if 'movementrollup' in query['sql']])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.latest(''), (1, 0, 1))
+
+    def test_backfill(self):
+        self.move()
+        day = datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc)
+        StockMovement.objects.update(timestamp=day + datetime.timedelta(hours=10, minutes=30))
+        self.assertEqual(list(rollups.backfill(day, day + datetime.timedelta(days=1))), [(day, 6)])
+        self.assertEqual(rollups.trend('hour', day + datetime.timedelta(hours=10), day + datetime.timedelta(hours=11)),
+                         [(day + datetime.timedelta(hours=10), 6, 2)])
+        self.assertEqual(rollups.trend('day', day, day + datetime.timedelta(days=1), product=self.other.pk),
+                         [(day, 1, 0)])
+        # Rebuilding a day replaces its rows rather than adding to them.
+        self.assertEqual(list(rollups.backfill(day, day + datetime.timedelta(days=1))), [(day, 6)])
+        self.assertEqual(rollups.trend('day', day, day + datetime.timedelta(days=1)), [(day, 6, 2)])
+
+
+class ReorderSuggestionTests(APITestCase):
+    """Reorder suggestions from a year of daily rollups, read in one query."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.busy = make_product(quantity=10)  # 2 a day: 5 days of cover
+        cls.idle = Product.objects.create(
+            name='Saw', category=cls.busy.category, supplier=cls.busy.supplier, price='1.00', quantity=3,
+        )
+        cls.stocked = Product.objects.create(
+            name='Drill', category=cls.busy.category, supplier=cls.busy.supplier, price='1.00', quantity=500,
+        )
+        other = Supplier.objects.create(name='Bolt Co', email='b@example.com', phone='0', address='-')
+        cls.elsewhere = Product.objects.create(
+            name='Bolt', category=cls.busy.category, supplier=other, price='1.00', quantity=0, reorder_point=1,
+        )
+        today = rollups.bucket_start(timezone.now(), 'day')
+        ProductMovementRollup.objects.bulk_create([
+            ProductMovementRollup(product=product, granularity='day', bucket=today - age * forecast.DAY, units_out=2)
+            for age in range(1, 29) for product in (cls.busy, cls.stocked)
+        ] + [
+            # Today isn't complete yet, so it doesn't count.
+            ProductMovementRollup(product=cls.idle, granularity='day', bucket=today, units_out=100),
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        bump_version('rollups')
+        patcher = mock.patch.object(forecast, 'demand', forecast.DemandModel())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def suggested(self, query=''):
+        response = self.client.get(f'/api/reorder-suggestions/{query}')
+        self.assertEqual(response.status_code, 200)
+        return [
+            (group['supplier'], [(row['product'], row['days_of_cover'], row['suggested_quantity'])
+                                 for row in group['products']])
+            for group in response.data['suppliers']
+        ]
+
+    def test_suggestions(self):
+        # Least cover first within each supplier; 37 days of demand at 2 a day.
+        self.assertEqual(self.suggested(), [
+            (self.busy.supplier_id, [(self.busy.pk, 5.0, 64), (self.idle.pk, None, 2)]),
+            (self.elsewhere.supplier_id, [(self.elsewhere.pk, None, 1)]),
+        ])
+        self.assertEqual(self.suggested(f'?supplier={self.elsewhere.supplier_id}'),
+                         [(self.elsewhere.supplier_id, [(self.elsewhere.pk, None, 1)])])
+        self.assertEqual(self.client.get('/api/reorder-suggestions/?supplier=x').status_code, 400)
+
+    def test_history_is_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            forecast.demand.current()
+        self.assertEqual(len([query for query in queries if 'movementrollup' in query['sql']]), 1)
+        ids, moving, _, _ = forecast.demand.current()
+        self.assertEqual(list(ids), sorted([self.busy.pk, self.stocked.pk]))
+        self.assertEqual(list(moving), [2.0, 2.0])
+
+
+class SearchIndexTests(TestCase):
+    """The in-process search index follows changes made by other processes."""
+
+    def setUp(self):
+        self.product = make_product()
+        # The index outlives each test's rolled back transaction.
+        search.python_index.invalidate()
+
+    def ids(self, query):
+        return [pk for pk, _ in search.python_index.search(query)]
+
+    def test_rebuilt_when_another_process_changes_products(self):
+        self.assertEqual(self.ids('hammer'), [self.product.pk])
+        # Another worker renames it: no signal here, only the version bump.
+        Product.objects.filter(pk=self.product.pk).update(name='Mallet')
+        bump_version(search.RESOURCE)
+        self.assertEqual(self.ids('hammer'), [])
+        self.assertEqual(self.ids('mallet'), [self.product.pk])
+
+    def test_every_match_is_returned(self):
+        Product.objects.bulk_create([
+            Product(name=f'Hammer {i}', category=self.product.category, supplier=self.product.supplier, price='1.00')
+            for i in range(1500)
+        ])
+        products = search.search_products(Product.objects.filter(name__endswith='9'), 'hammer')
+        self.assertEqual(products.count(), 150)
+        self.assertEqual(products.order_by('-search_rank').first().search_rank, search.NAME_WEIGHT * search.EXACT_BONUS)
+
+
+class SearchApiTests(APITestCase):
+    """Searches that match nothing are an empty page on either list renderer."""
+
+    def setUp(self):
+        make_product()
+        search.python_index.invalidate()
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+
+    def test_no_matches(self):
+        for fast in (False, True):
+            for query in ('nomatch', '!!'):
+                with self.subTest(fast=fast, search=query), self.settings(INVENTORY_FAST_LIST_RENDERING=fast):
+                    response = self.client.get('/api/products/', {'search': query})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(json.loads(response.content)['results'], [])
+
+
+@override_settings(INVENTORY_AUDIT_MODE='sync')
+class FastRenderingTests(APITestCase):
+    """The fast list renderer writes the bytes the serializers would."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.product = make_product(quantity=10, name='Hammer\u2028claw\u2029steel')
+        record_movement(cls.product, 'OUT', 3, user=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, fast):
+        with self.settings(INVENTORY_FAST_LIST_RENDERING=fast):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.content
+
+    def test_same_output(self):
+        for url in ('/api/products/', '/api/products/?fields=id,name,price', '/api/products/?fields=bogus',
+                    '/api/stock-movements/', '/api/stock-movements/?fields=quantity,timestamp', '/api/stock-audit/'):
+            with self.subTest(url):
+                fast = self.get(url, fast=True)
+                self.assertTrue(json.loads(fast)['results'])
+                self.assertEqual(fast, self.get(url, fast=False))
+
+    def test_sparse_fields(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast):
+                results = json.loads(self.get('/api/products/?fields=id,price,bogus', fast))['results']
+                self.assertEqual(results, [{'id': self.product.pk, 'price': '1.00'}])
+
+    def test_line_separators_are_escaped(self):
+        expected = self.get('/api/products/', fast=False)
+        self.assertIn(b'Hammer\\u2028claw\\u2029steel', expected)
+        for orjson in (fastpath.orjson, None):
+            with self.subTest(orjson=orjson), mock.patch.object(fastpath, 'orjson', orjson):
+                self.assertEqual(self.get('/api/products/', fast=True), expected)
+
+
+class BatchReadTests(APITestCase):
+    """Batch reads answer in request order, with a marker for every missing id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.hammer = make_product(quantity=10)
+        cls.saw = Product.objects.create(
+            name='Saw', category=cls.hammer.category, supplier=cls.hammer.supplier, price='2.00', quantity=4
+        )
+        reservations.reserve(cls.saw, 3)
+        cls.missing = cls.saw.pk + 100
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_request_order_with_repeats_and_missing_ids(self):
+        ids = [self.saw.pk, self.missing, self.hammer.pk, self.saw.pk, self.missing]
+        query = ','.join(map(str, ids))
+        for fast in (False, True):
+            for chunk_size in (500, 1):
+                with self.subTest(fast=fast, chunk_size=chunk_size), \
+                        self.settings(INVENTORY_FAST_LIST_RENDERING=fast, INVENTORY_BATCH_CHUNK_SIZE=chunk_size):
+                    response = self.client.get(f'/api/products/batch/?ids={query}&fields=id,name')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(json.loads(response.content), {
+                        'results': [
+                            {'id': self.saw.pk, 'name': 'Saw'},
+                            {'id': self.missing, 'error': 'Not found'},
+                            {'id': self.hammer.pk, 'name': 'Hammer'},
+                            {'id': self.saw.pk, 'name': 'Saw'},
+                            {'id': self.missing, 'error': 'Not found'},
+                        ],
+                        'not_found': [self.missing],
+                    })
+
+    def test_posted_ids(self):
+        for data in ({'ids': [self.hammer.pk, self.missing]}, [self.hammer.pk, self.missing]):
+            with self.subTest(data=data):
+                response = self.client.post('/api/products/batch/', data, format='json')
+                self.assertEqual([row['id'] for row in response.data['results']], [self.hammer.pk, self.missing])
+                self.assertEqual(response.data['not_found'], [self.missing])
+
+    def test_quantities(self):
+        response = self.client.post(
+            '/api/products/quantities/', {'ids': [self.saw.pk, self.missing, self.hammer.pk]}, format='json'
+        )
+        self.assertEqual(json.loads(response.content), {
+            'quantities': {str(self.saw.pk): 4, str(self.missing): None, str(self.hammer.pk): 10},
+            'available': {str(self.saw.pk): 1, str(self.missing): None, str(self.hammer.pk): 10},
+        })
+
+    @override_settings(INVENTORY_BATCH_MAX_IDS=3)
+    def test_rejected_ids(self):
+        for query in ('1,2,3,4', '', '1,x', '1,-2'):
+            with self.subTest(query), CaptureQueriesContext(connection) as queries:
+                response = self.client.get('/api/products/batch/', {'ids': query})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(any('inventory_product' in q['sql'] for q in queries))
+        self.assertEqual(self.client.post('/api/products/quantities/', [1, 2, 3, 4], format='json').status_code, 400)
+        self.assertEqual(self.client.get('/api/products/batch/', {'ids': '1,2,3'}).status_code, 200)
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    """Token users come from the per-process cache until they are saved."""
+
+    def setUp(self):
+        authentication.users.clear()
+        self.user = User.objects.create_user('tester', password='secret')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def user_queries(self):
+        """Status and ``auth_user`` queries of an authenticated request."""
+        with CaptureQueriesContext(connection) as queries:
+            status_code = self.client.get('/api/categories/').status_code
+        return status_code, len([query for query in queries if 'auth_user' in query['sql']])
+
+    def test_cache_hit(self):
+        before = authentication.users.stats()
+        self.assertEqual(self.user_queries(), (200, 1))
+        self.assertEqual(self.user_queries(), (200, 0))
+        after = authentication.users.stats()
+        self.assertEqual((after['misses'] - before['misses'], after['hits'] - before['hits']), (1, 1))
+
+    def test_saving_the_user_drops_it_once_committed(self):
+        self.user_queries()
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.save()
+        self.assertEqual(self.user_queries(), (200, 0))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.user_queries(), (401, 1))
+
+    @override_settings(INVENTORY_AUTH_STATELESS=True)
+    def test_stateless(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        # The token alone: no lookup, so a deactivated user keeps access.
+        self.assertEqual(self.user_queries(), (200, 0))
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """The pool hands connections back out, across threads, within its bound."""
+
+    def connect(self):
+        return mock.Mock()
+
+    def test_reuse_and_bound(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05)
+        first = pool.acquire(self.connect, lambda connection: True)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect, lambda connection: True)
+        pool.release(first)
+        self.assertIs(pool.acquire(self.connect, lambda connection: True), first)
+        self.assertEqual(pool.snapshot(), dict(created=1, reused=1, discarded=0, waits=1, timeouts=1,
+                                               idle=0, in_use=1, max_size=1))
+
+    def test_waiter_gets_a_released_connection(self):
+        pool = ConnectionPool(max_size=1, timeout=5)
+        first = pool.acquire(self.connect, lambda connection: True)
+        borrowed = []
+        waiter = threading.Thread(target=lambda: borrowed.append(pool.acquire(self.connect, lambda c: True)))
+        waiter.start()
+        waiter.join(0.1)
+        pool.release(first)
+        waiter.join(5)
+        self.assertEqual(borrowed, [first])
+
+    def test_failed_checks_and_connects_free_their_slot(self):
+        pool = ConnectionPool(max_size=1, timeout=0.05, check_after=0)
+        first = pool.acquire(self.connect, lambda connection: True)
+        pool.release(first)
+        second = pool.acquire(self.connect, lambda connection: False)  # idle, checked and found dead
+        self.assertIsNot(second, first)
+        first.close.assert_called_once_with()
+        pool.discard(second)
+        with self.assertRaises(OSError):
+            pool.acquire(mock.Mock(side_effect=OSError), lambda connection: True)
+        self.assertIsNotNone(pool.acquire(self.connect, lambda connection: True))
+
+    def test_pooled_backend(self):
+        self.enterContext(mock.patch.dict('inventory.db.pool._pools'))
+        # A file database: closing an in-memory one is a no-op.
+        name = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'pooled.sqlite3')
+        settings_dict = dict(connection.settings_dict, NAME=name, OPTIONS={'pool': {'max_size': 2}})
+        wrapper = PooledSQLiteWrapper(settings_dict, 'pooled')
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        wrapper.close()
+        wrapper.ensure_connection()
+        # Handed back to the pool on close and borrowed again.
+        self.assertIs(wrapper.connection, raw)
+        wrapper.close()
+        self.assertIs(pools()['pooled'], wrapper.pool)
+        self.assertEqual({key: wrapper.pool.snapshot()[key] for key in ('created', 'reused', 'idle', 'in_use')},
+                         {'created': 1, 'reused': 1, 'idle': 1, 'in_use': 0})
+
+
+class RequestMetricsTests(APITestCase):
+    """Per-view query counts and the query budget, as Prometheus metrics."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        make_product()
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        metrics.reset()
+
+    def sample(self, name):
+        """Values of ``name`` for GETs of the product list."""
+        prefix = f'{name}{{view="product-list",method="GET"}} '
+        text = self.client.get('/api/metrics/').content.decode()
+        return [line[len(prefix):] for line in text.splitlines() if line.startswith(prefix)]
+
+    def test_queries_are_counted_per_view(self):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(2):
+                self.assertEqual(self.client.get('/api/products/').status_code, 200)
+        # Counted before the next request resets the connection's query log.
+        executed = len(queries)
+        self.assertEqual(self.sample('inventory_requests_total'), ['2'])
+        self.assertEqual(self.sample('inventory_db_queries_total'), [str(executed)])
+
+    def test_over_budget_requests_are_logged(self):
+        with self.settings(INVENTORY_QUERY_BUDGET=0), self.assertLogs('inventory.metrics', 'WARNING') as logs:
+            self.client.get('/api/products/')
+        self.assertIn('over the budget of 0', logs.output[0])
+        self.assertEqual(self.sample('inventory_query_budget_exceeded_total'), ['1'])
+
+
+class ReservationTests(APITestCase):
+    """Held units can't be taken by other movements, sharded or not."""
+
+    def stock(self, product):
+        product.refresh_from_db()
+        return product.quantity, product.reserved
+
+    def test_out_cannot_take_reserved_units(self):
+        product = make_product(quantity=5)
+        reservation = reservations.reserve(product, 3)
+        self.assertEqual(self.stock(product), (5, 3))
+        with self.assertRaises(InsufficientStock):
+            record_movement(product, 'OUT', 3)
+        record_movement(product, 'OUT', 2)
+        reservations.confirm(reservation.pk)
+        self.assertEqual(self.stock(product), (0, 0))
+
+    def test_sharded_out_cannot_take_reserved_units(self):
+        product = make_product(stock_slots=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(5):
+                record_movement(product, 'IN', 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            # No single slot holds 10: they are gathered into one.
+            reservation = reservations.reserve(product, 10)
+        self.assertEqual(self.stock(product), (10, 10))
+        with self.assertRaises(InsufficientStock):
+            record_movement(product, 'OUT', 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservations.confirm(reservation.pk)
+        self.assertEqual(self.stock(product), (0, 0))
+        self.assertEqual(sum(StockLevel.objects.filter(product=product).values_list('reserved', flat=True)), 0)
+
+    def test_confirm_appends_its_change_last(self):
+        product = make_product(quantity=5)
+        reservation = reservations.reserve(product, 3)
+        reservations.confirm(reservation.pk)
+        movement, unreserve = Change.objects.filter(kind='stock', object_id=product.pk).order_by('-id')[:2][::-1]
+        self.assertEqual((movement.delta, unreserve.delta), (-3, 0))
+        self.assertEqual(Change.objects.order_by('-id').first(), unreserve)
+
+    def test_release_and_expiry_give_stock_back(self):
+        product = make_product(quantity=4)
+        released = reservations.reserve(product, 2)
+        expiring = reservations.reserve(product, 2)
+        with self.assertRaises(InsufficientStock):
+            reservations.reserve(product, 1)
+        reservations.release(released.pk)
+        type(expiring).objects.filter(pk=expiring.pk).update(expires_at=expiring.timestamp)
+        self.assertEqual(reservations.expire(), 1)
+        with self.assertRaises(reservations.ReservationNotHeld):
+            reservations.confirm(expiring.pk)
+        self.assertEqual(self.stock(product), (4, 0))
+        record_movement(product, 'OUT', 4)
+
+    def test_api(self):
+        product = make_product(quantity=5)
+        self.client.force_authenticate(User.objects.create_user('tester', password='secret'))
+        response = self.client.post('/api/reservations/', {'product': product.pk, 'quantity': 4}, format='json')
+        self.assertEqual(response.status_code, 201)
+        over = self.client.post('/api/reservations/', {'product': product.pk, 'quantity': 2}, format='json')
+        self.assertEqual(over.status_code, 400)
+        url = f"/api/reservations/{response.data['id']}/confirm/"
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.assertEqual(self.stock(product), (1, 0))
+
+
+class ReconcileTests(TransactionTestCase):
+    """``reconcile --fix`` repairs the quantity and its stock levels together.
+
+    A TransactionTestCase, since ranges are checked on worker threads with
+    their own connections."""
+
+    def tearDown(self):
+        # The flush between tests deletes the default location unseen.
+        forget_default_location()
+
+    def test_fix_brings_levels_to_the_ledger(self):
+        product = make_product(quantity=10)
+        record_movement(product, 'OUT', 2)
+        Product.objects.filter(pk=product.pk).update(quantity=5)
+        StockLevel.objects.filter(product=product).update(quantity=3)
+        self.assertEqual(ledger.reconcile(workers=1, fix=True), [(product.pk, 5, 8)])
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 8)
+        self.assertEqual(sum(StockLevel.objects.filter(product=product).values_list('quantity', flat=True)), 8)
+        self.assertEqual(ledger.reconcile(workers=1), [])
+
+
+class ChangeFeedTests(APITestCase):
+    """The feed only hands out settled changes, in sequence order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tester', password='secret')
+        cls.token = str(AccessToken.for_user(cls.user))
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def append(self, kind='product', age=60):
+        return Change.objects.create(
+            kind=kind, action='U', object_id=1, timestamp=timezone.now() - datetime.timedelta(seconds=age)
+        )
+
+    def feed(self, **params):
+        response = self.client.get('/api/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['since'], [row['seq'] for row in response.data['results']]
+
+    def test_unsettled_change_holds_back_later_ones(self):
+        first, pending, last = self.append(), self.append(age=0), self.append()
+        self.assertEqual(self.feed(), (first.id, [first.id]))
+        # A client resuming from the last seq it saw gets the late commit too.
+        Change.objects.filter(pk=pending.pk).update(timestamp=timezone.now() - datetime.timedelta(seconds=60))
+        self.assertEqual(self.feed(since=first.id), (last.id, [pending.id, last.id]))
+        self.assertEqual(self.feed(since=last.id), (last.id, []))
+
+    def test_kind_filter_still_advances_since(self):
+        product, stock = self.append(), self.append(kind='stock')
+        self.assertEqual(self.feed(kind='stock'), (stock.id, [stock.id]))
+        self.assertEqual(self.feed(kind='product,category'), (stock.id, [product.id]))
+        self.assertEqual(self.feed(limit=1), (product.id, [product.id]))
+
+    def test_resync_once_history_is_gone(self):
+        ids = [self.append().id for _ in range(3)]
+        Change.objects.filter(id__in=ids[:2]).delete()
+        self.assertEqual(self.client.get('/api/changes/', {'since': ids[0]}).status_code, 410)
+        self.assertEqual(self.feed(since=ids[1]), (ids[2], [ids[2]]))
+        self.assertEqual(self.client.get('/api/changes/', {'since': '-1'}).status_code, 400)
+
+    async def stream_ids(self, headers=None, **params):
+        request = AsyncRequestFactory().get(
+            '/api/changes/stream/', {'timeout': '0', **params},
+            headers={'Authorization': f'Bearer {self.token}', **(headers or {})},
+        )
+        response = await async_views.change_stream(request)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join([chunk async for chunk in response.streaming_content])
+        return [int(line[4:]) for line in body.split(b'\n') if line.startswith(b'id: ')]
+
+    # Stream requests authenticate on a pool thread; see AsyncReadViewTests.
+    @override_settings(INVENTORY_AUTH_STATELESS=True)
+    async def test_stream_resumes_from_last_event_id(self):
+        rows = [await sync_to_async(self.append)() for _ in range(3)]
+        await sync_to_async(self.append)(age=0)
+        ids = [row.id for row in rows]
+        self.assertEqual(await self.stream_ids(headers={'Last-Event-ID': str(ids[0])}), ids[1:])
+        self.assertEqual(await self.stream_ids(since=ids[1]), ids[2:])
+        # The header wins over the query string, as on a browser reconnect.
+        self.assertEqual(await self.stream_ids(headers={'Last-Event-ID': str(ids[1])}, since=ids[0]), ids[2:])
+        self.assertEqual(await self.stream_ids(), [])
+        self.assertEqual(changes.stats['streams'], 0)
+
+
+# The async views query from pool threads, outside the test transaction,
+# so the token is trusted without looking its user up.
+@override_settings(INVENTORY_AUTH_STATELESS=True)
+class AsyncReadViewTests(TestCase):
+    """Bad query parameters get the sync views' 4xx answers, not a 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.token = str(AccessToken.for_user(User.objects.create_user('tester', password='secret')))
+
+    async def test_bad_parameters(self):
+        factory = AsyncRequestFactory()
+        for query, status_code in (('ordering=bogus', 400), ('cursor=zzz', 404), ('page_size=abc', 400)):
+            with self.subTest(query):
+                response = await async_views.product_list(
+                    factory.get(f'/api/products/?{query}', headers={'Authorization': f'Bearer {self.token}'})
+                )
+                self.assertEqual(response.status_code, status_code)
+
+    async def test_search_without_matches(self):
+        factory = AsyncRequestFactory()
+        for query in ('nomatch', '!!'):
+            with self.subTest(query):
+                response = await async_views.product_list(
+                    factory.get('/api/products/', {'search': query}, headers={'Authorization': f'Bearer {self.token}'})
+                )
+                self.assertEqual((response.status_code, json.loads(response.content)['results']), (200, []))
+
+
+@override_settings(INVENTORY_PROFILE_RATE=1.0)
+class ProfilingMiddlewareTests(TestCase):
+    """The profiler stays in sync chains only."""
+
+    def profiled(self, is_async):
+        handler = BaseHandler()
+        handler.load_middleware(is_async=is_async)
+        return any(isinstance(getattr(method, '__self__', None), ProfilingMiddleware)
+                   for method in handler._view_middleware)
+
+    def test_dropped_from_async_chain(self):
+        self.assertTrue(self.profiled(is_async=False))
+        self.assertFalse(self.profiled(is_async=True))
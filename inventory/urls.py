@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Read-heavy endpoints with an async implementation; see INVENTORY_ASYNC_VIEWS.
+read_views = async_views if settings.INVENTORY_ASYNC_VIEWS else views
 
 urlpatterns = [
     # Category URLs
@@ -11,18 +15,42 @@ urlpatterns = [
     path('suppliers/<int:pk>/', views.supplier_detail, name='supplier-detail'),
 
     # Product URLs
-    path('products/', views.product_list, name='product-list'),
-    path('products/<int:pk>/', views.product_detail, name='product-detail'),
+    path('products/', read_views.product_list, name='product-list'),
+    path('products/import/', views.product_import, name='product-import'),
+    path('products/batch/', views.product_batch, name='product-batch'),
+    path('products/quantities/', views.product_quantities, name='product-quantities'),
+    path('products/<int:pk>/', read_views.product_detail, name='product-detail'),
+    path('products/<int:pk>/stock-at/', views.product_stock_at, name='product-stock-at'),
+    path('products/<int:pk>/stock/', views.product_stock, name='product-stock'),
+
+    # Location URLs
+    path('locations/', views.location_list, name='location-list'),
+    path('stock-transfers/', views.stock_transfer_list, name='stock-transfer-list'),
+
+    # Reservation URLs
+    path('reservations/', views.reservation_list, name='reservation-list'),
+    path('reservations/<int:pk>/confirm/', views.reservation_confirm, name='reservation-confirm'),
+    path('reservations/<int:pk>/release/', views.reservation_release, name='reservation-release'),
 
     # Stock Movement URLs
     path('stock-movements/', views.stock_movement_list, name='stock-movement-list'),
+    path('stock-movements/bulk/', views.stock_movement_bulk, name='stock-movement-bulk'),
+    path('stock-movements/trends/', views.stock_movement_trends, name='stock-movement-trends'),
     path('stock-movements/<int:pk>/', views.stock_movement_detail, name='stock-movement-detail'),
-    path('stock-audit/', views.stock_audit_logs, name='stock-audit'),
+    path('stock-audit/', read_views.stock_audit_logs, name='stock-audit'),
+    path('stock-movements/export/', views.stock_movement_export, name='stock-movement-export'),
+    path('stock-audit/export/', views.stock_audit_export, name='stock-audit-export'),
 
     
     # Creative features 
-    path('low-stock/', views.low_stock_products, name='low-stock'),
-    path('inventory/stats/', views.inventory_stats, name='inventory-stats'),
+    path('low-stock/', read_views.low_stock_products, name='low-stock'),
+    path('low-stock/feed/', views.low_stock_feed, name='low-stock-feed'),
+    path('changes/', views.change_feed, name='change-feed'),
+    path('changes/stream/', async_views.change_stream, name='change-stream'),
+    path('reorder-suggestions/', views.reorder_suggestions, name='reorder-suggestions'),
+    path('inventory/stats/', read_views.inventory_stats, name='inventory-stats'),
+    path('cache/stats/', views.cache_metrics, name='cache-stats'),
+    path('metrics/', views.prometheus_metrics, name='metrics'),
 
     # registration
     path('register/', views.register_user, name='register'),
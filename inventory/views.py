@@ -8,17 +8,97 @@ from .serializers import (
     StockAuditLogSerializer,
     SupplierSerializer,
     ProductSerializer,
-    StockMovementSerializer
+    StockMovementSerializer,
+    BulkStockMovementItemSerializer,
+    LowStockAlertSerializer,
+    LocationSerializer,
+    StockTransferSerializer,
+    StockReservationSerializer,
 )
-from django.db.models import Count, Sum
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import permission_classes
 from django.contrib.auth.models import User
 from rest_framework.permissions import AllowAny
 from rest_framework.decorators import permission_classes
-from rest_framework.pagination import PageNumberPagination
+from .pagination import ProductPagination, TimelinePagination, LowStockPagination, SearchPagination
+from .search import search_products
+from .fastpath import get_fields, select_columns, fast_path_enabled, fast_list_response
+from django.db.models import F, Value
 from django.db.models import Q
-from .models import StockAuditLog
+from .models import StockAuditLog, LowStockAlert, Location, StockTransfer, StockReservation, Change
+from .summary import summary_totals
+from .ledger import quantity_at
+from . import rollups
+from .forecast import reorder_suggestions as build_reorder_suggestions
+from .stock import InsufficientStock, record_movements_bulk, stock_by_location
+from . import batch, changes, reservations
+from .parsers import NDJSONParser
+from .idempotency import idempotent
+from .imports import CONTENT_TYPES as IMPORT_CONTENT_TYPES, PARSERS as IMPORT_PARSERS, import_products, text_lines
+from .cache import cached_get, cache_stats
+from .metrics import measure_serialization, render_prometheus
+from .exports import FORMATS, CONTENT_TYPES, render_ledger
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.decorators import parser_classes
+from rest_framework.parsers import JSONParser
+
+def _get_expand(request, serializer_class):
+    """Names from ``?expand=a,b`` that the serializer can render nested."""
+    requested = request.GET.get('expand', '').split(',')
+    return [name for name in serializer_class.expandable_fields if name in requested]
+
+def _list_response(request, queryset, serializer_class, paginator, expand):
+    """Paginated list narrowed to ``?fields=``, rendered by the fast path
+    when it is enabled and nothing is expanded."""
+    fields = get_fields(request, serializer_class)
+    if fast_path_enabled(expand):
+        return fast_list_response(request, queryset, serializer_class, paginator, fields)
+
+    queryset = _narrow_columns(request, queryset, serializer_class, paginator, fields)
+    result_page = paginator.paginate_queryset(queryset, request)
+    serializer = serializer_class(result_page, many=True, context={'expand': expand, 'fields': fields})
+    with measure_serialization():
+        data = serializer.data
+    return paginator.get_paginated_response(data)
+
+def _narrow_columns(request, queryset, serializer_class, paginator, fields):
+    if fields:
+        columns = select_columns(serializer_class, fields, paginator, request, attnames=False)
+        queryset = queryset.only(*[c for c in columns if c not in queryset.query.annotations])
+    return queryset
+
+def _expand_dependencies(expand):
+    """Cached resources a payload with these expanded fields also depends on."""
+    return [{'category': 'categories', 'supplier': 'suppliers'}[name] for name in expand]
+
+def _low_stock_queryset(threshold, paginator):
+    """Products below their reorder level, or below ``threshold`` when given.
+
+    Returns None for an invalid threshold.
+    """
+    products = Product.objects.only('id', 'name', 'quantity', 'reorder_level')
+    if threshold is not None:
+        if not threshold.isdigit():
+            return None
+        threshold = int(threshold)
+        # With one threshold for all products, severity is just quantity order.
+        paginator.ordering = ('quantity', 'id')
+        return products.filter(quantity__lt=threshold).annotate(level=Value(threshold))
+    return products.annotate(
+        headroom=F('quantity') - F('reorder_level'), level=F('reorder_level')
+    ).filter(headroom__lt=0)
+
+def _low_stock_row(p):
+    return {
+        "id": p.id,
+        "name": p.name,
+        "quantity": p.quantity,
+        "reorder_level": p.level,
+        "shortfall": p.level - p.quantity,
+        "status": "LOW STOCK"
+    }
 
 # -------------------------------
 # Registration view
@@ -47,9 +127,7 @@ def register_user(request):
 @permission_classes([IsAuthenticated])
 def category_list(request):
     if request.method == 'GET':
-        categories = Category.objects.all()
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        return cached_get(request, 'categories', lambda: CategorySerializer(Category.objects.all(), many=True).data)
     elif request.method == 'POST':
         serializer = CategorySerializer(data=request.data)
         if serializer.is_valid():
@@ -85,9 +163,7 @@ def category_detail(request, pk):
 @permission_classes([IsAuthenticated])
 def supplier_list(request):
     if request.method == 'GET':
-        suppliers = Supplier.objects.all()
-        serializer = SupplierSerializer(suppliers, many=True)
-        return Response(serializer.data)
+        return cached_get(request, 'suppliers', lambda: SupplierSerializer(Supplier.objects.all(), many=True).data)
     elif request.method == 'POST':
         serializer = SupplierSerializer(data=request.data)
         if serializer.is_valid():
@@ -128,9 +204,9 @@ def product_list(request):
         category = request.GET.get('category')
         supplier = request.GET.get('supplier')
         search = request.GET.get('search')
-        ordering = request.GET.get('ordering')
 
-        products = Product.objects.all()
+        expand = _get_expand(request, ProductSerializer)
+        products = Product.objects.select_related(*expand)
 
         # Filtering
         if category:
@@ -138,21 +214,15 @@ def product_list(request):
         if supplier:
             products = products.filter(supplier_id=supplier)
 
-        # Search by name
+        # Search name, category and supplier; ranked unless ?ordering= is given
+        paginator = ProductPagination()
         if search:
-            products = products.filter(name__icontains=search)
-
-        # Sorting
-        if ordering:
-            products = products.order_by(ordering)
+            products = search_products(products, search)
+            if not request.GET.get('ordering'):
+                paginator = SearchPagination()
 
-        # Pagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10  # Set default page size
-        result_page = paginator.paginate_queryset(products, request)
-
-        serializer = ProductSerializer(result_page, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        # Sorting (?ordering=), keyset pagination (?cursor=) and ?fields=
+        return _list_response(request, products, ProductSerializer, paginator, expand)
 
     elif request.method == 'POST':
         serializer = ProductSerializer(data=request.data)
@@ -161,18 +231,55 @@ def product_list(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+def _batch_ids(request):
+    """Ids from ``?ids=1,2,3``, or a POSTed list (bare or as ``{"ids": [...]}``)."""
+    if request.method == 'POST':
+        data = request.data
+        return batch.parse_ids(data.get('ids') if hasattr(data, 'get') else data)
+    return batch.parse_ids(request.GET.get('ids', ''))
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def product_batch(request):
+    """Products for many ids in request order; ids that don't exist get
+    ``{"id": ..., "error": "Not found"}`` in their place."""
+    try:
+        ids = _batch_ids(request)
+    except batch.BatchError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    results, missing = batch.products(
+        ids, get_fields(request, ProductSerializer), _get_expand(request, ProductSerializer)
+    )
+    return Response({'results': results, 'not_found': missing})
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def product_quantities(request):
+    """Just quantity and available stock per id (null if it doesn't exist)."""
+    try:
+        ids = _batch_ids(request)
+    except batch.BatchError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    on_hand, available = batch.quantities(ids)
+    return Response({'quantities': on_hand, 'available': available})
+
 @api_view(['GET', 'PUT', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def product_detail(request, pk):
+    if request.method == 'GET':
+        expand = _get_expand(request, ProductSerializer)
+        return cached_get(
+            request, f'product:{pk}',
+            lambda: ProductSerializer(Product.objects.select_related(*expand).get(pk=pk), context={'expand': expand}).data,
+            depends_on=_expand_dependencies(expand),
+        )
+
     try:
         product = Product.objects.get(pk=pk)
     except Product.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    if request.method == 'GET':
-        serializer = ProductSerializer(product)
-        return Response(serializer.data)
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
         serializer = ProductSerializer(product, data=request.data)
         if serializer.is_valid():
             serializer.save()
@@ -182,103 +289,441 @@ def product_detail(request, pk):
         product.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def product_import(request):
+    """Stream a CSV or NDJSON catalog into the products table, upserting on SKU.
+
+    The format comes from ``?fmt=csv|ndjson`` or the Content-Type.
+    ``?dry_run=1`` only validates; ``?resume_from=<checkpoint>`` skips the
+    records an interrupted import already committed.
+    """
+    fmt = request.GET.get('fmt') or IMPORT_CONTENT_TYPES.get(request.content_type.split(';')[0].strip())
+    if fmt not in IMPORT_PARSERS:
+        return Response(
+            {'error': "Send text/csv or application/x-ndjson, or pass ?fmt=csv|ndjson"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    resume_from = request.GET.get('resume_from', '0')
+    if not resume_from.isdigit():
+        return Response({'error': "resume_from must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
+    # Read the body as it arrives instead of through request.data.
+    stream = request.stream
+    if stream is None:
+        return Response({'error': "Empty request body"}, status=status.HTTP_400_BAD_REQUEST)
+
+    report = import_products(
+        IMPORT_PARSERS[fmt](text_lines(stream)),
+        dry_run=request.GET.get('dry_run') in ('1', 'true'),
+        resume_from=int(resume_from),
+    )
+    if not report['failed']:
+        response_status = status.HTTP_200_OK
+    elif report['created'] or report['updated']:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response(report, status=response_status)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def product_stock_at(request, pk):
+    """Stock of a product as of ``?ts=`` (default: now), rebuilt from the ledger."""
+    ts = request.GET.get('ts')
+    if ts:
+        ts = _parse_aware(ts)
+        if ts is None:
+            return Response({'error': "Invalid ts datetime"}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        ts = timezone.now()
+
+    if not Product.objects.filter(pk=pk).exists():
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    state = quantity_at(pk, ts)
+    if state['quantity'] is None:
+        return Response({'error': "No stock history for this product at ts"}, status=status.HTTP_404_NOT_FOUND)
+    return Response({
+        'product': pk,
+        'ts': ts,
+        'quantity': state['quantity'],
+        'snapshot': state['snapshot'],
+        'replayed': state['replayed'],
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def product_stock(request, pk):
+    """A product's stock at each location, and its total."""
+    row = Product.objects.filter(pk=pk).values_list('quantity', 'reserved').first()
+    if row is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    quantity, reserved = row
+    return Response({
+        'product': pk,
+        'quantity': quantity,
+        'reserved': reserved,
+        'available': quantity - reserved,
+        'locations': [
+            {'location': location.pk, 'code': location.code, 'quantity': level}
+            for location, level in stock_by_location(pk)
+        ],
+    })
+
+# -------------------------------
+# LOCATION VIEWS
+# -------------------------------
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def location_list(request):
+    if request.method == 'GET':
+        return Response(LocationSerializer(Location.objects.order_by('code'), many=True).data)
+    elif request.method == 'POST':
+        serializer = LocationSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def stock_transfer_list(request):
+    if request.method == 'GET':
+        expand = _get_expand(request, StockTransferSerializer)
+        transfers = StockTransfer.objects.select_related(*expand)
+        return _list_response(request, transfers, StockTransferSerializer, TimelinePagination(), expand)
+    elif request.method == 'POST':
+        serializer = StockTransferSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            try:
+                serializer.save()
+            except InsufficientStock as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+# -------------------------------
+# RESERVATION VIEWS
+# -------------------------------
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def reservation_list(request):
+    if request.method == 'GET':
+        expand = _get_expand(request, StockReservationSerializer)
+        held = StockReservation.objects.select_related(*expand)
+        if request.GET.get('status'):
+            held = held.filter(status=request.GET['status'])
+        return _list_response(request, held, StockReservationSerializer, TimelinePagination(), expand)
+    elif request.method == 'POST':
+        serializer = StockReservationSerializer(data=request.data, context={'request': request})
+        if serializer.is_valid():
+            try:
+                serializer.save()  # holds the stock; nothing moves until confirmed
+            except InsufficientStock as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def _close_reservation(pk, close):
+    try:
+        reservation = close()
+    except reservations.ReservationNotHeld as e:
+        if not StockReservation.objects.filter(pk=pk).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+    except InsufficientStock as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(StockReservationSerializer(reservation).data)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def reservation_confirm(request, pk):
+    """Turn a held reservation into an OUT movement."""
+    return _close_reservation(pk, lambda: reservations.confirm(pk, user=request.user))
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def reservation_release(request, pk):
+    return _close_reservation(pk, lambda: reservations.release(pk))
+
 # -------------------------------
 # STOCK MOVEMENT VIEWS
 # -------------------------------
 @api_view(['GET', 'POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def stock_movement_list(request):
     if request.method == 'GET':
-        movements = StockMovement.objects.all()
-        serializer = StockMovementSerializer(movements, many=True)
-        return Response(serializer.data)
+        expand = _get_expand(request, StockMovementSerializer)
+        movements = StockMovement.objects.select_related(*expand)
+        return _list_response(request, movements, StockMovementSerializer, TimelinePagination(), expand)
     elif request.method == 'POST':
-        serializer = StockMovementSerializer(data=request.data)
+        serializer = StockMovementSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             try:
-                serializer.save()  # save() will update product quantity
-            except Exception as e:
+                serializer.save()  # records the movement, stock change and audit log
+            except InsufficientStock as e:
                 return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser, NDJSONParser])
+@idempotent
+def stock_movement_bulk(request):
+    """Accept a JSON array or NDJSON stream of movements in one request.
+
+    Valid items are committed even if others fail; failures are reported
+    per item by their position in the request.
+    """
+    if not isinstance(request.data, list):
+        return Response({'error': 'Expected a list of stock movements'}, status=status.HTTP_400_BAD_REQUEST)
+
+    items, errors = [], {}
+    for index, raw in enumerate(request.data):
+        serializer = BulkStockMovementItemSerializer(data=raw)
+        if serializer.is_valid():
+            items.append({
+                'index': index,
+                'product_id': serializer.validated_data['product'],
+                'movement_type': serializer.validated_data['movement_type'],
+                'quantity': serializer.validated_data['quantity'],
+                'location_id': serializer.validated_data.get('location'),
+            })
+        else:
+            errors[index] = serializer.errors
+
+    created, stock_errors = record_movements_bulk(items, user=request.user)
+    errors.update(stock_errors)
+
+    if not errors:
+        response_status = status.HTTP_201_CREATED
+    elif created:
+        response_status = status.HTTP_207_MULTI_STATUS
+    else:
+        response_status = status.HTTP_400_BAD_REQUEST
+    return Response({
+        'created': created,
+        'failed': len(errors),
+        'errors': [{'index': index, 'error': errors[index]} for index in sorted(errors)],
+    }, status=response_status)
+
 @api_view(['GET', 'DELETE'])
 @permission_classes([IsAuthenticated])
 def stock_movement_detail(request, pk):
+    expand = _get_expand(request, StockMovementSerializer)
     try:
-        movement = StockMovement.objects.get(pk=pk)
+        movement = StockMovement.objects.select_related(*expand).get(pk=pk)
     except StockMovement.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'GET':
-        serializer = StockMovementSerializer(movement)
+        serializer = StockMovementSerializer(movement, context={'expand': expand})
         return Response(serializer.data)
     elif request.method == 'DELETE':
-        movement.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(
+            {'error': "Stock movements can't be deleted; record a reversing movement instead"},
+            status=status.HTTP_405_METHOD_NOT_ALLOWED,
+        )
+
+def _parse_aware(value):
+    """An aware datetime from ISO ``value``, or None if it isn't one (e.g.
+    ``2024-13-45T00:00``); naive values are in the current time zone."""
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        return None
+    if parsed is not None and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def stock_movement_trends(request):
+    """Units in, out and net per hour or day, read from the movement rollups.
+
+    ``?granularity=hour|day`` (default day), ``?since=`` and ``?until=``
+    (until is exclusive; defaults to the last 48 hours or 30 days), and
+    optionally ``?product=`` or ``?category=`` to narrow the scope.
+    """
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in rollups.GRANULARITIES:
+        return Response({'error': "granularity must be 'hour' or 'day'"}, status=status.HTTP_400_BAD_REQUEST)
+
+    bounds = {}
+    for param in ('since', 'until'):
+        value = request.GET.get(param)
+        if value:
+            bounds[param] = _parse_aware(value)
+            if bounds[param] is None:
+                return Response({'error': f"Invalid {param} datetime"}, status=status.HTTP_400_BAD_REQUEST)
+    until = bounds.get('until') or timezone.now()
+    since = bounds.get('since') or until - rollups.DEFAULT_SPAN[granularity]
+    if since >= until:
+        return Response({'error': "since must be before until"}, status=status.HTTP_400_BAD_REQUEST)
+    if rollups.bucket_count(granularity, since, until) > rollups.MAX_BUCKETS:
+        return Response(
+            {'error': f"Range too long; at most {rollups.MAX_BUCKETS} {granularity} buckets"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    scope = {}
+    for param in ('product', 'category'):
+        value = request.GET.get(param)
+        if value:
+            if not value.isdigit():
+                return Response({'error': f"Invalid {param} id"}, status=status.HTTP_400_BAD_REQUEST)
+            scope[param] = int(value)
+    if len(scope) > 1:
+        return Response({'error': "Pass product or category, not both"}, status=status.HTTP_400_BAD_REQUEST)
+
+    series = rollups.trend(granularity, since, until, **scope)
+    return Response({
+        'granularity': granularity,
+        'since': since,
+        'until': until,
+        **scope,
+        'buckets': [
+            {'bucket': bucket, 'in': units_in, 'out': units_out, 'net': units_in - units_out}
+            for bucket, units_in, units_out in series
+        ],
+    })
 
 @api_view(['GET'])
 def low_stock_products(request):
-    threshold = 5
-    products = Product.objects.filter(quantity__lt=threshold)
-    data = [
-        {
-            "id": p.id,
-            "name": p.name,
-            "quantity": p.quantity,
-            "status": "LOW STOCK"
-        }
-        for p in products
-    ]
-    return Response(data)
+    """Products below their reorder level, most severe shortfall first.
+
+    ``?threshold=N`` replaces every product's reorder level with N.
+    """
+    threshold = request.GET.get('threshold')
+    paginator = LowStockPagination()
+    products = _low_stock_queryset(threshold, paginator)
+    if products is None:
+        return Response({'error': "threshold must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+    result_page = paginator.paginate_queryset(products, request)
+    return paginator.get_paginated_response([_low_stock_row(p) for p in result_page])
+
+@api_view(['GET'])
+def low_stock_feed(request):
+    """Alerts raised when movements took products below their reorder level.
+
+    Clients pass the last ``id`` they saw as ``?since=`` to get only newer alerts.
+    """
+    since = request.GET.get('since', '0')
+    limit = request.GET.get('limit', '100')
+    if not since.isdigit() or not limit.isdigit():
+        return Response({'error': "since and limit must be non-negative integers"}, status=status.HTTP_400_BAD_REQUEST)
+    alerts = list(LowStockAlert.objects.filter(id__gt=int(since)).order_by('id')[:min(int(limit), 1000)])
+    serializer = LowStockAlertSerializer(alerts, many=True)
+    return Response({
+        'since': alerts[-1].id if alerts else int(since),
+        'results': serializer.data,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def change_feed(request):
+    """Changes after ``?since=`` in sequence order (optionally only ``?kind=a,b``).
+
+    Clients pass the returned ``since`` back to get the next page.
+    """
+    since = request.GET.get('since', '0')
+    limit = request.GET.get('limit', str(changes.BATCH_SIZE))
+    if not since.isdigit() or not limit.isdigit():
+        return Response({'error': "since and limit must be non-negative integers"}, status=status.HTTP_400_BAD_REQUEST)
+    since = int(since)
+    rows = changes.settled(since, min(max(int(limit), 1), 1000))
+    if since and (not rows or rows[0].id > since + 1):
+        oldest = Change.objects.order_by('id').values_list('id', flat=True).first()
+        if oldest is not None and oldest > since + 1:
+            return Response({'error': "since is older than the kept change history; resync"}, status=status.HTTP_410_GONE)
+    kinds = request.GET.get('kind')
+    kinds = set(kinds.split(',')) if kinds else None
+    return Response({
+        'since': rows[-1].id if rows else since,
+        'results': [changes.payload(row) for row in rows if kinds is None or row.kind in kinds],
+    })
 
 @api_view(['GET'])
 def inventory_stats(request):
-    stats = Product.objects.values('category__name').annotate(
-        total_products=Count('id'),
-        total_quantity=Sum('quantity')
-    )
+    by = request.GET.get('by', 'category')
+    if by not in ('category', 'supplier'):
+        return Response({'error': "by must be 'category' or 'supplier'"}, status=status.HTTP_400_BAD_REQUEST)
+    return cached_get(request, 'stats', lambda: summary_totals(by))
 
-    result = {
-        entry['category__name']: {
-            "total_products": entry['total_products'],
-            "total_quantity": entry['total_quantity']
-        }
-        for entry in stats
-    }
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def cache_metrics(request):
+    return Response(cache_stats())
 
-    return Response(result)
+@api_view(['GET'])
+@permission_classes([AllowAny])  # scraped by Prometheus; restrict at the proxy
+def prometheus_metrics(request):
+    """Per-view request metrics in the Prometheus text format."""
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 
-@api_view(['GET', 'POST'])
+@api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def stock_movement_list(request):
-    if request.method == 'GET':
-        movements = StockMovement.objects.all()
-        serializer = StockMovementSerializer(movements, many=True)
-        return Response(serializer.data)
-    elif request.method == 'POST':
-        serializer = StockMovementSerializer(data=request.data, context={'request': request})
-        if serializer.is_valid():
-            try:
-                movement = serializer.save()
-
-                # Create audit log
-                StockAuditLog.objects.create(
-                    product=movement.product,
-                    quantity=movement.quantity,
-                    movement_type=movement.movement_type,
-                    user=request.user
-                )
+def reorder_suggestions(request):
+    """What to reorder from each supplier (``?supplier=`` for one), based on
+    forecast daily consumption; see ``inventory/forecast.py``."""
+    supplier = request.GET.get('supplier')
+    if supplier:
+        if not supplier.isdigit():
+            return Response({'error': "Invalid supplier id"}, status=status.HTTP_400_BAD_REQUEST)
+        supplier = int(supplier)
+    else:
+        supplier = None
+    # Stock changes bump 'stats', a rollup backfill bumps 'rollups'.
+    return cached_get(
+        request, 'reorder-suggestions', lambda: build_reorder_suggestions(supplier),
+        depends_on=('stats', 'suppliers', 'rollups'),
+    )
 
-            except Exception as e:
-                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def stock_audit_logs(request):
-    logs = StockAuditLog.objects.all().order_by('-timestamp')
-    serializer = StockAuditLogSerializer(logs, many=True)
-    return Response(serializer.data)
+    expand = _get_expand(request, StockAuditLogSerializer)
+    logs = StockAuditLog.objects.select_related(*expand)
+    return _list_response(request, logs, StockAuditLogSerializer, TimelinePagination(), expand)
+
+
+# -------------------------------
+# LEDGER EXPORTS
+# -------------------------------
+def _ledger_export(request, ledger):
+    fmt = request.GET.get('fmt', 'ndjson')
+    if fmt not in FORMATS:
+        return Response({'error': f"fmt must be one of: {', '.join(FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    filters = {}
+    for param in ('since', 'until'):
+        value = request.GET.get(param)
+        if value:
+            filters[param] = _parse_aware(value)
+            if filters[param] is None:
+                return Response({'error': f"Invalid {param} datetime"}, status=status.HTTP_400_BAD_REQUEST)
+    product = request.GET.get('product')
+    if product:
+        if not product.isdigit():
+            return Response({'error': "Invalid product id"}, status=status.HTTP_400_BAD_REQUEST)
+        filters['product'] = int(product)
+
+    response = StreamingHttpResponse(render_ledger(ledger, fmt, **filters), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{ledger}.{fmt}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def stock_movement_export(request):
+    return _ledger_export(request, 'movements')
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def stock_audit_export(request):
+    return _ledger_export(request, 'audit')
@@ -3,6 +3,10 @@ ASGI config for inventory_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the API through this module (e.g. ``uvicorn inventory_api.asgi:application``)
+for /api/changes/stream/: its server-sent event streams are async and share
+one change feed poller per worker (see inventory/changes.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
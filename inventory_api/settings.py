@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "inventory.middleware.QueryMetricsMiddleware",
+    "inventory.middleware.ProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -78,17 +80,105 @@ WSGI_APPLICATION = "inventory_api.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are reused across requests: for DB_CONN_MAX_AGE seconds per
+# thread (fine under WSGI), or, with DB_POOL_SIZE set, through a shared pool
+# that also works under ASGI, where every request runs on a new thread.
+# See inventory/db/pool.py.
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '0'))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql',
+        'ENGINE': 'inventory.db.mysql' if DB_POOL_SIZE else 'django.db.backends.mysql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': 'localhost',
         'PORT': '3306',
+        # Pooled connections go back to the pool at the end of each request.
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'pool': {'max_size': DB_POOL_SIZE, 'timeout': 30}} if DB_POOL_SIZE else {},
+    }
+}
+
+# Cache
+# Local memory by default; set CACHE_BACKEND/CACHE_LOCATION to a shared
+# backend (Redis, Memcached) when running several workers so invalidations
+# reach every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'inventory'),
     }
 }
 
+INVENTORY_CACHE_ALIAS = 'default'
+INVENTORY_CACHE_TIMEOUT = 300  # seconds
+
+# Product search: 'fulltext' (MySQL FULLTEXT index), 'python' (in-process
+# inverted index) or 'auto' to pick by database vendor.
+INVENTORY_SEARCH_BACKEND = 'auto'
+
+# Render product/movement/audit-log list pages straight from values() rows
+# (orjson if installed) instead of through DRF serializers. The JSON is
+# identical; the browsable API isn't available for these responses.
+INVENTORY_FAST_LIST_RENDERING = False
+
+# Serve the read-heavy endpoints (product list/detail, low stock, stats,
+# audit log) from the async views in inventory/async_views.py. Only useful
+# under an ASGI server (uvicorn inventory_api.asgi:application).
+INVENTORY_ASYNC_VIEWS = os.getenv('INVENTORY_ASYNC_VIEWS', '0') == '1'
+# Threads the async views use for work that has no async API (JWT user
+# lookup, serializers, the search index).
+INVENTORY_ASYNC_THREADS = int(os.getenv('INVENTORY_ASYNC_THREADS', '16'))
+
+# Requests running more queries than this are logged (logger
+# 'inventory.metrics') and counted at /api/metrics/. None disables the check.
+INVENTORY_QUERY_BUDGET = 20
+
+# Stock ledger snapshot spacing: reconstructing a product's stock at a point
+# in time replays at most this many ledger entries after the nearest
+# snapshot. Snapshots are taken by `manage.py snapshot_stock`.
+INVENTORY_LEDGER_SNAPSHOT_EVERY = 500
+
+# POSTs to /api/stock-movements/ and /api/stock-movements/bulk/ with an
+# Idempotency-Key header are stored for this many seconds and replayed if
+# the key is sent again (purge with `manage.py purge_idempotency_keys`).
+# Each process also keeps the most recent keys in memory.
+INVENTORY_IDEMPOTENCY_TTL = 24 * 3600
+INVENTORY_IDEMPOTENCY_CACHE_SIZE = 10000
+
+# Stock audit log rows are written by a background thread in batches of up to
+# INVENTORY_AUDIT_BATCH_SIZE, at least every INVENTORY_AUDIT_FLUSH_INTERVAL
+# seconds ('async'). 'outbox' also commits them to an outbox table with the
+# movement so a crash can't lose them; 'sync' writes them in the request.
+# When the queue is full a request waits INVENTORY_AUDIT_ENQUEUE_TIMEOUT
+# seconds, then writes its own rows. See inventory/audit.py.
+INVENTORY_AUDIT_MODE = os.getenv('INVENTORY_AUDIT_MODE', 'async')
+INVENTORY_AUDIT_QUEUE_SIZE = 10000
+INVENTORY_AUDIT_BATCH_SIZE = 500
+INVENTORY_AUDIT_FLUSH_INTERVAL = 1.0
+INVENTORY_AUDIT_ENQUEUE_TIMEOUT = 0.05
+
+# JWT-authenticated users are cached per process for this many seconds
+# (dropped at once when saved in the same process). With
+# INVENTORY_AUTH_STATELESS=1 the user is built from the token's claims and
+# never looked up, so deactivation only takes effect when the token expires.
+INVENTORY_AUTH_USER_CACHE_TTL = 60
+INVENTORY_AUTH_USER_CACHE_SIZE = 10000
+INVENTORY_AUTH_STATELESS = os.getenv('INVENTORY_AUTH_STATELESS', '0') == '1'
+
+# Reorder suggestions (/api/reorder-suggestions/): daily consumption is
+# forecast from a moving average over INVENTORY_FORECAST_WINDOW days and
+# exponential smoothing with INVENTORY_FORECAST_ALPHA. A product is due when
+# it has less than INVENTORY_REORDER_LEAD_TIME days of cover, and the
+# suggested order lasts INVENTORY_REORDER_COVER_DAYS beyond the lead time.
+INVENTORY_FORECAST_WINDOW = 28
+INVENTORY_FORECAST_ALPHA = 0.3
+INVENTORY_REORDER_LEAD_TIME = 7
+INVENTORY_REORDER_COVER_DAYS = 30
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,10 +224,47 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # pagination
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'inventory.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend', 'rest_framework.filters.OrderingFilter', 'rest_framework.filters.SearchFilter'],
 
 }
+
+# Code of the location that movements without a location, direct quantity
+# edits and imports apply to; created on first use.
+INVENTORY_DEFAULT_LOCATION = 'MAIN'
+
+# Reservations hold stock for this many seconds unless the request asks for
+# another TTL (up to the max); expired ones are released by
+# `manage.py expire_reservations`, run every minute or so.
+INVENTORY_RESERVATION_TTL = 15 * 60
+INVENTORY_RESERVATION_MAX_TTL = 24 * 3600
+
+# Change feed (/api/changes/ and the /api/changes/stream/ server-sent
+# events): changes are handed out once they are this many seconds old, so
+# ones committed out of sequence order aren't skipped. Each worker polls
+# for new changes on this interval while streams are open. Streams end
+# after the max seconds (clients reconnect with Last-Event-ID) or when a
+# client falls a full buffer behind. `manage.py purge_changes` deletes
+# changes older than the retention.
+INVENTORY_CHANGES_SETTLE = 1.0
+INVENTORY_CHANGES_POLL_INTERVAL = 0.5
+INVENTORY_CHANGES_STREAM_MAX_SECONDS = 300
+INVENTORY_CHANGES_STREAM_BUFFER = 1000
+INVENTORY_CHANGES_RETENTION_DAYS = 7
+
+# Batch reads (/api/products/batch/ and /api/products/quantities/): at most
+# this many ids per request, looked up this many per query.
+INVENTORY_BATCH_MAX_IDS = 5000
+INVENTORY_BATCH_CHUNK_SIZE = 500
+
+# Sampled profiling (inventory/profiling.py): the share of requests to
+# profile, optionally only for these view names (e.g. ['product-list']),
+# how often their stacks are sampled and where the collapsed stacks go.
+# 0 disables the middleware; `manage.py profile_report` summarizes them.
+INVENTORY_PROFILE_RATE = float(os.getenv('INVENTORY_PROFILE_RATE', '0'))
+INVENTORY_PROFILE_VIEWS = None
+INVENTORY_PROFILE_INTERVAL = 0.001
+INVENTORY_PROFILE_DIR = BASE_DIR / 'profiles'